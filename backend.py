@@ -1,4 +1,6 @@
-from fastapi import FastAPI, HTTPException, Response, UploadFile, File
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
@@ -6,6 +8,14 @@ import pandas as pd
 from io import StringIO
 import json
 from db_chatbot import DatabaseChatbot
+from db_chatbot.chat_memory import ChatMemory, result_store
+from db_chatbot.session_store import SessionStore, new_session_id, valid_session_id
+from db_chatbot.columnar_export import MEDIA_TYPES, dataframe_to_arrow, dataframe_to_parquet
+from db_chatbot.sql_parser import SqlValidationError, sql_parser
+from db_chatbot.request_deadlines import (
+    StatementCanceller, StageTimeout, ClientDisconnected, run_stage, stage_metrics,
+    LLM_STAGE_TIMEOUT, DB_STAGE_TIMEOUT, SERIALIZATION_TIMEOUT
+)
 import os
 from dotenv import load_dotenv
 import azure.cognitiveservices.speech as speechsdk
@@ -35,6 +45,17 @@ chatbot = DatabaseChatbot(
     endpoint=os.getenv('AZURE_OPENAI_ENDPOINT')
 )
 
+# Conversation memory is kept per client session, not on the shared chatbot
+sessions = SessionStore(ChatMemory)
+
+def resolve_session_id(header_value: Optional[str], query_value: Optional[str]) -> str:
+    session_id = header_value or query_value
+    if session_id is None:
+        return new_session_id()
+    if not valid_session_id(session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+    return session_id
+
 # Initialize Speech SDK
 speech_config = speechsdk.SpeechConfig(
     subscription=os.getenv('AZURE_SPEECH_KEY'),
@@ -44,9 +65,14 @@ speech_config.speech_recognition_language = "en-US"
 
 class QueryRequest(BaseModel):
     query: str
+    session_id: Optional[str] = None
 
+# Handlers that touch the database are plain functions so FastAPI runs them in
+# its threadpool; each checks out its own connection from the chatbot's pool.
+# /query is async only to watch for client disconnects; its stages still run
+# in the threadpool, each under its own deadline.
 @app.get("/schema")
-async def get_schema():
+def get_schema():
     """Get database schema information."""
     try:
         schema_info = chatbot.get_schema_info()
@@ -55,71 +81,97 @@ async def get_schema():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/query")
-async def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest, http_request: Request, response: Response,
+                        x_session_id: Optional[str] = Header(None)):
     """Process a natural language query."""
+    session_id = resolve_session_id(x_session_id, request.session_id)
+    response.headers["X-Session-Id"] = session_id
+    memory = await run_in_threadpool(sessions.get, session_id)
+    canceller = StatementCanceller()
     try:
         # Special handling for "low-stock" query
         if "low-stock" in request.query.lower():
             sql_query = """
-            BEGIN TRY
-                SELECT DISTINCT 
-                    p.project_name,
-                    p.status,
-                    p.budget,
-                    p.client_name,
-                    s.payment_status,
-                    s.amount as pending_amount
-                FROM projects p
-                LEFT JOIN sales s ON p.project_id = s.project_id
-                WHERE p.status = 'In Progress'
-                AND s.payment_status = 'Pending'
-                ORDER BY s.amount DESC
-            END TRY
-            BEGIN CATCH
-                SELECT ERROR_NUMBER() AS ErrorNumber, ERROR_MESSAGE() AS ErrorMessage;
-            END CATCH
+            SELECT DISTINCT 
+                p.project_name,
+                p.status,
+                p.budget,
+                p.client_name,
+                s.payment_status,
+                s.amount as pending_amount
+            FROM projects p
+            LEFT JOIN sales s ON p.project_id = s.project_id
+            WHERE p.status = 'In Progress'
+            AND s.payment_status = 'Pending'
+            ORDER BY s.amount DESC
             """
         else:
             # Generate SQL query for other queries
-            sql_query = chatbot.generate_sql_query(request.query)
+            sql_query = await run_stage("llm", run_in_threadpool(chatbot.generate_sql_query, request.query),
+                                        LLM_STAGE_TIMEOUT, http_request)
         
-        # Execute query
-        results_df = chatbot.execute_query(sql_query)
+        # Execute query; a timeout or disconnect cancels the statement on the server
+        memory.add_message('user', request.query)
+        results_df = await run_stage("db", run_in_threadpool(canceller.call, chatbot.execute_query, sql_query),
+                                     DB_STAGE_TIMEOUT, http_request, canceller)
         
         # Convert results to dict for JSON response
-        results = results_df.to_dict(orient='records')
+        results = await run_stage(
+            "serialization",
+            run_in_threadpool(lambda: jsonable_encoder(results_df.to_dict(orient='records'))),
+            SERIALIZATION_TIMEOUT, http_request
+        )
         
         # Get analysis
-        analysis = chatbot.analyze_data(results_df)
+        analysis = await run_in_threadpool(chatbot.analyze_data, results_df)
+        await run_in_threadpool(chatbot.remember_results, memory, request.query, sql_query, results_df, analysis)
         
-        # Get suggestions based on the current context
-        suggestions = chatbot.get_suggested_queries()
+        # Get suggestions based on this session's context
+        suggestions = chatbot.get_suggested_queries(memory)
         
         return {
             "sql": sql_query,
             "results": results,
             "analysis": analysis,
-            "suggestions": suggestions
+            "suggestions": suggestions,
+            "session_id": session_id
         }
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except SqlValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Query refused: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def metrics():
+    """Connection pool occupancy, checkout wait times, session and result store usage."""
+    return {"db_pool": chatbot.pool_stats(), "sessions": sessions.stats(), "result_store": result_store.stats(),
+            "request_stages": stage_metrics.stats(), "sql_parser": sql_parser.stats()}
+
 @app.get("/export")
-async def export_data(format: str):
-    """Export the last query results in the specified format."""
+def export_data(format: str, session_id: Optional[str] = Query(None),
+                x_session_id: Optional[str] = Header(None)):
+    """Export the session's last query results in the specified format."""
     try:
-        # Get the last query results from the chatbot's memory
-        last_results = None
-        for msg in reversed(chatbot.chat_memory.get_context()):
-            if msg.get('metadata', {}).get('type') == 'results':
-                last_results = msg['metadata']['data']
-                break
-        
+        session_id = x_session_id or session_id
+        if not valid_session_id(session_id):
+            raise HTTPException(status_code=400, detail="A valid session id is required for export")
+        memory = sessions.peek(session_id)
+        if memory is None:
+            raise HTTPException(status_code=404, detail="No query results available for export")
+
+        # Get the last query results referenced by this session's memory
+        last_results = memory.last_results()
         if not last_results:
             raise HTTPException(status_code=404, detail="No query results available for export")
         
-        # Convert to DataFrame
-        df = pd.DataFrame(last_results)
+        df = memory.get_results(last_results)
+        if df is None:
+            # Evicted from the result store (or the session was restored from disk): re-run it
+            df = chatbot.execute_query(last_results['sql'])
         
         # Export based on format
         if format == 'csv':
@@ -153,8 +205,28 @@ async def export_data(format: str):
                     "Access-Control-Expose-Headers": "Content-Disposition"
                 }
             )
+        elif format == 'arrow':
+            return Response(
+                content=dataframe_to_arrow(df),
+                media_type=MEDIA_TYPES['arrow'],
+                headers={
+                    "Content-Disposition": f"attachment; filename=query-results.arrow",
+                    "Access-Control-Expose-Headers": "Content-Disposition"
+                }
+            )
+        elif format == 'parquet':
+            return Response(
+                content=dataframe_to_parquet(df),
+                media_type=MEDIA_TYPES['parquet'],
+                headers={
+                    "Content-Disposition": f"attachment; filename=query-results.parquet",
+                    "Access-Control-Expose-Headers": "Content-Disposition"
+                }
+            )
         else:
             raise HTTPException(status_code=400, detail="Unsupported export format")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
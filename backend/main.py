@@ -2,9 +2,12 @@ import openai
 print("OPENAI VERSION:", openai.__version__)
 print("OPENAI FILE:", openai.__file__)
 
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from starlette.websockets import WebSocketState
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 from pydantic import BaseModel
@@ -17,10 +20,37 @@ import logging
 from datetime import datetime
 import io
 import csv
+import time
+import asyncio
+import pandas as pd
+import threading
+from collections import OrderedDict, deque
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import azure.cognitiveservices.speech as speechsdk
-import tempfile
-import time # Import time for sleep
+from db_chatbot.schema_catalog import schema_catalog
+from db_chatbot.generation_cache import GenerationCache, normalize_question, schema_fingerprint
+from db_chatbot.llm_client import AsyncLLMClient
+from db_chatbot.result_stream import iter_batches, ndjson_lines, json_chunks, csv_chunks, log_row_sample
+from db_chatbot.result_cache import ResultCache, canonicalize_sql
+from db_chatbot.pagination import PaginationError, fetch_page, decode_cursor, unique_key_columns
+from db_chatbot.query_tokens import InvalidTokenError, encode_query_id, decode_query_id
+from db_chatbot.audio_cache import AudioCache
+from db_chatbot.schema_retriever import SchemaRetriever, domain_descriptions
+from db_chatbot.prompt_budget import TokenBudget, count_tokens, count_message_tokens
+from db_chatbot.intent_matcher import IntentMatcher
+from db_chatbot.materialized_views import MaterializedViews, MATERIALIZE_ANALYTICS
+from db_chatbot.speech_stream import split_sentences, streaming_wav_header, SynthesisTimings
+from db_chatbot.columnar_export import MEDIA_TYPES, COLUMNAR_BATCH_SIZE, arrow_stream_chunks, parquet_chunks
+from db_chatbot.cost_guard import CostGuard, REJECT, ASYNC, LIMIT
+from db_chatbot.query_jobs import QueryJobs
+from db_chatbot.request_deadlines import (
+    StatementCanceller, StageTimeout, ClientDisconnected, DisconnectProbe, install_statement_tracking, run_stage,
+    stage_metrics,
+    SCHEMA_STAGE_TIMEOUT, LLM_STAGE_TIMEOUT, DB_STAGE_TIMEOUT, SERIALIZATION_TIMEOUT
+)
+from db_chatbot.chart_data import ChartDataError, CHART_KINDS, CHART_MAX_POINTS, CHART_HISTOGRAM_BINS, chart_data
+from db_chatbot.sql_parser import SqlValidationError, sql_parser, validate_sql
+from db_chatbot.single_flight import SingleFlight
 
 # Load environment variables
 load_dotenv()
@@ -52,6 +82,8 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL not set")
 print("🔥 Loaded DATABASE_URL:", DATABASE_URL)
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# Lets a timed-out or abandoned request cancel its running statement
+install_statement_tracking(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Dependency to get DB session
@@ -68,10 +100,17 @@ AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 if not AZURE_OPENAI_API_KEY or not AZURE_OPENAI_ENDPOINT:
     raise ValueError("Azure OpenAI credentials are not set")
 
-openai.api_key = AZURE_OPENAI_API_KEY
-openai.api_base = AZURE_OPENAI_ENDPOINT
-openai.api_type = "azure"
-openai.api_version = "2023-05-15"
+# One pooled async client per process; LLM_MAX_CONCURRENCY caps in-flight calls
+llm_client = AsyncLLMClient(
+    api_key=AZURE_OPENAI_API_KEY,
+    endpoint=AZURE_OPENAI_ENDPOINT,
+    api_version=os.getenv("AZURE_OPENAI_VERSION", "2023-05-15"),
+    deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4")
+)
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await llm_client.aclose()
 
 # Azure Speech Service setup
 AZURE_SPEECH_KEY = os.getenv("AZURE_SPEECH_KEY")
@@ -83,10 +122,89 @@ if not AZURE_SPEECH_KEY or not AZURE_SPEECH_REGION:
 speech_config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
 speech_config.speech_synthesis_voice_name='en-US-JennyNeural'
 
+# Synthesized audio is cached by (text, voice, format)
+TTS_FORMATS = {
+    "wav": (speechsdk.SpeechSynthesisOutputFormat.Riff16Khz16BitMonoPcm, "audio/wav"),
+    "mp3": (speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3, "audio/mpeg"),
+    "pcm": (speechsdk.SpeechSynthesisOutputFormat.Raw16Khz16BitMonoPcm, "audio/L16;rate=16000"),
+}
+audio_cache = AudioCache()
+
+# Streaming TTS synthesizes up to TTS_PIPELINE_DEPTH sentences ahead of playback
+TTS_PIPELINE_DEPTH = int(os.getenv("TTS_PIPELINE_DEPTH", "3"))
+tts_timings = SynthesisTimings()
+
+# Speech configs per (voice, format); the voice comes from the client, so only
+# the TTS_CONFIG_CACHE_SIZE most recently used are kept.
+TTS_CONFIG_CACHE_SIZE = int(os.getenv("TTS_CONFIG_CACHE_SIZE", "32"))
+_tts_configs: "OrderedDict[tuple, speechsdk.SpeechConfig]" = OrderedDict()
+_tts_configs_lock = threading.Lock()
+
+def get_tts_config(voice: str, audio_format: str) -> speechsdk.SpeechConfig:
+    key = (voice, audio_format)
+    with _tts_configs_lock:
+        config = _tts_configs.get(key)
+        if config is not None:
+            _tts_configs.move_to_end(key)
+            return config
+    config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
+    config.speech_synthesis_voice_name = voice
+    config.set_speech_synthesis_output_format(TTS_FORMATS[audio_format][0])
+    with _tts_configs_lock:
+        _tts_configs[key] = config
+        while len(_tts_configs) > TTS_CONFIG_CACHE_SIZE:
+            _tts_configs.popitem(last=False)
+    return config
+
+# NL-to-SQL generation cache, used only in deterministic mode: temperature 0
+# makes a cached answer the one the model would give again, whereas at 0.7
+# caching would lock in one random sample per question.
+SQL_GENERATION_DETERMINISTIC = os.getenv("SQL_GENERATION_DETERMINISTIC", "false").lower() in ("1", "true", "yes")
+SQL_GENERATION_TEMPERATURE = 0.0 if SQL_GENERATION_DETERMINISTIC else 0.7
+generation_cache = GenerationCache()
+
+# Known questions are answered from compiled rules before the LLM is tried.
+# Only whole canned phrases match unless the looser keyword rules are enabled.
+INTENT_MATCHING = os.getenv("INTENT_MATCHING", "true").lower() in ("1", "true", "yes")
+INTENT_KEYWORD_RULES = os.getenv("INTENT_KEYWORD_RULES", "false").lower() in ("1", "true", "yes")
+intent_matcher = IntentMatcher(keyword_rules=INTENT_KEYWORD_RULES)
+
+# Executed results, keyed by canonical SQL and invalidated per table
+result_cache = ResultCache()
+
+# Opt-in precomputed results for the advanced analytical queries
+materialized_views = MaterializedViews(engine)
+
+@app.on_event("startup")
+def start_materialized_views():
+    if MATERIALIZE_ANALYTICS:
+        materialized_views.start()
+
+@app.on_event("shutdown")
+def stop_materialized_views():
+    materialized_views.stop()
+
+# Estimated-plan check before generated SQL runs; heavy statements become background jobs
+cost_guard = CostGuard(engine)
+query_jobs = QueryJobs()
+
+@app.on_event("shutdown")
+def stop_query_jobs():
+    query_jobs.shutdown()
+
+# Concurrent requests for the same question, or the same canonical statement,
+# share one run; each follower gets its own copy of the result
+question_flights = SingleFlight("questions", copy_result=dict)
+query_flights = SingleFlight("queries", copy_result=lambda execution: {
+    **execution, "results": [dict(row) for row in execution["results"]]
+})
+
 # Models
 class QueryInput(BaseModel):
     query: Optional[str] = None
     question: Optional[str] = None
+    page_size: Optional[int] = None  # opt-in keyset pagination
+    cursor: Optional[str] = None     # next_cursor from a previous page
 
 class SuggestionRequest(BaseModel):
     domain: Optional[str] = None
@@ -96,6 +214,11 @@ class ExportRequest(BaseModel):
 
 class TTSRequest(BaseModel):
     text: str
+    voice: Optional[str] = None
+    format: str = "wav"
+
+class CacheInvalidationRequest(BaseModel):
+    tables: Optional[List[str]] = None
 
 # Domain schemas for suggestions
 DOMAIN_SCHEMAS = {
@@ -207,39 +330,38 @@ DOMAIN_SCHEMAS = {
     }
 }
 
+# Prompt schemas are pruned to the tables relevant to each question
+schema_retriever = SchemaRetriever()
+TABLE_DESCRIPTIONS = domain_descriptions(DOMAIN_SCHEMAS)
+# Every prompt is measured and trimmed to the deployment's token budget
+token_budget = TokenBudget()
+
 # Utility: Get schema
 def get_schema_info(db: Session) -> Dict[str, Any]:
-    schema = {}
-    tables_query = text("SELECT table_name FROM information_schema.tables WHERE table_schema = 'dbo'")
-    tables = [row[0] for row in db.execute(tables_query)]
-
-    for table in tables:
-        columns_query = text(f"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = '{table}'")
-        columns = [{"name": row[0], "type": row[1]} for row in db.execute(columns_query)]
-        schema[table] = columns
-    return schema
+    return schema_catalog.get_schema(db)
 
 # Utility: Format schema
-def format_schema_for_prompt(schema_info):
-    lines = []
-    for table, columns in schema_info.items():
-        lines.append(f"Table: {table}")
-        for col in columns:
-            lines.append(f"- {col['name']} ({col['type']})")
-        lines.append("")
+def format_table_for_prompt(table, columns):
+    lines = [f"Table: {table}"]
+    for col in columns:
+        lines.append(f"- {col['name']} ({col['type']})")
+    lines.append("")
     return "\n".join(lines)
 
+def format_schema_for_prompt(schema_info):
+    return "\n".join(format_table_for_prompt(table, columns) for table, columns in schema_info.items())
+
 # Utility: Generate SQL from natural query
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), retry=retry_if_exception_type(openai.error.RateLimitError))
-def get_completion(messages):
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), retry=retry_if_exception_type(openai.RateLimitError))
+async def get_completion(messages, temperature=0.7, label="completion", trimmed_tokens=0):
     try:
-        response = openai.ChatCompletion.create(
-            engine="gpt-4",
-            messages=messages,
-            temperature=0.7,
+        content = await llm_client.complete(
+            messages,
+            temperature=temperature,
             max_tokens=800
         )
-        content = response.choices[0].message.content.strip()
+        token_budget.record(label, count_message_tokens(messages), count_tokens(content), trimmed_tokens)
+        content = content.strip()
         
         # Strip markdown code blocks if present
         if content.startswith("```") and content.endswith("```"):
@@ -248,20 +370,32 @@ def get_completion(messages):
                 content = content[4:].strip()
         
         return content
-    except openai.error.RateLimitError as e:
+    except openai.RateLimitError as e:
         logger.warning(f"OpenAI API rate limit hit. Retrying... Error: {e}")
         raise # Re-raise to trigger tenacity retry
     except Exception as e:
         logger.error(f"Error in get_completion: {e}", exc_info=True)
         raise
 
-def generate_sql(natural_query: str, schema_info: dict) -> Dict[str, str]:
-    schema_str = format_schema_for_prompt(schema_info)
-    prompt = f"""
+async def generate_sql(natural_query: str, schema_info: dict) -> Dict[str, str]:
+    relevant_schema = schema_retriever.prune(natural_query, schema_info, TABLE_DESCRIPTIONS)
+    if relevant_schema is not schema_info:
+        saved = schema_retriever.record_savings(
+            format_schema_for_prompt(schema_info), format_schema_for_prompt(relevant_schema)
+        )
+        logger.info(f"Schema pruned to {len(relevant_schema)}/{len(schema_info)} tables, ~{saved} prompt tokens saved")
+
+    # Most relevant tables first, so budget trimming drops the least relevant ones
+    ranked = [table for table, _ in schema_retriever.rank(natural_query, schema_info, TABLE_DESCRIPTIONS)
+              if table in relevant_schema]
+    ranked += [table for table in relevant_schema if table not in ranked]
+    table_texts = {table: format_table_for_prompt(table, relevant_schema[table]) for table in ranked}
+
+    template = """
 You are a data analyst AI assistant. Given the following schema:
-{schema_str}
+{schema}
 Generate a SQL query (T-SQL for Azure SQL) that answers this natural language question:
-"{natural_query}"
+"{question}"
 Format your response as JSON like this:
 {{
     "sql_query": "...",
@@ -269,12 +403,30 @@ Format your response as JSON like this:
 }}
 Ensure all column names in the generated SQL are fully qualified with their respective table aliases when ambiguous (e.g., table_alias.column_name).
 """
+    system_message = "You are an expert SQL assistant."
+    base_tokens = count_message_tokens([
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": template.format(schema="", question=natural_query)}
+    ])
+    kept, trimmed = token_budget.fit(base_tokens, [("schema", [table_texts[table] for table in ranked])])
+    kept_tables = {table for table in ranked if table_texts[table] in kept["schema"]}
+    schema_str = "\n".join(table_texts[table] for table in relevant_schema if table in kept_tables)
+
+    cached = generation_cache.get(natural_query, schema_str) if SQL_GENERATION_DETERMINISTIC else None
+    if cached is not None:
+        logger.info(f"SQL generation cache hit for: {natural_query[:50]}")
+        return cached
+
+    prompt = template.format(schema=schema_str, question=natural_query)
     try:
-        message = get_completion(
+        message = await get_completion(
             messages=[
-                {"role": "system", "content": "You are an expert SQL assistant."},
+                {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            temperature=SQL_GENERATION_TEMPERATURE,
+            label="generate_sql",
+            trimmed_tokens=trimmed
         )
         print("🧠 RAW OPENAI MESSAGE (after cleaning in get_completion):", message)
 
@@ -283,10 +435,13 @@ Ensure all column names in the generated SQL are fully qualified with their resp
             print("🔍 PARSED:", parsed)
             print("TYPE:", type(parsed))
 
-            return {
+            generated = {
                 "sql_query": parsed.get("sql_query", "").strip(),
                 "explanation": parsed.get("explanation", "").strip()
             }
+            if generated["sql_query"] and SQL_GENERATION_DETERMINISTIC:
+                generation_cache.put(natural_query, schema_str, generated)
+            return generated
         except json.JSONDecodeError as e:
             print("❌ JSON Parse Error:", e)
             print("Raw message that failed to parse (after cleaning):", message)
@@ -298,45 +453,214 @@ Ensure all column names in the generated SQL are fully qualified with their resp
         print("❌ OpenAI API Error or other error during SQL generation:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Utility: Answer from a known intent, or fall back to the LLM
+async def resolve_sql(natural_query: str, schema_info: dict) -> Dict[str, str]:
+    resolved = None
+    if INTENT_MATCHING:
+        match = intent_matcher.match(natural_query, schema_info)
+        if match is not None:
+            resolved = {"sql_query": match.sql_query.strip(), "explanation": match.explanation,
+                        "intent": match.intent.name}
+    if resolved is None:
+        resolved = await generate_sql(natural_query, schema_info)
+    if resolved["sql_query"]:
+        check_read_only(resolved["sql_query"])
+    return resolved
+
+# Utility: resolve_sql shared by concurrent requests with the same normalized
+# question and schema
+async def resolve_sql_coalesced(natural_query: str, schema_info: dict) -> Dict[str, str]:
+    key = (schema_fingerprint(format_schema_for_prompt(schema_info)), normalize_question(natural_query))
+    return await question_flights.run(key, lambda: resolve_sql(natural_query, schema_info))
+
+# Utility: Refuse anything but a single read-only SELECT, parsed locally
+def check_read_only(sql_query: str):
+    try:
+        return validate_sql(sql_query)
+    except SqlValidationError as e:
+        logger.warning(f"Refused SQL ({e}): {sql_query}")
+        raise HTTPException(status_code=400, detail=f"Query refused: {e}")
+
 # Utility: Execute SQL query
 def execute_query(sql_query: str, db: Session) -> List[Dict[str, Any]]:
     # Fix 1: Validate query before execution
     if not sql_query.strip():
         logger.warning("Attempted to execute an empty SQL query.")
         raise HTTPException(status_code=400, detail="Empty SQL query received.")
+    check_read_only(sql_query)
 
     try:
         result = db.execute(text(sql_query))
         columns = result.keys()
         rows = result.fetchall()
-        print(f"📊 Columns: {columns}")
-        for idx, row in enumerate(rows):
-            print(f"Row {idx}: {row}")
+        logger.info(f"📊 Columns: {list(columns)} ({len(rows)} rows)")
+        log_row_sample(list(columns), rows)
         return [{col: val for col, val in zip(columns, row)} for row in rows]
     except Exception as e:
         logger.error(f"❌ Exception in execute_query: {e}", exc_info=True)
         raise HTTPException(status_code=400, detail=f"Database query failed: {str(e)}")
 
+# Utility: Execute SQL query through the result cache
+def execute_cached_query(sql_query: str, db: Session) -> Dict[str, Any]:
+    materialized = materialized_views.lookup(sql_query)
+    if materialized is not None:
+        snapshot, staleness = materialized
+        logger.info(f"Served from materialized view '{snapshot.name}' ({staleness:.1f}s old)")
+        return {"results": snapshot.rows, "cached": True, "cache_age_seconds": round(staleness, 3),
+                "materialized_view": snapshot.name}
+    hit = result_cache.get(sql_query)
+    if hit is not None:
+        logger.info(f"Result cache hit ({hit['age_seconds']:.1f}s old)")
+        return {"results": hit["results"], "cached": True, "cache_age_seconds": round(hit["age_seconds"], 3)}
+    decision = check_query_cost(sql_query)
+    if decision.action == ASYNC:
+        job_id = query_jobs.submit(sql_query, run_query_job)
+        return {"results": [], "cached": False, "cache_age_seconds": None,
+                "job_id": job_id, "cost_guard": decision.as_dict()}
+    # A limited statement is cached under the generated SQL: the guard would limit it again.
+    results = execute_query(decision.sql, db)
+    result_cache.put(sql_query, results)
+    return {"results": results, "cached": False, "cache_age_seconds": None, "cost_guard": decision.as_dict()}
+
+# Utility: execute_cached_query shared by concurrent requests for the same
+# canonical statement. The shared run has its own session and canceller, so a
+# request that gives up does not cancel it for the others; the statement is
+# cancelled once nobody is waiting.
+async def execute_coalesced_query(sql_query: str) -> Dict[str, Any]:
+    canceller = StatementCanceller()
+    return await query_flights.run(
+        canonicalize_sql(sql_query),
+        lambda: run_in_threadpool(canceller.call, execute_cached_query_in_session, sql_query),
+        abandon=canceller.cancel
+    )
+
+def execute_cached_query_in_session(sql_query: str) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return execute_cached_query(sql_query, db)
+    finally:
+        db.close()
+
+# Utility: Reject statements whose estimated plan is too expensive
+def check_query_cost(sql_query: str):
+    decision = cost_guard.check(sql_query)
+    if decision.action == REJECT:
+        raise HTTPException(status_code=400, detail=f"Query rejected by the cost guard: {decision.reason}")
+    return decision
+
+# Utility: Run a statement the cost guard routed to a background job
+def run_query_job(sql_query: str) -> List[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        results = execute_query(sql_query, db)
+    finally:
+        db.close()
+    result_cache.put(sql_query, results)
+    return results
+
+# Utility: Fetch one keyset page of a generated query
+def execute_paginated_query(sql_query: str, db: Session, page_size: int,
+                            cursor_state: Optional[Dict[str, Any]] = None,
+                            schema_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    decision = check_query_cost(sql_query)
+    if decision.action == ASYNC:
+        raise PaginationError("estimated cost calls for a background job")
+    column_types = {
+        col["name"]: col["type"]
+        for columns in (schema_info or {}).values()
+        for col in columns
+    }
+    unique_key = unique_key_columns(validate_sql(sql_query).tables, schema_info) if schema_info else None
+    try:
+        # The plan's row estimate stands in for a COUNT over the whole statement
+        return fetch_page(db, sql_query, page_size, cursor_state, column_types, unique_key,
+                          decision.estimated_rows)
+    except PaginationError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Exception in execute_paginated_query: {e}", exc_info=True)
+        raise HTTPException(status_code=400, detail=f"Database query failed: {str(e)}")
+
 # API Router
 api_router = APIRouter(prefix="/api")
 
-@api_router.post("/query")
-async def process_query(data: QueryInput, db: Session = Depends(get_db)):
+# Utility: Run database work in the threadpool under the DB deadline; a
+# timeout or client disconnect cancels the statement on the server.
+async def run_db_stage(probe, canceller: StatementCanceller, func, *args):
+    return await run_stage("db", run_in_threadpool(canceller.call, func, *args),
+                           DB_STAGE_TIMEOUT, probe, canceller)
+
+# Utility: Encode a response off the event loop, under the serialization deadline
+async def serialize_response(request: Request, payload: Dict[str, Any]) -> JSONResponse:
+    content = await run_stage("serialization", run_in_threadpool(jsonable_encoder, payload),
+                              SERIALIZATION_TIMEOUT, request)
+    return JSONResponse(content)
+
+# Core of /api/query, shared with the voice WebSocket: returns the response
+# payload. `probe` is polled for a client disconnect (anything with an async
+# is_disconnected(), such as the Request); ClientDisconnected propagates.
+async def answer_query(data: QueryInput, db: Session, probe=None) -> Dict[str, Any]:
+    canceller = StatementCanceller()
     try:
+        if data.cursor:
+            # Later pages reuse the SQL carried in the signed cursor; no LLM call.
+            # A PaginationError from here on is the client's (bad or stale
+            # cursor) and propagates to the caller.
+            try:
+                state = decode_cursor(data.cursor)
+            except (PaginationError, ValueError) as e:
+                raise PaginationError(f"Invalid cursor: {e}") from e
+            page = await run_db_stage(
+                probe, canceller, execute_paginated_query, state["sql"], db, data.page_size or state["size"], state
+            )
+            return {
+                "sql_query": state["sql"], "query_id": encode_query_id(state["sql"]),
+                "explanation": "", "error": None, **page
+            }
+
         user_query = data.query or data.question
         if not user_query:
             return {"sql_query": "", "results": [], "explanation": "", "error": "No query provided"}
 
-        schema_info = get_schema_info(db)
-        response_data = generate_sql(user_query, schema_info)
+        # Database work runs in the threadpool so the event loop stays free
+        # to interleave other requests' LLM calls.
+        schema_info = await run_stage("schema", run_in_threadpool(canceller.call, get_schema_info, db),
+                                      SCHEMA_STAGE_TIMEOUT, probe, canceller)
+        response_data = await run_stage("llm", resolve_sql_coalesced(user_query, schema_info),
+                                        LLM_STAGE_TIMEOUT, probe)
         sql_query = response_data["sql_query"]
         explanation = response_data["explanation"]
 
         results = []
         error = None
+        cached = False
+        cache_age_seconds = None
+        materialized_view = None
+        job_id = None
+        cost = None
+        if sql_query and data.page_size:
+            try:
+                page = await run_db_stage(
+                    probe, canceller, execute_paginated_query, sql_query, db, data.page_size, None, schema_info
+                )
+                return {
+                    "sql_query": sql_query, "query_id": encode_query_id(sql_query),
+                    "explanation": explanation, "error": None, **page
+                }
+            except (PaginationError, HTTPException) as e:
+                # e.g. ORDER BY on an expression, or duplicate output column
+                # names that a derived table rejects: answer unpaginated.
+                logger.info(f"Query is not pageable ({e}); returning all rows")
+
         if sql_query: # Only execute if SQL query is not empty
             try:
-                results = execute_query(sql_query, db)
+                execution = await run_stage("db", execute_coalesced_query(sql_query), DB_STAGE_TIMEOUT, probe)
+                results = execution["results"]
+                cached = execution["cached"]
+                cache_age_seconds = execution["cache_age_seconds"]
+                materialized_view = execution.get("materialized_view")
+                job_id = execution.get("job_id")
+                cost = execution.get("cost_guard")
             except HTTPException as e:
                 error = e.detail # Capture the error message from execute_query
                 sql_query = "" # Clear SQL if execution failed to prevent display of bad query
@@ -346,12 +670,28 @@ async def process_query(data: QueryInput, db: Session = Depends(get_db)):
 
         return {
             "sql_query": sql_query,
+            "query_id": encode_query_id(sql_query) if sql_query else None,
             "results": results,
             "explanation": explanation,
-            "error": error
+            "error": error,
+            "cached": cached,
+            "cache_age_seconds": cache_age_seconds,
+            "intent": response_data.get("intent"),
+            "materialized_view": materialized_view,
+            "job_id": job_id,  # poll /api/jobs/{job_id} for the rows
+            "cost_guard": cost
+        }
+    except (ClientDisconnected, PaginationError):
+        raise
+    except StageTimeout as e:
+        return {
+            "sql_query": "",
+            "results": [],
+            "explanation": "",
+            "error": f"{e}. Try a more specific question."
         }
     except HTTPException as e: # Catch HTTPExceptions from generate_sql as well
-        logger.error(f"HTTPException in process_query: {e.detail}", exc_info=True)
+        logger.error(f"HTTPException in answer_query: {e.detail}", exc_info=True)
         return {
             "sql_query": "",
             "results": [],
@@ -359,7 +699,7 @@ async def process_query(data: QueryInput, db: Session = Depends(get_db)):
             "error": e.detail
         }
     except Exception as e:
-        logger.error(f"Unhandled exception in process_query: {e}", exc_info=True)
+        logger.error(f"Unhandled exception in answer_query: {e}", exc_info=True)
         return {
             "sql_query": "",
             "results": [],
@@ -367,10 +707,65 @@ async def process_query(data: QueryInput, db: Session = Depends(get_db)):
             "error": "An unexpected error occurred. Please try again."
         }
 
+@api_router.post("/query")
+async def process_query(data: QueryInput, request: Request, db: Session = Depends(get_db)):
+    try:
+        payload = await answer_query(data, db, request)
+        return await serialize_response(request, payload)
+    except ClientDisconnected as e:
+        # Nobody is listening any more; 499 only shows up in access logs.
+        logger.info(f"process_query abandoned: {e}")
+        return Response(status_code=499)
+    except PaginationError as e:
+        raise HTTPException(status_code=400, detail=f"Cannot fetch the next page: {e}")
+    except StageTimeout as e:
+        return {
+            "sql_query": "",
+            "results": [],
+            "explanation": "",
+            "error": f"{e}. Try a more specific question."
+        }
+
+@api_router.post("/query/stream")
+async def stream_query(data: QueryInput, request: Request, format: str = "ndjson", db: Session = Depends(get_db)):
+    """Generate SQL and stream its rows as NDJSON or chunked JSON."""
+    user_query = data.query or data.question
+    if not user_query:
+        raise HTTPException(status_code=400, detail="No query provided")
+    if format not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="Unsupported stream format")
+
+    try:
+        schema_info = await run_stage("schema", run_in_threadpool(get_schema_info, db), SCHEMA_STAGE_TIMEOUT, request)
+        response_data = await run_stage("llm", resolve_sql_coalesced(user_query, schema_info),
+                                        LLM_STAGE_TIMEOUT, request)
+    except ClientDisconnected:
+        return Response(status_code=499)
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    sql_query = response_data["sql_query"]
+    if not sql_query:
+        raise HTTPException(status_code=400, detail=response_data["explanation"])
+
+    # Streaming is already incremental, so costly statements are not deferred.
+    decision = await run_in_threadpool(check_query_cost, sql_query)
+    sql_query = decision.sql
+
+    # The generator opens its own connection: the request session is closed
+    # before the response body is sent.
+    header = {"sql_query": sql_query, "explanation": response_data["explanation"],
+              "cost_guard": decision.as_dict()}
+    batches = iter_batches(engine, sql_query)
+    if format == "ndjson":
+        return StreamingResponse(ndjson_lines(batches, header), media_type="application/x-ndjson")
+    return StreamingResponse(json_chunks(batches, header), media_type="application/json")
+
 @api_router.post("/suggestions")
-def suggest_followups(request: SuggestionRequest):
+async def suggest_followups(request: SuggestionRequest):
     domain_name = request.domain
 
+    system_message = "You are an expert data analyst."
+    trimmed = 0
     if not domain_name or domain_name not in DOMAIN_SCHEMAS:
         prompt = """
         Suggest 3 general analytical questions about a database.
@@ -383,9 +778,9 @@ def suggest_followups(request: SuggestionRequest):
         domain_info = DOMAIN_SCHEMAS[domain_name]
         tables = ", ".join(domain_info["tables"].keys())
         kpis = ", ".join(domain_info["kpis"])
-        example_queries = "\n".join([f"- {q}" for q in domain_info["system_prompt"].split("Example queries and their SQL:")[1].strip().split("\n") if q.strip().startswith(tuple(str(i) for i in range(1,10)))])
+        examples = [f"- {q}" for q in domain_info["system_prompt"].split("Example queries and their SQL:")[1].strip().split("\n") if q.strip().startswith(tuple(str(i) for i in range(1,10)))]
 
-        prompt = f"""
+        template = """
         You are an expert data analyst. Based on the '{domain_name}' domain with tables ({tables}) and key metrics ({kpis}),
         suggest 3-5 easy, calculable analytical questions that can be answered with SQL queries.
         Consider these examples:
@@ -395,16 +790,24 @@ def suggest_followups(request: SuggestionRequest):
             "suggestions": ["...", "...", "...", ...]
         }}
         """
+        base_tokens = count_message_tokens([
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": template.format(domain_name=domain_name, tables=tables, kpis=kpis, example_queries="")}
+        ])
+        kept, trimmed = token_budget.fit(base_tokens, [("examples", examples)])
+        prompt = template.format(domain_name=domain_name, tables=tables, kpis=kpis,
+                                 example_queries="\n".join(kept["examples"]))
 
     try:
-        response = openai.ChatCompletion.create(
-            engine="gpt-4",
+        content = await get_completion(
             messages=[
-                {"role": "system", "content": "You are an expert data analyst."},
+                {"role": "system", "content": system_message},
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            label="suggestions",
+            trimmed_tokens=trimmed
         )
-        suggestions = json.loads(response.choices[0].message.content)
+        suggestions = json.loads(content)
         return suggestions
     except Exception as e:
         print("❌ Error generating suggestions:", e)
@@ -429,71 +832,218 @@ def export_csv(request: ExportRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/export/stream")
+def export_stream(query_id: str = Query(..., description="query_id returned by /api/query"),
+                  format: str = "csv"):
+    """Re-execute a generated query and stream it as CSV, Arrow IPC or Parquet."""
+    try:
+        sql_query = decode_query_id(query_id)
+    except InvalidTokenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format not in ("csv", "arrow", "parquet"):
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+    decision = check_query_cost(sql_query)
+    if decision.action == ASYNC:
+        job_id = query_jobs.submit(sql_query, run_query_job)
+        return JSONResponse(status_code=202, content={"query_id": query_id, "job_id": job_id,
+                                                      "detail": "The query is running as a background job",
+                                                      "cost_guard": decision.as_dict()})
+    # A LIMIT decision exports the capped statement; the header says so.
+    sql_query = decision.sql
+
+    if format == "csv":
+        body = csv_chunks(iter_batches(engine, sql_query))
+        media_type = "text/csv"
+    elif format == "arrow":
+        body = arrow_stream_chunks(iter_batches(engine, sql_query, batch_size=COLUMNAR_BATCH_SIZE, describe=True))
+        media_type = MEDIA_TYPES["arrow"]
+    elif format == "parquet":
+        body = parquet_chunks(iter_batches(engine, sql_query, batch_size=COLUMNAR_BATCH_SIZE, describe=True))
+        media_type = MEDIA_TYPES["parquet"]
+
+    headers = {"Content-Disposition": f"attachment; filename=export.{format}", "X-Cost-Guard": decision.action}
+    if decision.action == LIMIT:
+        headers["X-Row-Limit"] = str(cost_guard.max_rows)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+@api_router.get("/chart-data")
+def get_chart_data(query_id: str = Query(..., description="query_id returned by /api/query"),
+                   kind: str = Query("auto", description="One of: " + ", ".join(CHART_KINDS)),
+                   x: Optional[str] = None, y: Optional[str] = None, by: Optional[str] = None,
+                   max_points: int = Query(CHART_MAX_POINTS, ge=3),
+                   bins: int = Query(CHART_HISTOGRAM_BINS, ge=1),
+                   db: Session = Depends(get_db)):
+    """Chart-ready aggregates of a query's result, bounded in size whatever its row count."""
+    try:
+        sql_query = decode_query_id(query_id)
+    except InvalidTokenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    execution = execute_cached_query(sql_query, db)
+    if execution.get("job_id"):
+        return JSONResponse(status_code=202, content={"query_id": query_id, "job_id": execution["job_id"],
+                                                      "detail": "The query is running as a background job"})
+    try:
+        payload = chart_data(pd.DataFrame(execution["results"]), kind, x, y, by, max_points, bins)
+    except ChartDataError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query_id": query_id, "cached": execution["cached"], **payload}
+
+# Utility: Synthesize text to audio bytes in memory
+def synthesize_to_bytes(text: str, voice: str, audio_format: str) -> bytes:
+    # audio_config=None keeps the audio in result.audio_data: no temp file,
+    # no playback device.
+    speech_synthesizer = speechsdk.SpeechSynthesizer(
+        speech_config=get_tts_config(voice, audio_format), audio_config=None
+    )
+    result = speech_synthesizer.speak_text_async(text).get()
+
+    if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+        return result.audio_data
+
+    error_details = "N/A"
+    if result.reason == speechsdk.ResultReason.Canceled:
+        cancellation_details = result.cancellation_details
+        error_details = f"Reason: {cancellation_details.reason}, Error Code: {cancellation_details.error_code}, Error Details: {cancellation_details.error_details}"
+    logger.error(f"Speech synthesis failed. Reason: {result.reason}. {error_details}")
+    raise HTTPException(status_code=500, detail=f"Speech synthesis failed. {error_details}")
+
 @api_router.post("/synthesize_speech")
 async def synthesize_speech(request: TTSRequest):
     logger.info(f"Received request to synthesize speech for text: {request.text[:50]}...")
-    audio_filename = None
+    if request.format not in TTS_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported audio format")
+    voice = request.voice or speech_config.speech_synthesis_voice_name
+    media_type = TTS_FORMATS[request.format][1]
+    headers = {"Content-Disposition": f"attachment; filename=speech.{request.format}"}
+
+    audio_data = audio_cache.get(request.text, voice, request.format)
+    if audio_data is not None:
+        logger.info("Speech served from audio cache.")
+        return Response(content=audio_data, media_type=media_type, headers={**headers, "X-TTS-Cache": "hit"})
+
     try:
-        # Create a temporary file to store the audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_file:
-            audio_filename = temp_file.name
-        
-        # Set up audio output to the temporary file
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=audio_filename)
-        
-        # Create a speech synthesizer with the file output configuration
-        speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
-        
-        logger.info(f"Synthesizing speech to temporary file: {audio_filename}")
-        # Synthesize text to speech
-        result = speech_synthesizer.speak_text_async(request.text).get()
-
-        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            logger.info("Speech synthesis completed successfully.")
-            
-            # Explicitly close the temporary file handle BEFORE reading
-            temp_file.close()
-
-            # Read the entire audio data into memory from the now-closed file
-            with open(audio_filename, 'rb') as audio_file_read:
-                audio_data = audio_file_read.read()
-
-            # Clean up the temporary file immediately after reading
-            # Adding a small delay to allow Windows to release the handle fully
-            time.sleep(0.1) # Small delay before attempting unlink
-            try:
-                os.unlink(audio_filename)
-                logger.info(f"Temporary audio file {audio_filename} deleted.")
-            except PermissionError as perm_e:
-                logger.warning(f"PermissionError when deleting {audio_filename}: {perm_e}. Will try again later.")
-                # If deletion fails due to permission, let the OS handle it or set up a deferred cleanup
-                pass # Continue, as the response can still be sent
-
-            # Return the audio data as a streaming response
-            return StreamingResponse(
-                io.BytesIO(audio_data), # Stream from BytesIO object
-                media_type="audio/wav",
-                headers={"Content-Disposition": "attachment; filename=speech.wav"}
-            )
-        else:
-            error_details = "N/A"
-            if result.reason == speechsdk.ResultReason.Canceled:
-                cancellation_details = result.cancellation_details
-                error_details = f"Reason: {cancellation_details.reason}, Error Code: {cancellation_details.error_code}, Error Details: {cancellation_details.error_details}"
-            logger.error(f"Speech synthesis failed. Reason: {result.reason}. {error_details}")
-            raise HTTPException(status_code=500, detail=f"Speech synthesis failed. {error_details}")
+        audio_data = await run_in_threadpool(synthesize_to_bytes, request.text, voice, request.format)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Exception during speech synthesis: {e}", exc_info=True)
-        # Ensure temp file is cleaned up if an error occurs before explicit unlink,
-        # and after a potential PermissionError during unlink.
-        if audio_filename and os.path.exists(audio_filename):
-            try:
-                os.unlink(audio_filename)
-                logger.info(f"Temporary audio file {audio_filename} deleted after error.")
-            except PermissionError as perm_e:
-                logger.warning(f"PermissionError when deleting {audio_filename} during error handling: {perm_e}.")
         raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {str(e)}")
 
+    logger.info("Speech synthesis completed successfully.")
+    audio_cache.put(request.text, voice, request.format, audio_data)
+    return Response(content=audio_data, media_type=media_type, headers={**headers, "X-TTS-Cache": "miss"})
+
+async def synthesize_cached(text: str, voice: str, audio_format: str) -> bytes:
+    audio_data = audio_cache.get(text, voice, audio_format)
+    if audio_data is None:
+        audio_data = await run_in_threadpool(synthesize_to_bytes, text, voice, audio_format)
+        audio_cache.put(text, voice, audio_format, audio_data)
+    return audio_data
+
+@api_router.post("/synthesize_speech/stream")
+async def synthesize_speech_stream(request: TTSRequest):
+    """Synthesize sentence by sentence and stream audio as each one completes."""
+    if request.format not in ("wav", "mp3"):
+        raise HTTPException(status_code=400, detail="Streaming supports wav and mp3 only")
+    sentences = split_sentences(request.text)
+    if not sentences:
+        raise HTTPException(status_code=400, detail="No text to synthesize")
+    voice = request.voice or speech_config.speech_synthesis_voice_name
+    # WAV is sent as one open-ended header followed by raw PCM per sentence;
+    # MP3 frames can simply be concatenated.
+    chunk_format = "pcm" if request.format == "wav" else "mp3"
+
+    async def audio_chunks():
+        started = time.perf_counter()
+        first_audio = None
+        pending = deque()
+        next_index = 0
+        try:
+            if request.format == "wav":
+                yield streaming_wav_header()
+            while next_index < len(sentences) or pending:
+                while next_index < len(sentences) and len(pending) < TTS_PIPELINE_DEPTH:
+                    pending.append(asyncio.ensure_future(
+                        synthesize_cached(sentences[next_index], voice, chunk_format)
+                    ))
+                    next_index += 1
+                try:
+                    audio_data = await pending.popleft()
+                except Exception as e:
+                    # The status line is already sent; end the stream early.
+                    logger.error(f"Streaming speech synthesis failed: {e}", exc_info=True)
+                    return
+                if first_audio is None:
+                    first_audio = time.perf_counter() - started
+                yield audio_data
+        finally:
+            for task in pending:
+                task.cancel()
+            total = time.perf_counter() - started
+            if first_audio is not None:
+                tts_timings.record(first_audio, total)
+            logger.info(
+                f"Streamed TTS: {len(sentences)} sentences, first audio after "
+                f"{first_audio if first_audio is not None else float('nan'):.2f}s, total {total:.2f}s"
+            )
+
+    return StreamingResponse(
+        audio_chunks(),
+        media_type=TTS_FORMATS[request.format][1],
+        headers={"Content-Disposition": f"inline; filename=speech.{request.format}"}
+    )
+
+@api_router.get("/metrics")
+def metrics():
+    return {
+        "generation_cache": generation_cache.stats(),
+        "llm": llm_client.stats(),
+        "result_cache": result_cache.stats(),
+        "tts_cache": audio_cache.stats(),
+        "tts_streaming": tts_timings.stats(),
+        "schema_pruning": schema_retriever.stats(),
+        "prompt_tokens": token_budget.stats(),
+        "intent_matcher": intent_matcher.stats(),
+        "materialized_views": materialized_views.stats(),
+        "cost_guard": cost_guard.stats(),
+        "sql_parser": sql_parser.stats(),
+        "coalescing": {"questions": question_flights.stats(), "queries": query_flights.stats()},
+        "query_jobs": query_jobs.stats(),
+        "request_stages": stage_metrics.stats()
+    }
+
+@api_router.get("/metrics/tokens")
+def token_usage(limit: int = Query(50, ge=1, le=1000)):
+    """Per-request prompt, completion and trimmed token counts, most recent last."""
+    return {"requests": token_budget.recent(limit)}
+
+@api_router.get("/metrics/cost-guard")
+def cost_guard_decisions(limit: int = Query(50, ge=1, le=200)):
+    """Recent cost guard decisions with their estimated cost and rows, most recent last."""
+    return {"decisions": cost_guard.recent(limit)}
+
+@api_router.get("/jobs/{job_id}")
+def get_query_job(job_id: str):
+    """Status of a query the cost guard moved to the background, with its rows once done."""
+    job = query_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@api_router.post("/cache/invalidate")
+def invalidate_result_cache(request: CacheInvalidationRequest):
+    if not request.tables:
+        result_cache.clear()
+        return {"invalidated": "all"}
+    dropped = {table: result_cache.invalidate_table(table) for table in request.tables}
+    return {"invalidated": dropped}
+
+@api_router.post("/materialized/refresh")
+def refresh_materialized_views(force: bool = False):
+    """Refresh the materialized analytical views now (only changed ones unless forced)."""
+    return {"views": materialized_views.refresh(force=force)}
+
 @api_router.get("/ping")
 def ping():
     return {"status": "ok", "message": "pong"}
@@ -507,6 +1057,11 @@ def get_schema(db: Session = Depends(get_db)):
     schema_info = get_schema_info(db)
     return {"schema": schema_info}
 
+@app.post("/schema/refresh")
+def refresh_schema(db: Session = Depends(get_db)):
+    schema_info = schema_catalog.refresh(db)
+    return {"status": "ok", "tables": len(schema_info)}
+
 @app.get("/health")
 def health():
     return {
@@ -518,5 +1073,100 @@ def health():
 def transcribe_audio():
     return {"message": "Audio transcription endpoint"}
 
+@app.websocket("/transcribe/ws")
+async def transcribe_stream(websocket: WebSocket, sample_rate: int = 16000, run_query: bool = True):
+    """Live speech recognition over a WebSocket.
+
+    The client sends binary frames of 16-bit mono PCM as they are recorded and
+    a text frame "end" when the user stops speaking. The server replies with
+    {"type": "partial"|"final"} hypotheses as they arrive, then runs the full
+    transcript through /api/query and sends {"type": "result", ...}.
+    """
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def emit(message):
+        loop.call_soon_threadsafe(events.put_nowait, message)
+
+    stream_format = speechsdk.audio.AudioStreamFormat(samples_per_second=sample_rate, bits_per_sample=16, channels=1)
+    push_stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+    recognition_config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
+    recognition_config.speech_recognition_language = "en-US"
+    recognizer = speechsdk.SpeechRecognizer(
+        speech_config=recognition_config,
+        audio_config=speechsdk.audio.AudioConfig(stream=push_stream)
+    )
+    def on_recognizing(evt):
+        emit({"type": "partial", "text": evt.result.text})
+
+    def on_recognized(evt):
+        if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
+            emit({"type": "final", "text": evt.result.text})
+
+    def on_canceled(evt):
+        details = evt.cancellation_details
+        if details.reason == speechsdk.CancellationReason.Error:
+            emit({"type": "error", "error": details.error_details})
+
+    recognizer.recognizing.connect(on_recognizing)
+    recognizer.recognized.connect(on_recognized)
+    recognizer.canceled.connect(on_canceled)
+    recognizer.session_stopped.connect(lambda evt: emit({"type": "stopped"}))
+
+    client_gone = asyncio.Event()
+
+    async def pump_audio():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    client_gone.set()
+                    break
+                if message.get("bytes"):
+                    push_stream.write(message["bytes"])
+                elif message.get("text") == "end":
+                    break
+        finally:
+            # Closing the stream lets the recognizer flush its final result.
+            push_stream.close()
+
+    await run_in_threadpool(lambda: recognizer.start_continuous_recognition_async().get())
+    audio_task = asyncio.ensure_future(pump_audio())
+    transcript = []
+    try:
+        while True:
+            event = await events.get()
+            if event["type"] == "stopped":
+                break
+            if event["type"] == "final" and event["text"]:
+                transcript.append(event["text"])
+            await websocket.send_json(event)
+            if event["type"] == "error":
+                break
+
+        if client_gone.is_set():
+            return
+        full_text = " ".join(transcript).strip()
+        if run_query and full_text:
+            probe = DisconnectProbe(
+                lambda: client_gone.is_set() or websocket.client_state == WebSocketState.DISCONNECTED
+            )
+            db = SessionLocal()
+            try:
+                result = await answer_query(QueryInput(query=full_text), db, probe)
+            except ClientDisconnected:
+                logger.info("Transcription client disconnected before the answer was ready")
+                return
+            finally:
+                db.close()
+            await websocket.send_json(jsonable_encoder({"type": "result", "transcript": full_text, **result}))
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Transcription client disconnected")
+    finally:
+        audio_task.cancel()
+        await run_in_threadpool(lambda: recognizer.stop_continuous_recognition_async().get())
+
 # Include the API router in the main app
 app.include_router(api_router)
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Benchmark DatabaseChatbot.analyze_data against its previous implementation.
+
+Generates synthetic employee results of increasing size, checks that both
+implementations produce the same report, and prints the timings:
+
+    python benchmark_analyze_data.py
+    python benchmark_analyze_data.py --sizes 1000 100000 --repeat 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from db_chatbot.data_analysis import analyze_dataframe
+
+DEPARTMENTS = ['Engineering', 'Sales', 'Marketing', 'HR', 'Finance']
+SKILLS = ['Python', 'SQL', 'Java', 'Excel', 'Communication', 'Leadership', 'Cloud', 'Design']
+
+
+def make_employees(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    skill_picks = rng.integers(0, len(SKILLS), size=(rows, 3))
+    return pd.DataFrame({
+        'id': np.arange(rows),
+        'name': [f"Employee {i}" for i in range(rows)],
+        'department': rng.choice(DEPARTMENTS, size=rows),
+        'salary': rng.normal(85000, 20000, size=rows).round(2),
+        'doj': pd.to_datetime('2010-01-01') + pd.to_timedelta(rng.integers(0, 5000, size=rows), unit='D'),
+        'manager_id': rng.integers(0, max(rows // 10, 1), size=rows),
+        'performance_score': rng.uniform(1, 5, size=rows).round(1),
+        'skills': [', '.join(SKILLS[j] for j in picks) for picks in skill_picks],
+    })
+
+
+def legacy_analyze(df: pd.DataFrame) -> str:
+    """The row-by-row implementation analyze_data used before the single-pass rewrite."""
+    try:
+        analysis = []
+
+        # 1. Quick Summary
+        analysis.append("📊 QUICK SUMMARY")
+        analysis.append("=" * 50)
+        analysis.append(f"Total Employees: {len(df):,}")
+        if 'department' in df.columns:
+            dept_counts = df['department'].value_counts()
+            analysis.append("\nDepartment Distribution:")
+            for dept, count in dept_counts.items():
+                analysis.append(f"  • {dept}: {count:,} employees")
+
+        # 2. Key Metrics
+        analysis.append("\n📈 KEY METRICS")
+        analysis.append("=" * 50)
+
+        if 'salary' in df.columns:
+            analysis.append("\nSalary Analysis:")
+            analysis.append(f"  • Average Salary: ${df['salary'].mean():,.2f}")
+            analysis.append(f"  • Highest Salary: ${df['salary'].max():,.2f}")
+            analysis.append(f"  • Lowest Salary: ${df['salary'].min():,.2f}")
+
+            if 'department' in df.columns:
+                dept_salaries = df.groupby('department')['salary'].agg(['mean', 'min', 'max'])
+                analysis.append("\nSalary by Department:")
+                for dept, stats in dept_salaries.iterrows():
+                    analysis.append(f"  • {dept}:")
+                    analysis.append(f"    - Average: ${stats['mean']:,.2f}")
+                    analysis.append(f"    - Range: ${stats['min']:,.2f} - ${stats['max']:,.2f}")
+
+        if 'performance_score' in df.columns:
+            analysis.append("\nPerformance Analysis:")
+            analysis.append(f"  • Average Performance: {df['performance_score'].mean():.2f}/5.0")
+            analysis.append(f"  • Top Performers: {len(df[df['performance_score'] >= 4.5]):,} employees")
+
+            if 'department' in df.columns:
+                dept_performance = df.groupby('department')['performance_score'].mean()
+                analysis.append("\nPerformance by Department:")
+                for dept, score in dept_performance.items():
+                    analysis.append(f"  • {dept}: {score:.2f}/5.0")
+
+        # 3. Skills Analysis
+        if 'skills' in df.columns:
+            analysis.append("\n🔧 SKILLS ANALYSIS")
+            analysis.append("=" * 50)
+
+            # Count individual skills
+            all_skills = []
+            for skills in df['skills']:
+                all_skills.extend([s.strip() for s in skills.split(',')])
+            skill_counts = pd.Series(all_skills).value_counts()
+
+            analysis.append("\nTop Skills:")
+            for skill, count in skill_counts.head(5).items():
+                analysis.append(f"  • {skill}: {count:,} employees")
+
+        # 4. Hiring Trends
+        if 'doj' in df.columns:
+            analysis.append("\n📅 HIRING TRENDS")
+            analysis.append("=" * 50)
+
+            df['doj'] = pd.to_datetime(df['doj'])
+            yearly_hires = df.groupby(df['doj'].dt.year).size()
+
+            analysis.append("\nYearly Hiring:")
+            for year, count in yearly_hires.items():
+                analysis.append(f"  • {year}: {count:,} new employees")
+
+        # 5. Key Insights
+        analysis.append("\n💡 KEY INSIGHTS")
+        analysis.append("=" * 50)
+
+        # Add insights based on the data
+        if 'salary' in df.columns and 'department' in df.columns:
+            highest_paid_dept = df.groupby('department')['salary'].mean().idxmax()
+            analysis.append(f"  • {highest_paid_dept} department has the highest average salary")
+
+        if 'performance_score' in df.columns and 'department' in df.columns:
+            best_performing_dept = df.groupby('department')['performance_score'].mean().idxmax()
+            analysis.append(f"  • {best_performing_dept} department shows the best performance")
+
+        if 'skills' in df.columns:
+            most_common_skill = skill_counts.index[0]
+            analysis.append(f"  • {most_common_skill} is the most common skill")
+
+        return "\n".join(analysis)
+
+    except Exception as e:
+        return f"Error analyzing data: {str(e)}"
+
+
+def best_of(func, df: pd.DataFrame, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        frame = df.copy()  # the old implementation converts doj in place
+        started = time.perf_counter()
+        func(frame)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'previous (s)':>14} {'single-pass (s)':>16} {'speedup':>9}")
+    for rows in args.sizes:
+        df = make_employees(rows)
+        if legacy_analyze(df.copy()) != analyze_dataframe(df):
+            raise SystemExit(f"Reports differ for {rows} rows")
+        previous = best_of(legacy_analyze, df, args.repeat)
+        current = best_of(analyze_dataframe, df, args.repeat)
+        print(f"{rows:>10,} {previous:>14.4f} {current:>16.4f} {previous / current:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark the Arrow IPC and Parquet exports against the CSV export.
+
+Encodes synthetic employee results of increasing size in the batches
+`/api/export/stream` reads from the database, and prints the encoded size and
+the best encoding time of each format:
+
+    python benchmark_columnar_export.py
+    python benchmark_columnar_export.py --sizes 10000 1000000 --repeat 5 --compression snappy
+"""
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from db_chatbot.columnar_export import COLUMNAR_BATCH_SIZE, EXPORT_COMPRESSION, arrow_stream_chunks, parquet_chunks
+from db_chatbot.result_stream import STREAM_BATCH_SIZE, csv_chunks
+
+DEPARTMENTS = ['Engineering', 'Sales', 'Marketing', 'HR', 'Finance']
+# As pyodbc describes the employees table: (name, type_code, display_size,
+# internal_size, precision, scale, null_ok)
+DESCRIPTION = [
+    ('id', int, None, 10, 10, 0, False),
+    ('name', str, None, 100, 100, 0, False),
+    ('department', str, None, 50, 50, 0, True),
+    ('salary', Decimal, None, 12, 12, 2, True),
+    ('doj', date, None, 10, 10, 0, True),
+    ('updated_at', datetime, None, 23, 23, 3, True),
+    ('performance_score', float, None, 53, 53, 0, True),
+]
+
+
+def make_rows(rows: int, seed: int = 0):
+    rng = random.Random(seed)
+    start = datetime(2010, 1, 1)
+    return [
+        (i, f"Employee {i}", rng.choice(DEPARTMENTS),
+         Decimal(rng.randint(4_000_000, 15_000_000)) / 100,
+         (start + timedelta(days=rng.randint(0, 5000))).date(),
+         start + timedelta(seconds=rng.randint(0, 400_000_000)),
+         round(rng.uniform(1, 5), 1))
+        for i in range(rows)
+    ]
+
+
+def batches(rows, batch_size: int, columns):
+    for start in range(0, len(rows), batch_size):
+        yield columns, rows[start:start + batch_size]
+
+
+def encode_csv(rows):
+    names = [entry[0] for entry in DESCRIPTION]
+    return sum(len(chunk.encode()) for chunk in csv_chunks(batches(rows, STREAM_BATCH_SIZE, names)))
+
+
+def encode_arrow(rows, compression):
+    return sum(len(chunk) for chunk in
+               arrow_stream_chunks(batches(rows, COLUMNAR_BATCH_SIZE, DESCRIPTION), compression))
+
+
+def encode_parquet(rows, compression):
+    return sum(len(chunk) for chunk in
+               parquet_chunks(batches(rows, COLUMNAR_BATCH_SIZE, DESCRIPTION), compression))
+
+
+def best_of(func, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = func()
+        timings.append(time.perf_counter() - started)
+    return size, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compression', default=EXPORT_COMPRESSION)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'format':>8} {'size (MB)':>10} {'vs CSV':>7} {'time (s)':>9} {'vs CSV':>7}")
+    for count in args.sizes:
+        rows = make_rows(count)
+        csv_size, csv_time = best_of(lambda: encode_csv(rows), args.repeat)
+        results = [
+            ('csv', csv_size, csv_time),
+            ('arrow', *best_of(lambda: encode_arrow(rows, args.compression), args.repeat)),
+            ('parquet', *best_of(lambda: encode_parquet(rows, args.compression), args.repeat)),
+        ]
+        for name, size, seconds in results:
+            print(f"{count:>10,} {name:>8} {size / 1e6:>10.2f} {size / csv_size:>6.2f}x "
+                  f"{seconds:>9.4f} {seconds / csv_time:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,10 @@
-from .db_chatbot import DatabaseChatbot
- 
-__all__ = ['DatabaseChatbot'] 
\ No newline at end of file
+__all__ = ['DatabaseChatbot']
+
+
+def __getattr__(name):
+    # Imported lazily so the lightweight helper modules in this package
+    # (schema catalog, caches) can be used without the plotting stack.
+    if name == 'DatabaseChatbot':
+        from .db_chatbot import DatabaseChatbot
+        return DatabaseChatbot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,74 @@
+"""
+Content-addressed cache for synthesized speech.
+
+Audio is keyed by a hash of (text, voice, format) and kept in memory under a
+byte budget with least-recently-used eviction, so phrases that are spoken
+repeatedly (summaries, canned answers) skip synthesis entirely.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+
+
+def audio_key(text: str, voice: str, audio_format: str) -> str:
+    digest = hashlib.sha256()
+    for part in (text, voice, audio_format):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class AudioCache:
+    """Byte-budgeted LRU of synthesized audio keyed by content hash."""
+
+    def __init__(self, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text: str, voice: str, audio_format: str) -> Optional[bytes]:
+        key = audio_key(text, voice, audio_format)
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return audio
+
+    def put(self, text: str, voice: str, audio_format: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+        key = audio_key(text, voice, audio_format)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._entries[key] = audio
+            self.total_bytes += len(audio)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,295 @@
+"""
+Chart-ready aggregates of query results.
+
+Charts never need every row: a histogram needs bin counts, a box plot needs
+quantiles and a handful of outliers, and a line or scatter chart looks the
+same with a few thousand well-chosen points. These helpers compute those
+summaries with vectorized pandas/NumPy so a chart payload stays bounded by
+CHART_MAX_POINTS, CHART_MAX_BINS and CHART_MAX_CATEGORIES however many rows
+the query returned.
+"""
+
+import os
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+CHART_MAX_POINTS = int(os.getenv('CHART_MAX_POINTS', '2000'))
+CHART_HISTOGRAM_BINS = int(os.getenv('CHART_HISTOGRAM_BINS', '30'))
+CHART_MAX_BINS = int(os.getenv('CHART_MAX_BINS', '200'))
+CHART_MAX_CATEGORIES = int(os.getenv('CHART_MAX_CATEGORIES', '50'))
+CHART_MAX_OUTLIERS = int(os.getenv('CHART_MAX_OUTLIERS', '20'))
+
+CHART_KINDS = ('auto', 'histogram', 'box', 'line', 'scatter', 'bar')
+
+
+class ChartDataError(ValueError):
+    """The requested chart does not fit the result's columns."""
+
+
+def _values(series: pd.Series) -> List[Any]:
+    """JSON-safe list: NaN becomes None and timestamps become ISO strings."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return [None if pd.isna(v) else v.isoformat() for v in series]
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        array = series.to_numpy(dtype=float)
+        return [None if np.isnan(v) else float(v) for v in array]
+    return [None if pd.isna(v) else v for v in series.tolist()]
+
+
+def _numeric(df: pd.DataFrame, column: str) -> pd.Series:
+    series = df[column]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    # SQL decimals arrive as Python Decimal objects; float() converts them directly.
+    if series.dtype == object:
+        try:
+            series = series.astype(float)
+        except (TypeError, ValueError):
+            raise ChartDataError(f"Column '{column}' is not numeric")
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        raise ChartDataError(f"Column '{column}' is not numeric")
+    return series.astype(float)
+
+
+def _axis(df: pd.DataFrame, column: str) -> pd.Series:
+    """A sortable x axis: datetimes stay datetimes, date-like text is parsed."""
+    series = df[column]
+    if series.dtype == object and not _parses_as_number(series.dropna().head(20)):
+        with warnings.catch_warnings():
+            # Per-element parsing of non-date text is expected here and only coerces to NaT.
+            warnings.simplefilter('ignore', UserWarning)
+            if pd.to_datetime(series.dropna().head(20), errors='coerce').isna().any():
+                raise ChartDataError(f"Column '{column}' is neither numeric nor a date")
+            parsed = pd.to_datetime(series, errors='coerce')
+        if parsed.notna().sum() < series.notna().sum():
+            raise ChartDataError(f"Column '{column}' is neither numeric nor a date")
+        return parsed
+    return _numeric(df, column)
+
+
+def _parses_as_number(sample: pd.Series) -> bool:
+    try:
+        sample.astype(float)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _require(df: pd.DataFrame, *columns: Optional[str]):
+    for column in columns:
+        if column is not None and column not in df.columns:
+            raise ChartDataError(f"Unknown column '{column}'")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points preserving the shape.
+
+    `x` must be sorted. Bucket means come from cumulative sums, so each of the
+    `threshold` buckets costs one vectorized area computation.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    bounds = np.floor(np.arange(threshold - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_start = bounds[i + 1]
+        next_end = bounds[i + 2] if i + 2 < len(bounds) else n
+        span = next_end - next_start
+        avg_x = (cum_x[next_end] - cum_x[next_start]) / span
+        avg_y = (cum_y[next_end] - cum_y[next_start]) / span
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def sample_indices(n: int, k: int, seed: int = 0) -> np.ndarray:
+    """Sorted uniform sample of `k` row positions out of `n`, reproducible per seed."""
+    if k >= n:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size=k, replace=False))
+
+
+def histogram(df: pd.DataFrame, column: str, bins: int = CHART_HISTOGRAM_BINS) -> Dict[str, Any]:
+    _require(df, column)
+    values = _numeric(df, column)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        raise ChartDataError(f"Column '{column}' is a date; use a line chart")
+    values = values.dropna().to_numpy()
+    bins = max(1, min(bins, CHART_MAX_BINS))
+    if len(values) == 0:
+        return {"kind": "histogram", "x": column, "edges": [], "counts": [], "total": 0}
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        "kind": "histogram",
+        "x": column,
+        "edges": edges.tolist(),
+        "counts": counts.tolist(),
+        "total": int(len(values)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": float(values.mean()),
+    }
+
+
+def box_summary(df: pd.DataFrame, y: str, by: Optional[str] = None,
+                max_groups: int = CHART_MAX_CATEGORIES,
+                max_outliers: int = CHART_MAX_OUTLIERS) -> Dict[str, Any]:
+    """Quartiles, Tukey whiskers and a capped sample of outliers per group."""
+    _require(df, y, by)
+    values = _numeric(df, y)
+    groups = df[by].astype(str) if by else pd.Series('all', index=df.index)
+    frame = pd.DataFrame({'group': groups, 'value': values}).dropna(subset=['value'])
+    top_groups = frame['group'].value_counts().head(max_groups).index
+    frame = frame[frame['group'].isin(top_groups)]
+
+    grouped = frame.groupby('group', sort=True)['value']
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    stats = stats.join(grouped.agg(['count', 'mean', 'min', 'max']))
+    iqr = stats['q3'] - stats['q1']
+    fence_low = frame['group'].map(stats['q1'] - 1.5 * iqr)
+    fence_high = frame['group'].map(stats['q3'] + 1.5 * iqr)
+    inside = frame['value'].between(fence_low, fence_high)
+    whiskers = frame[inside].groupby('group')['value'].agg(['min', 'max'])
+    stats['lower_whisker'] = whiskers['min'].reindex(stats.index).fillna(stats['min'])
+    stats['upper_whisker'] = whiskers['max'].reindex(stats.index).fillna(stats['max'])
+    outliers = frame[~inside].groupby('group').head(max_outliers).groupby('group')['value'].agg(list)
+
+    return {
+        "kind": "box",
+        "y": y,
+        "by": by,
+        "groups": [
+            {
+                "name": name,
+                "count": int(row['count']),
+                "mean": float(row['mean']),
+                "min": float(row['min']),
+                "q1": float(row['q1']),
+                "median": float(row['median']),
+                "q3": float(row['q3']),
+                "max": float(row['max']),
+                "lower_whisker": float(row['lower_whisker']),
+                "upper_whisker": float(row['upper_whisker']),
+                "outliers": [float(v) for v in outliers.get(name, [])],
+            }
+            for name, row in stats.iterrows()
+        ],
+        "total": int(len(frame)),
+        "truncated_groups": bool(df[by].nunique() > max_groups) if by else False,
+    }
+
+
+def line_series(df: pd.DataFrame, x: str, y: str, max_points: int = CHART_MAX_POINTS) -> Dict[str, Any]:
+    """The result sorted by `x` and reduced to at most `max_points` with LTTB."""
+    _require(df, x, y)
+    frame = pd.DataFrame({'x': _axis(df, x), 'y': _numeric(df, y)}).dropna().sort_values('x', kind='stable')
+    x_values = frame['x']
+    x_numeric = (x_values.astype('int64').to_numpy(dtype=float)
+                 if pd.api.types.is_datetime64_any_dtype(x_values) else x_values.to_numpy(dtype=float))
+    keep = lttb_indices(x_numeric, frame['y'].to_numpy(dtype=float), max_points)
+    reduced = frame.iloc[keep]
+    return {
+        "kind": "line",
+        "x": x,
+        "y": y,
+        "points": {"x": _values(reduced['x']), "y": _values(reduced['y'])},
+        "total": int(len(frame)),
+        "returned": int(len(reduced)),
+        "downsampling": "lttb" if len(reduced) < len(frame) else None,
+    }
+
+
+def scatter_sample(df: pd.DataFrame, x: str, y: str, by: Optional[str] = None,
+                   max_points: int = CHART_MAX_POINTS, seed: int = 0) -> Dict[str, Any]:
+    """A uniform random sample of at most `max_points` (x, y[, by]) points."""
+    _require(df, x, y, by)
+    frame = pd.DataFrame({'x': _axis(df, x), 'y': _numeric(df, y)})
+    if by:
+        frame['by'] = df[by]
+    frame = frame.dropna(subset=['x', 'y'])
+    reduced = frame.iloc[sample_indices(len(frame), max_points, seed)]
+    points = {"x": _values(reduced['x']), "y": _values(reduced['y'])}
+    if by:
+        points["by"] = _values(reduced['by'])
+    return {
+        "kind": "scatter",
+        "x": x,
+        "y": y,
+        "by": by,
+        "points": points,
+        "total": int(len(frame)),
+        "returned": int(len(reduced)),
+        "downsampling": "uniform_sample" if len(reduced) < len(frame) else None,
+    }
+
+
+def category_totals(df: pd.DataFrame, x: str, y: Optional[str] = None,
+                    max_categories: int = CHART_MAX_CATEGORIES) -> Dict[str, Any]:
+    """Row counts (or the sum of `y`) per category; the tail is folded into 'Other'."""
+    _require(df, x, y)
+    keys = df[x].astype(str)
+    totals = (_numeric(df, y).groupby(keys).sum() if y else keys.value_counts()).sort_values(ascending=False)
+    other = None
+    if len(totals) > max_categories:
+        other = float(totals.iloc[max_categories - 1:].sum())
+        totals = totals.iloc[:max_categories - 1]
+    labels = [str(label) for label in totals.index]
+    values = [float(v) for v in totals.to_numpy()]
+    if other is not None:
+        labels.append('Other')
+        values.append(other)
+    return {"kind": "bar", "x": x, "y": y, "labels": labels, "values": values,
+            "aggregate": "sum" if y else "count", "total": int(len(df))}
+
+
+def chart_data(df: pd.DataFrame, kind: str = 'auto', x: Optional[str] = None, y: Optional[str] = None,
+               by: Optional[str] = None, max_points: int = CHART_MAX_POINTS,
+               bins: int = CHART_HISTOGRAM_BINS) -> Dict[str, Any]:
+    """Bounded chart payload for a result; `kind='auto'` picks one from the column types."""
+    if kind not in CHART_KINDS:
+        raise ChartDataError(f"Unsupported chart kind '{kind}'")
+    if kind == 'box' and y is not None:
+        return box_summary(df, y, by or x)
+    if x is None:
+        if df.columns.empty:
+            raise ChartDataError("The result has no columns")
+        x = df.columns[0]
+    max_points = max(3, min(max_points, CHART_MAX_POINTS))
+
+    if kind == 'auto':
+        try:
+            x_axis = _axis(df, x)
+        except ChartDataError:
+            x_axis = None
+        if y is None:
+            kind = 'histogram' if x_axis is not None and not pd.api.types.is_datetime64_any_dtype(x_axis) else 'bar'
+        elif x_axis is None:
+            kind = 'box' if len(df) > df[x].nunique() else 'bar'
+        else:
+            kind = 'line' if x_axis.is_monotonic_increasing else 'scatter'
+
+    if kind == 'histogram':
+        return histogram(df, x, bins)
+    if kind == 'bar':
+        return category_totals(df, x, y)
+    if y is None:
+        raise ChartDataError(f"A {kind} chart needs a y column")
+    if kind == 'box':
+        return box_summary(df, y, by or x)
+    if kind == 'line':
+        return line_series(df, x, y, max_points)
+    return scatter_sample(df, x, y, by, max_points)
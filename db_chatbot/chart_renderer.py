@@ -0,0 +1,308 @@
+"""
+Background rendering of result visualizations.
+
+Charts are built on a small worker pool so a query's answer is never held up
+by plotly. Every report is keyed by a fingerprint of the result data: a query
+whose rows were already rendered (or are being rendered right now) reuses that
+report instead of drawing it again. Reports embed their figures as plain divs
+and load plotly.js once from a shared `plotly.min.js` next to them, rather
+than writing one multi-megabyte HTML file per chart.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.offline
+
+from .data_analysis import count_skills
+from .chart_data import CHART_MAX_POINTS, box_summary, category_totals, sample_indices
+
+logger = logging.getLogger(__name__)
+
+VIZ_OUTPUT_DIR = os.getenv('VIZ_OUTPUT_DIR', 'visualizations')
+VIZ_RENDER_WORKERS = int(os.getenv('VIZ_RENDER_WORKERS', '2'))
+VIZ_CACHE_SIZE = int(os.getenv('VIZ_CACHE_SIZE', '256'))
+
+PLOTLY_BUNDLE = 'plotly.min.js'
+
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """Stable hash of a result's columns, dtypes and values."""
+    digest = hashlib.sha1()
+    digest.update(repr([(str(name), str(dtype)) for name, dtype in df.dtypes.items()]).encode())
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=False)
+    except TypeError:
+        # Unhashable cells (lists, dicts) are hashed by their text form.
+        hashed = pd.util.hash_pandas_object(df.astype(str), index=False)
+    digest.update(hashed.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def chart_insights(df: pd.DataFrame) -> List[str]:
+    """Headline facts shown alongside the charts; cheap enough to compute inline."""
+    insights = []
+    if 'department' in df.columns:
+        dept_counts = df['department'].value_counts()
+        largest_dept = dept_counts.index[0]
+        smallest_dept = dept_counts.index[-1]
+        insights.append(f"• {largest_dept} is the largest department with {dept_counts[largest_dept]} employees")
+        insights.append(f"• {smallest_dept} is the smallest department with {dept_counts[smallest_dept]} employees")
+
+    if 'salary' in df.columns:
+        salary = pd.to_numeric(df['salary'], errors='coerce')
+        insights.append(f"• Average salary across all departments: ${salary.mean():,.2f}")
+        insights.append(f"• Salary range: ${salary.min():,.2f} - ${salary.max():,.2f}")
+
+    if 'performance_score' in df.columns:
+        best_performer = df.loc[pd.to_numeric(df['performance_score'], errors='coerce').idxmax()]
+        insights.append(f"• Best performing employee: {best_performer['name']} in {best_performer['department']} with score {best_performer['performance_score']}")
+
+    if 'doj' in df.columns:
+        hire_years = pd.to_datetime(df['doj']).dt.year
+        yearly_counts = hire_years.groupby(hire_years).size()
+        insights.append(f"• Highest hiring year: {yearly_counts.idxmax()} with {yearly_counts.max()} new employees")
+
+    if 'skills' in df.columns:
+        skill_counts = count_skills(df['skills'])
+        if not skill_counts.empty:
+            insights.append(f"• Most common skill: {skill_counts.index[0]} with {skill_counts.iloc[0]} employees")
+
+    return insights
+
+
+def build_figures(df: pd.DataFrame, summarize: bool = False) -> List[Tuple[str, Any]]:
+    """The report's charts for whichever known columns the result has.
+
+    With `summarize`, charts are drawn from server-side aggregates (category
+    totals, box quantiles, a bounded scatter sample) instead of every row.
+    """
+    figures = []
+
+    # 1. Department Distribution
+    if 'department' in df.columns:
+        if summarize:
+            totals = category_totals(df, 'department')
+            fig = px.pie(names=totals['labels'], values=totals['values'],
+                         title='Employee Distribution by Department',
+                         color_discrete_sequence=px.colors.qualitative.Set3)
+        else:
+            fig = px.pie(df, names='department', title='Employee Distribution by Department',
+                         color_discrete_sequence=px.colors.qualitative.Set3)
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        fig.update_layout(title_x=0.5, title_font_size=20, showlegend=True, legend_title="Departments")
+        figures.append(('department_pie', fig))
+
+    # 2. Salary Analysis
+    if 'salary' in df.columns:
+        by_department = 'department' if 'department' in df.columns else None
+        if summarize:
+            # Precomputed quartiles and whiskers instead of one point per row
+            palette = px.colors.qualitative.Set3
+            fig = go.Figure([
+                go.Box(name=group['name'], q1=[group['q1']], median=[group['median']], q3=[group['q3']],
+                       lowerfence=[group['lower_whisker']], upperfence=[group['upper_whisker']],
+                       mean=[group['mean']], marker_color=palette[i % len(palette)])
+                for i, group in enumerate(box_summary(df, 'salary', by_department)['groups'])
+            ])
+            fig.update_layout(title='Salary Distribution by Department')
+        else:
+            fig = px.box(df, x=by_department, y='salary', title='Salary Distribution by Department',
+                         color=by_department, points='all', color_discrete_sequence=px.colors.qualitative.Set3)
+        fig.update_layout(title_x=0.5, title_font_size=20, xaxis_title="Department",
+                          yaxis_title="Salary", showlegend=False)
+        figures.append(('salary_box', fig))
+
+    # 3. Performance Analysis
+    if 'performance_score' in df.columns and 'salary' in df.columns:
+        points = df.iloc[sample_indices(len(df), CHART_MAX_POINTS)] if summarize else df
+        fig = px.scatter(
+            points,
+            x='salary',
+            y='performance_score',
+            color='department' if 'department' in df.columns else None,
+            title='Performance vs Salary by Department',
+            size='performance_score',
+            hover_data=['department'] if 'department' in df.columns else None,
+            color_discrete_sequence=px.colors.qualitative.Set3
+        )
+        fig.update_layout(title_x=0.5, title_font_size=20, xaxis_title="Salary", yaxis_title="Performance Score")
+        figures.append(('performance_scatter', fig))
+
+    # 4. Time-based Analysis; the caller's frame is left untouched
+    if 'doj' in df.columns:
+        hire_years = pd.to_datetime(df['doj']).dt.year
+        yearly_counts = hire_years.groupby(hire_years).size().rename_axis('Year').reset_index(name='Count')
+        fig = px.line(yearly_counts, x='Year', y='Count', title='Employee Hiring Trends Over Time', markers=True)
+        fig.update_layout(title_x=0.5, title_font_size=20, xaxis_title="Year",
+                          yaxis_title="Number of Employees Hired")
+        figures.append(('hiring_trends', fig))
+
+    # 5. Skills Analysis
+    if 'skills' in df.columns:
+        skill_counts = count_skills(df['skills']).head(10)
+        fig = px.bar(
+            x=skill_counts.index,
+            y=skill_counts.values,
+            title='Top 10 Skills Distribution',
+            color=skill_counts.values,
+            color_continuous_scale='Viridis'
+        )
+        fig.update_layout(title_x=0.5, title_font_size=20, xaxis_title="Skills",
+                          yaxis_title="Count", xaxis_tickangle=45)
+        figures.append(('skills_dist', fig))
+
+    return figures
+
+
+def render_report(figures: List[Tuple[str, Any]], insights: List[str]) -> str:
+    charts = ''.join(
+        f'<div class="viz-item">{fig.to_html(full_html=False, include_plotlyjs=False, div_id=name)}</div>'
+        for name, fig in figures
+    )
+    return f"""
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <script src="{PLOTLY_BUNDLE}"></script>
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 20px; }}
+            .container {{ max-width: 1200px; margin: 0 auto; }}
+            .header {{ text-align: center; margin-bottom: 30px; }}
+            .insights {{ background-color: #f8f9fa; padding: 20px; border-radius: 10px; margin-bottom: 20px; }}
+            .visualizations {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); gap: 20px; }}
+            .viz-item {{ border: 1px solid #ddd; padding: 10px; border-radius: 5px; }}
+            h1 {{ color: #2c3e50; }}
+            h2 {{ color: #34495e; }}
+            li {{ margin-bottom: 10px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>Data Analysis Report</h1>
+                <p>Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+            </div>
+
+            <div class="insights">
+                <h2>Key Insights</h2>
+                <ul>
+                    {''.join(f'<li>{insight}</li>' for insight in insights)}
+                </ul>
+            </div>
+
+            <div class="visualizations">
+                <h2>Interactive Visualizations</h2>
+                {charts}
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+
+def _write_atomic(path: str, content: str):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class ChartRenderer:
+    """Worker pool that renders each distinct result's report at most once."""
+
+    def __init__(self, output_dir: str = VIZ_OUTPUT_DIR, max_workers: int = VIZ_RENDER_WORKERS,
+                 cache_size: int = VIZ_CACHE_SIZE):
+        self.output_dir = output_dir
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='viz-render')
+        self._renders: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bundle_lock = threading.Lock()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.reused_on_disk = 0
+        self.rendered = 0
+        self.failures = 0
+        self.total_render_time = 0.0
+
+    def report_path(self, key: str) -> str:
+        return os.path.join(self.output_dir, f"report_{key}.html")
+
+    def submit(self, df: pd.DataFrame, insights: List[str],
+               summarize: Optional[bool] = None) -> Tuple[str, Future]:
+        """Queue a report for `df` unless one exists; returns its path and future.
+
+        Results larger than CHART_MAX_POINTS rows are summarized unless
+        `summarize` says otherwise. The frame is only read, never modified,
+        so callers may keep using it.
+        """
+        if summarize is None:
+            summarize = len(df) > CHART_MAX_POINTS
+        key = fingerprint(df)[:16] + ('_summary' if summarize else '')
+        path = self.report_path(key)
+        with self._lock:
+            future = self._renders.get(key)
+            if future is not None and not (future.done() and future.exception() is not None):
+                self._renders.move_to_end(key)
+                self.deduplicated += 1
+                return path, future
+            if os.path.exists(path):
+                future = Future()
+                future.set_result(path)
+                self.reused_on_disk += 1
+            else:
+                future = self._executor.submit(self._render, df, insights, path, summarize)
+                self.submitted += 1
+            self._renders[key] = future
+            while len(self._renders) > self.cache_size:
+                self._renders.popitem(last=False)
+        return path, future
+
+    def _ensure_bundle(self):
+        bundle_path = os.path.join(self.output_dir, PLOTLY_BUNDLE)
+        with self._bundle_lock:
+            if not os.path.exists(bundle_path):
+                _write_atomic(bundle_path, plotly.offline.get_plotlyjs())
+
+    def _render(self, df: pd.DataFrame, insights: List[str], path: str, summarize: bool) -> str:
+        started = time.perf_counter()
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._ensure_bundle()
+            _write_atomic(path, render_report(build_figures(df, summarize), insights))
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.warning(f"Error creating visualizations: {e}")
+            raise
+        with self._lock:
+            self.rendered += 1
+            self.total_render_time += time.perf_counter() - started
+        return path
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(1 for future in self._renders.values() if not future.done())
+        return {
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "reused_on_disk": self.reused_on_disk,
+            "rendered": self.rendered,
+            "failures": self.failures,
+            "pending": pending,
+            "avg_render_seconds": self.total_render_time / self.rendered if self.rendered else 0.0,
+        }
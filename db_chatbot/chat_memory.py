@@ -0,0 +1,184 @@
+"""
+Compact conversation memory.
+
+Messages live in a fixed-size ring buffer of slotted records, so trimming is
+free and a conversation costs O(turns). Result sets are never copied into the
+history: each is stored once in a shared, byte-budgeted `ResultStore` and the
+message only keeps a reference plus the result's schema and summary
+statistics.
+"""
+
+import os
+import uuid
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+CHAT_RESULT_STORE_MAX_BYTES = int(os.getenv('CHAT_RESULT_STORE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+
+class Message:
+    __slots__ = ('role', 'content', 'timestamp', 'metadata')
+
+    def __init__(self, role: str, content: str, timestamp: str, metadata: Dict[str, Any]):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+        self.metadata = metadata
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content,
+                "timestamp": self.timestamp, "metadata": self.metadata}
+
+
+def summarize_results(df: pd.DataFrame) -> Dict[str, Any]:
+    """Schema and per-column summary statistics of a result, without its rows."""
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        column = {"name": str(name), "dtype": str(series.dtype), "nulls": int(series.isna().sum())}
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series) and series.notna().any():
+            column.update(min=float(series.min()), max=float(series.max()), mean=float(series.mean()))
+        columns.append(column)
+    return {"row_count": int(len(df)), "columns": columns}
+
+
+class ResultStore:
+    """Byte-budgeted LRU of result DataFrames, referenced from chat memories by id."""
+
+    def __init__(self, max_bytes: int = CHAT_RESULT_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._frames: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def put(self, df: pd.DataFrame) -> str:
+        result_id = uuid.uuid4().hex
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return result_id
+        with self._lock:
+            self._frames[result_id] = (df, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._frames.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+        return result_id
+
+    def get(self, result_id: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._frames.get(result_id)
+            if entry is None:
+                return None
+            self._frames.move_to_end(result_id)
+            return entry[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "results": len(self._frames),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+result_store = ResultStore()
+
+
+def _empty_context(max_turns: int) -> Dict[str, Any]:
+    return {
+        'last_topic': None,
+        'last_department': None,
+        'last_metric': None,
+        'last_query': None,
+        'last_results': None,
+        'last_analysis': None,
+        'query_history': deque(maxlen=max_turns)
+    }
+
+
+class ChatMemory:
+    def __init__(self, max_turns: int = 10, store: Optional[ResultStore] = None):
+        self.max_turns = max_turns
+        self.store = store or result_store
+        self._messages: deque = deque(maxlen=max_turns * 2)
+        self.current_context = _empty_context(max_turns)
+
+    def add_message(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
+        metadata = metadata or {}
+        self._messages.append(Message(role, content, datetime.now().isoformat(), metadata))
+
+        # Update context based on message content and metadata
+        if role == 'user':
+            self.current_context['last_query'] = content
+            self.current_context['query_history'].append(content)
+
+        for key, context_key in (('result_id', 'last_results'), ('analysis', 'last_analysis'),
+                                 ('topic', 'last_topic'), ('department', 'last_department'),
+                                 ('metric', 'last_metric')):
+            if key in metadata:
+                self.current_context[context_key] = metadata[key]
+
+    def add_results(self, sql_query: str, df: pd.DataFrame, metadata: Optional[Dict[str, Any]] = None):
+        """Store a result set once and record a reference to it with its summary."""
+        summary = summarize_results(df)
+        names = ", ".join(c["name"] for c in summary["columns"])
+        self.add_message('assistant', f"{summary['row_count']} rows ({names})", {
+            'type': 'results',
+            'result_id': self.store.put(df),
+            'sql': sql_query,
+            **summary,
+            **(metadata or {})
+        })
+
+    def last_results(self) -> Optional[Dict[str, Any]]:
+        """Metadata of the most recent results message, if any."""
+        for message in reversed(self._messages):
+            if message.metadata.get('type') == 'results':
+                return message.metadata
+        return None
+
+    def get_results(self, metadata: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """The stored DataFrame for a results message, or None once it was evicted."""
+        return self.store.get(metadata.get('result_id', ''))
+
+    def get_context(self) -> List[Dict[str, Any]]:
+        return [message.as_dict() for message in self._messages]
+
+    def get_current_context(self) -> Dict[str, Any]:
+        return self.current_context
+
+    def clear(self):
+        self._messages.clear()
+        self.current_context = _empty_context(self.max_turns)
+
+    def get_formatted_history(self) -> str:
+        return "\n".join(f"{message.role}: {message.content}" for message in self._messages)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-data form of the memory, for spilling a session to disk."""
+        context = dict(self.current_context)
+        context['query_history'] = list(context['query_history'])
+        return {
+            'max_turns': self.max_turns,
+            'conversation_history': self.get_context(),
+            'current_context': context,
+        }
+
+    def load_dict(self, data: Dict[str, Any]):
+        self.max_turns = data.get('max_turns', self.max_turns)
+        self._messages = deque(
+            (Message(m['role'], m['content'], m['timestamp'], m.get('metadata', {}))
+             for m in data.get('conversation_history', [])),
+            maxlen=self.max_turns * 2
+        )
+        context = _empty_context(self.max_turns)
+        saved = dict(data.get('current_context', {}))
+        context['query_history'].extend(saved.pop('query_history', []))
+        context.update(saved)
+        self.current_context = context
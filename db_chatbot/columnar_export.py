@@ -0,0 +1,260 @@
+"""
+Arrow IPC (streaming format) and Parquet exports.
+
+Both writers consume the (columns, rows) batches produced by
+`result_stream.iter_batches(..., describe=True)`. The Arrow schema is fixed
+from the cursor's column descriptions (decimals keep their declared precision
+and scale, dates and timestamps stay temporal) before any row is read.
+Columns whose type the driver does not report (SQLite) are typed from their
+values: batches are held back until each such column has shown a non-null
+value (up to COLUMNAR_MAX_DEFERRED_ROWS rows), and the type is the narrowest
+one holding every value seen (ints widen to float64, mixes to string).
+
+Every batch is cast to the schema with checked casts. A value that does not
+fit - a fraction in an integer column, extra decimal places - raises
+ColumnarExportError instead of being truncated. The encoded bytes are yielded
+batch by batch, so exports never hold the full result.
+"""
+
+import io
+import os
+import logging
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COMPRESSION = os.getenv('EXPORT_COMPRESSION', 'zstd')
+COLUMNAR_BATCH_SIZE = int(os.getenv('COLUMNAR_BATCH_SIZE', '50000'))
+COLUMNAR_MAX_DEFERRED_ROWS = int(os.getenv('COLUMNAR_MAX_DEFERRED_ROWS', '1000000'))
+
+MEDIA_TYPES = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ColumnarExportError(ValueError):
+    """A value does not fit the type its column is exported with."""
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Arrow and Parquet exports require the 'pyarrow' package")
+
+
+def _infer_type(values: Sequence):
+    """Narrowest type holding every non-null value: ints widen to float64, mixes to string."""
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return pa.string()
+    if kinds <= {bool}:
+        return pa.bool_()
+    if kinds <= {int, bool}:
+        return pa.int64()
+    if kinds <= {int, bool, float}:
+        return pa.float64()
+    if kinds <= {int, Decimal}:
+        scale = max(
+            (-v.as_tuple().exponent for v in values if isinstance(v, Decimal) and v.is_finite()),
+            default=0
+        )
+        return pa.decimal128(38, max(0, min(scale, 18)))
+    if kinds <= {datetime}:
+        sample = next(v for v in values if v is not None)
+        return pa.timestamp('us', tz=str(sample.tzinfo) if sample.tzinfo else None)
+    if kinds <= {date}:
+        return pa.date32()
+    if kinds <= {dt_time}:
+        return pa.time64('us')
+    if kinds <= {bytes, bytearray}:
+        return pa.binary()
+    return pa.string()
+
+
+def _described_type(entry: Sequence[Any]):
+    """Arrow type for a DBAPI description entry, or None if the driver gives no usable type code.
+
+    pyodbc reports the Python type it returns for the column, plus the
+    declared precision and scale.
+    """
+    type_code = entry[1] if len(entry) > 1 else None
+    if not isinstance(type_code, type):
+        return None
+    if issubclass(type_code, bool):
+        return pa.bool_()
+    if issubclass(type_code, int):
+        return pa.int64()
+    if issubclass(type_code, float):
+        return pa.float64()
+    if issubclass(type_code, Decimal):
+        precision = entry[4] if len(entry) > 4 and entry[4] else 38
+        scale = entry[5] if len(entry) > 5 and entry[5] else 0
+        precision = max(1, min(int(precision), 38))
+        return pa.decimal128(precision, max(0, min(int(scale), precision)))
+    if issubclass(type_code, datetime):
+        return pa.timestamp('us')
+    if issubclass(type_code, date):
+        return pa.date32()
+    if issubclass(type_code, dt_time):
+        return pa.time64('us')
+    if issubclass(type_code, (bytes, bytearray)):
+        return pa.binary()
+    return pa.string()
+
+
+def infer_schema(columns: Sequence[Any], rows: Sequence[tuple]):
+    """Arrow schema for a result.
+
+    `columns` are names or DBAPI description entries; described types win,
+    the rest are inferred from `rows`.
+    """
+    _require_pyarrow()
+    fields = []
+    for i, column in enumerate(columns):
+        if isinstance(column, str):
+            name, arrow_type = column, None
+        else:
+            name, arrow_type = column[0], _described_type(column)
+        if arrow_type is None:
+            arrow_type = _infer_type([row[i] for row in rows])
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _column_array(values: List[Any], field):
+    if pa.types.is_string(field.type):
+        return pa.array([None if v is None else str(v) for v in values], type=field.type)
+    # pa.array(values, type=...) silently truncates (2.5 -> 2 for int64), so
+    # convert with the values' own type and cast with overflow and
+    # truncation checks.
+    if not pa.types.is_boolean(field.type):
+        values = [int(v) if isinstance(v, bool) else v for v in values]
+    try:
+        array = pa.array(values)
+        return array if array.type == field.type else array.cast(field.type, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        raise ColumnarExportError(f"Column '{field.name}' cannot be exported as {field.type}: {e}") from e
+
+
+def to_record_batch(schema, rows: Sequence[tuple]):
+    """A record batch of `rows` cast to `schema`; raises ColumnarExportError rather than lose data."""
+    arrays = [_column_array([row[i] for row in rows], field) for i, field in enumerate(schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def with_schema(batches: Iterator[Tuple[List[Any], List[tuple]]],
+                max_deferred_rows: int = COLUMNAR_MAX_DEFERRED_ROWS) -> Iterator[Tuple[Any, List[tuple]]]:
+    """(schema, rows) for each batch, holding batches back until every column can be typed.
+
+    A column without a described type is typed once it has shown a non-null
+    value; columns still all NULL after `max_deferred_rows` rows (or at the
+    end) are exported as strings.
+    """
+    pending: List[List[tuple]] = []
+    undecided = None
+    buffered = 0
+    columns = None
+    schema = None
+    for columns, rows in batches:
+        if schema is not None:
+            yield schema, rows
+            continue
+        if undecided is None:
+            undecided = {i for i, column in enumerate(columns)
+                         if isinstance(column, str) or _described_type(column) is None}
+        undecided = {i for i in undecided if all(row[i] is None for row in rows)}
+        pending.append(rows)
+        buffered += len(rows)
+        if undecided and buffered < max_deferred_rows:
+            continue
+        schema = infer_schema(columns, [row for part in pending for row in part])
+        for part in pending:
+            yield schema, part
+        pending = []
+    if schema is None and columns is not None:
+        schema = infer_schema(columns, [row for part in pending for row in part])
+        for part in pending:
+            yield schema, part
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def arrow_stream_chunks(batches: Iterator[Tuple[List[Any], List[tuple]]],
+                        compression: Optional[str] = EXPORT_COMPRESSION) -> Iterator[bytes]:
+    """Encode batches as an Arrow IPC stream with compressed record batches."""
+    _require_pyarrow()
+    sink = io.BytesIO()
+    writer = None
+    row_count = 0
+    try:
+        for schema, rows in with_schema(batches):
+            if writer is None:
+                options = pa.ipc.IpcWriteOptions(compression=compression or None)
+                writer = pa.ipc.new_stream(sink, schema, options=options)
+            if rows:
+                writer.write_batch(to_record_batch(schema, rows))
+                row_count += len(rows)
+            yield _drain(sink)
+    finally:
+        if writer is not None:
+            writer.close()
+    yield _drain(sink)
+    logger.info(f"Exported {row_count} rows as Arrow IPC")
+
+
+def parquet_chunks(batches: Iterator[Tuple[List[Any], List[tuple]]],
+                   compression: Optional[str] = EXPORT_COMPRESSION) -> Iterator[bytes]:
+    """Encode batches as a Parquet file, one row group per batch."""
+    _require_pyarrow()
+    sink = io.BytesIO()
+    writer = None
+    row_count = 0
+    try:
+        for schema, rows in with_schema(batches):
+            if writer is None:
+                writer = pq.ParquetWriter(sink, schema, compression=compression or 'none')
+            if rows:
+                writer.write_batch(to_record_batch(schema, rows))
+                row_count += len(rows)
+            yield _drain(sink)
+    finally:
+        if writer is not None:
+            writer.close()
+    yield _drain(sink)
+    logger.info(f"Exported {row_count} rows as Parquet")
+
+
+def dataframe_to_arrow(df, compression: Optional[str] = EXPORT_COMPRESSION) -> bytes:
+    """Arrow IPC stream bytes for an in-memory DataFrame."""
+    _require_pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    options = pa.ipc.IpcWriteOptions(compression=compression or None)
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table, max_chunksize=COLUMNAR_BATCH_SIZE)
+    return sink.getvalue()
+
+
+def dataframe_to_parquet(df, compression: Optional[str] = EXPORT_COMPRESSION) -> bytes:
+    """Parquet bytes for an in-memory DataFrame."""
+    _require_pyarrow()
+    sink = io.BytesIO()
+    pq.write_table(
+        pa.Table.from_pandas(df, preserve_index=False), sink,
+        compression=compression or 'none', row_group_size=COLUMNAR_BATCH_SIZE
+    )
+    return sink.getvalue()
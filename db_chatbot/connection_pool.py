@@ -0,0 +1,99 @@
+"""
+Sized, instrumented SQLAlchemy connection pool for DatabaseChatbot.
+
+Every query checks out its own pooled connection instead of sharing one
+long-lived `Connection` across threads. Checkout wait times and pool
+occupancy are recorded so the pool can be sized from real traffic.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+
+def create_pooled_engine(url: str, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW,
+                         pool_recycle: int = DB_POOL_RECYCLE, pool_timeout: float = DB_POOL_TIMEOUT,
+                         pool_pre_ping: bool = DB_POOL_PRE_PING, **kwargs):
+    """QueuePool engine; recycle stays below Azure SQL's idle-connection cutoff."""
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=pool_recycle,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=pool_pre_ping,
+        **kwargs
+    )
+
+
+class PooledDatabase:
+    """Per-call connection checkout with wait-time accounting."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        started = time.perf_counter()
+        try:
+            conn = self.engine.connect()
+        except PoolTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            logger.warning(f"Timed out waiting for a pooled connection ({self.describe()})")
+            raise
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        try:
+            yield conn
+        finally:
+            conn.close()
+            with self._lock:
+                self.in_use -= 1
+
+    def describe(self) -> str:
+        return self.engine.pool.status()
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        stats = {
+            "checkouts": self.checkouts,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": self.total_wait / self.checkouts if self.checkouts else 0.0,
+            "max_wait_seconds": self.max_wait,
+        }
+        # QueuePool reports its sizing; other pool classes may not.
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            if callable(method):
+                stats[f"pool_{name}"] = method()
+        stats["max_overflow"] = getattr(pool, '_max_overflow', None)
+        return stats
@@ -0,0 +1,218 @@
+"""
+Pre-execution cost guard for generated SQL.
+
+Before a generated statement runs, SQL Server is asked for its estimated plan
+(`SET SHOWPLAN_XML ON`), which compiles the statement without executing it.
+The plan's estimated subtree cost and row count decide what happens next:
+
+- cost above COST_GUARD_REJECT_COST: the statement is refused;
+- cost above COST_GUARD_ASYNC_COST: it is handed to a background job;
+- estimated rows above COST_GUARD_MAX_ROWS: it runs with `TOP (n)` injected;
+- otherwise it runs unchanged.
+
+Decisions are memoized per canonical statement for COST_GUARD_CACHE_TTL
+seconds. Every decision is logged and kept for GET /api/metrics/cost-guard,
+memoized ones flagged `cached` with the estimate they were made from. Other
+databases have no SHOWPLAN, so the guard allows everything there.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from .pagination import _top_level_keywords
+from .result_cache import canonicalize_sql
+
+logger = logging.getLogger(__name__)
+
+COST_GUARD = os.getenv('COST_GUARD', 'true').lower() in ('1', 'true', 'yes')
+COST_GUARD_REJECT_COST = float(os.getenv('COST_GUARD_REJECT_COST', '1000'))
+COST_GUARD_ASYNC_COST = float(os.getenv('COST_GUARD_ASYNC_COST', '50'))
+COST_GUARD_MAX_ROWS = int(os.getenv('COST_GUARD_MAX_ROWS', '10000'))
+COST_GUARD_FAIL_OPEN = os.getenv('COST_GUARD_FAIL_OPEN', 'true').lower() in ('1', 'true', 'yes')
+COST_GUARD_CACHE_TTL = float(os.getenv('COST_GUARD_CACHE_TTL', '300'))
+COST_GUARD_CACHE_SIZE = int(os.getenv('COST_GUARD_CACHE_SIZE', '512'))
+
+ALLOW, LIMIT, ASYNC, REJECT = 'allow', 'limit', 'async', 'reject'
+
+_TOP_CLAUSE = re.compile(r'\s*(\()?\s*(\d+)(?(1)\s*\))(\s*percent\b)?', re.IGNORECASE)
+
+
+class CostDecision:
+    __slots__ = ('action', 'sql', 'estimated_cost', 'estimated_rows', 'reason')
+
+    def __init__(self, action: str, sql: str, estimated_cost: Optional[float] = None,
+                 estimated_rows: Optional[float] = None, reason: str = ''):
+        self.action = action
+        self.sql = sql
+        self.estimated_cost = estimated_cost
+        self.estimated_rows = estimated_rows
+        self.reason = reason
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"action": self.action, "estimated_cost": self.estimated_cost,
+                "estimated_rows": self.estimated_rows, "reason": self.reason}
+
+
+def parse_showplan(plan_xml: str) -> Dict[str, float]:
+    """Total estimated subtree cost and the final statement's estimated rows."""
+    root = ET.fromstring(plan_xml)
+    statements = [el for el in root.iter() if el.tag.endswith('}StmtSimple') or el.tag == 'StmtSimple']
+    if not statements:
+        raise ValueError("Plan has no statements")
+    cost = sum(float(stmt.get('StatementSubTreeCost', 0) or 0) for stmt in statements)
+    rows = float(statements[-1].get('StatementEstRows', 0) or 0)
+    return {"estimated_cost": cost, "estimated_rows": rows}
+
+
+def limit_rows(sql_query: str, max_rows: int) -> Optional[str]:
+    """The statement with its final SELECT capped at TOP (max_rows), or None if it cannot be capped."""
+    sql_query = sql_query.strip().rstrip(';').strip()
+    words = list(_top_level_keywords(sql_query))
+    if not words or words[0][1] not in ('select', 'with'):
+        return None
+    if any(word in ('union', 'except', 'intersect', 'offset') for _, word in words):
+        return None
+    selects = [i for i, (_, word) in enumerate(words) if word == 'select']
+    if not selects:
+        return None
+    i = selects[0]
+    pos, word = words[i]
+    insert_at = pos + len(word)
+    if i + 1 < len(words) and words[i + 1][1] in ('distinct', 'all'):
+        pos, word = words[i + 1]
+        insert_at = pos + len(word)
+        i += 1
+    if i + 1 < len(words) and words[i + 1][1] == 'top':
+        top_end = words[i + 1][0] + 3
+        match = _TOP_CLAUSE.match(sql_query, top_end)
+        if match is None or match.group(3):
+            return None
+        if int(match.group(2)) <= max_rows:
+            return sql_query
+        return f"{sql_query[:top_end]} ({max_rows}){sql_query[match.end():]}"
+    return f"{sql_query[:insert_at]} TOP ({max_rows}){sql_query[insert_at:]}"
+
+
+class CostGuard:
+    """Estimated-plan check with reject / async / TOP-injection decisions."""
+
+    def __init__(self, engine, enabled: bool = COST_GUARD, reject_cost: float = COST_GUARD_REJECT_COST,
+                 async_cost: float = COST_GUARD_ASYNC_COST, max_rows: int = COST_GUARD_MAX_ROWS,
+                 fail_open: bool = COST_GUARD_FAIL_OPEN, cache_ttl: float = COST_GUARD_CACHE_TTL,
+                 cache_size: int = COST_GUARD_CACHE_SIZE):
+        self.engine = engine
+        self.enabled = enabled and engine.dialect.name == 'mssql'
+        self.reject_cost = reject_cost
+        self.async_cost = async_cost
+        self.max_rows = max_rows
+        self.fail_open = fail_open
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._decisions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._recent: deque = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self.counts = {ALLOW: 0, LIMIT: 0, ASYNC: 0, REJECT: 0}
+        self.plan_errors = 0
+        self.cache_hits = 0
+        self.total_plan_time = 0.0
+        self.plans = 0
+
+    def estimate(self, sql_query: str) -> Dict[str, float]:
+        """Compile the statement under SHOWPLAN_XML on a dedicated connection; nothing is executed."""
+        started = time.perf_counter()
+        with self.engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            conn.exec_driver_sql("SET SHOWPLAN_XML ON")
+            try:
+                plan_xml = conn.exec_driver_sql(sql_query).scalar()
+            finally:
+                try:
+                    conn.exec_driver_sql("SET SHOWPLAN_XML OFF")
+                except Exception:
+                    # Never hand a SHOWPLAN session back to the pool.
+                    conn.invalidate()
+                    raise
+        with self._lock:
+            self.plans += 1
+            self.total_plan_time += time.perf_counter() - started
+        return parse_showplan(plan_xml)
+
+    def check(self, sql_query: str) -> CostDecision:
+        if not self.enabled:
+            return CostDecision(ALLOW, sql_query, reason="cost guard disabled")
+        key = canonicalize_sql(sql_query)
+        now = time.time()
+        with self._lock:
+            cached = self._decisions.get(key)
+            if cached is not None and now - cached[0] <= self.cache_ttl:
+                self._decisions.move_to_end(key)
+                self.cache_hits += 1
+                self._recent.append({"at": now, "sql": sql_query, "cached": True, **cached[1].as_dict()})
+            else:
+                cached = None
+        if cached is not None:
+            self._log(sql_query, cached[1], cached=True)
+            return cached[1]
+
+        decision = self.decide(sql_query)
+        with self._lock:
+            self.counts[decision.action] += 1
+            self._recent.append({"at": now, "sql": sql_query, "cached": False, **decision.as_dict()})
+            self._decisions[key] = (now, decision)
+            while len(self._decisions) > self.cache_size:
+                self._decisions.popitem(last=False)
+        self._log(sql_query, decision, cached=False)
+        return decision
+
+    @staticmethod
+    def _log(sql_query: str, decision: CostDecision, cached: bool):
+        log = logger.warning if decision.action in (REJECT, ASYNC) else logger.info
+        log(f"Cost guard {decision.action}: cost={decision.estimated_cost} rows={decision.estimated_rows} "
+            f"cached={cached} ({decision.reason}) for: {sql_query}")
+
+    def decide(self, sql_query: str) -> CostDecision:
+        try:
+            plan = self.estimate(sql_query)
+        except Exception as e:
+            with self._lock:
+                self.plan_errors += 1
+            if self.fail_open:
+                return CostDecision(ALLOW, sql_query, reason=f"no estimated plan: {e}")
+            return CostDecision(REJECT, sql_query, reason=f"no estimated plan: {e}")
+
+        cost, rows = plan["estimated_cost"], plan["estimated_rows"]
+        if cost > self.reject_cost:
+            return CostDecision(REJECT, sql_query, cost, rows,
+                                f"estimated cost {cost:.1f} exceeds {self.reject_cost:g}")
+        if cost > self.async_cost:
+            return CostDecision(ASYNC, sql_query, cost, rows,
+                                f"estimated cost {cost:.1f} exceeds {self.async_cost:g}; running as a background job")
+        if rows > self.max_rows:
+            limited = limit_rows(sql_query, self.max_rows)
+            if limited is not None:
+                return CostDecision(LIMIT, limited, cost, rows,
+                                    f"estimated {rows:,.0f} rows; limited to TOP ({self.max_rows})")
+            return CostDecision(ASYNC, sql_query, cost, rows,
+                                f"estimated {rows:,.0f} rows and no TOP can be added; running as a background job")
+        return CostDecision(ALLOW, sql_query, cost, rows, "within limits")
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._recent)[-limit:]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "decisions": dict(self.counts),
+            "cache_hits": self.cache_hits,
+            "plan_errors": self.plan_errors,
+            "avg_plan_seconds": self.total_plan_time / self.plans if self.plans else 0.0,
+            "thresholds": {"reject_cost": self.reject_cost, "async_cost": self.async_cost,
+                           "max_rows": self.max_rows},
+        }
@@ -10,14 +10,20 @@ from typing import List, Dict, Any, Optional
 import numpy as np
 from io import StringIO
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import urllib.parse
 import warnings
 import time
 from .advanced_queries import NATURAL_LANGUAGE_EXAMPLES
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+from .schema_catalog import schema_catalog, format_schema_text
+from .columnar_export import dataframe_to_arrow, dataframe_to_parquet
+from .intent_matcher import IntentMatcher, select_all_employees
+from .connection_pool import create_pooled_engine, PooledDatabase
+from .chat_memory import ChatMemory
+from .data_analysis import analyze_dataframe
+from .chart_renderer import ChartRenderer, chart_insights
+from .request_deadlines import install_statement_tracking, LLM_STAGE_TIMEOUT
+from .sql_parser import validate_sql
 import textwrap
 
 # Load environment variables from .env file
@@ -45,79 +51,11 @@ if not AZURE_OPENAI_ENDPOINT:
 # Suppress specific FutureWarning
 warnings.filterwarnings('ignore', category=FutureWarning, module='seaborn.categorical')
 
-class ChatMemory:
-    def __init__(self, max_turns: int = 10):
-        self.max_turns = max_turns
-        self.conversation_history: List[Dict[str, Any]] = []
-        self.current_context = {
-            'last_topic': None,
-            'last_department': None,
-            'last_metric': None,
-            'last_query': None,
-            'last_results': None,
-            'last_analysis': None,
-            'query_history': []
-        }
-        
-    def add_message(self, role: str, content: str, metadata: Optional[Dict[str, Any]] = None):
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat(),
-            "metadata": metadata or {}
-        }
-        self.conversation_history.append(message)
-        
-        # Update context based on message content and metadata
-        if role == 'user':
-            self.current_context['last_query'] = content
-            self.current_context['query_history'].append(content)
-            if len(self.current_context['query_history']) > self.max_turns:
-                self.current_context['query_history'] = self.current_context['query_history'][-self.max_turns:]
-        
-        if metadata:
-            if 'results' in metadata:
-                self.current_context['last_results'] = metadata['results']
-            if 'analysis' in metadata:
-                self.current_context['last_analysis'] = metadata['analysis']
-            if 'topic' in metadata:
-                self.current_context['last_topic'] = metadata['topic']
-            if 'department' in metadata:
-                self.current_context['last_department'] = metadata['department']
-            if 'metric' in metadata:
-                self.current_context['last_metric'] = metadata['metric']
-        
-        if len(self.conversation_history) > self.max_turns * 2:
-            self.conversation_history = self.conversation_history[-self.max_turns*2:]
-    
-    def get_context(self) -> List[Dict[str, Any]]:
-        return self.conversation_history
-    
-    def get_current_context(self) -> Dict[str, Any]:
-        return self.current_context
-    
-    def clear(self):
-        self.conversation_history = []
-        self.current_context = {
-            'last_topic': None,
-            'last_department': None,
-            'last_metric': None,
-            'last_query': None,
-            'last_results': None,
-            'last_analysis': None,
-            'query_history': []
-        }
-
-    def get_formatted_history(self) -> str:
-        return "\n".join([
-            f"{msg['role']}: {msg['content']}"
-            for msg in self.conversation_history
-        ])
-
 class DatabaseChatbot:
     def __init__(self, connection_string=None, api_key=None, api_version=None, deployment_name=None, endpoint=None):
         """Initialize the chatbot with conversation context and state management."""
-        self.conn = None
+        self.engine = None
+        self.db = None
         self.last_query = None
         self.last_analysis = None
         self.conversation_context = {
@@ -127,6 +65,9 @@ class DatabaseChatbot:
             'query_history': []
         }
         self.chat_memory = ChatMemory()
+        # No LLM behind this path, so the looser keyword rules stay on
+        self.intent_matcher = IntentMatcher(keyword_rules=True)
+        self.chart_renderer = ChartRenderer()
         
         # Store configuration
         self.connection_string = connection_string or AZURE_SQL_CONNECTION_STRING
@@ -143,7 +84,7 @@ class DatabaseChatbot:
         """Print enhanced help information with examples and guidance."""
         print("\nAvailable commands:")
         print("- 'export <format> <query>': Export results")
-        print("  Formats: csv, sql, excel, json")
+        print("  Formats: csv, sql, excel, json, arrow, parquet")
         print("- 'quit': Exit the program")
         print("- 'help': Show this help message")
         print("- 'context': Show current conversation context")
@@ -203,12 +144,12 @@ class DatabaseChatbot:
         if analysis:
             self.last_analysis = analysis
 
-    def get_suggested_queries(self):
+    def get_suggested_queries(self, memory: Optional[ChatMemory] = None):
         """Generate relevant query suggestions based on conversation context."""
         suggestions = []
         
         # Get current context
-        context = self.chat_memory.get_current_context()
+        context = (memory or self.chat_memory).get_current_context()
         last_topic = context.get('last_topic')
         last_department = context.get('last_department')
         last_metric = context.get('last_metric')
@@ -359,7 +300,7 @@ class DatabaseChatbot:
                 print(f"Last Department: {context['last_department']}")
                 print(f"Last Metric: {context['last_metric']}")
                 print("\nRecent Queries:")
-                for q in context['query_history'][-3:]:
+                for q in list(context['query_history'])[-3:]:
                     print(f"- {q}")
                 return
             
@@ -377,9 +318,6 @@ class DatabaseChatbot:
             results = self.execute_query(sql_query)
             
             if results is not None and not results.empty:
-                # Add SQL query to memory
-                self.chat_memory.add_message('assistant', sql_query, {'type': 'sql'})
-                
                 print("\nQuery Results:")
                 print(results)
                 
@@ -388,19 +326,7 @@ class DatabaseChatbot:
                 print("\nAnalysis:")
                 print(analysis)
                 
-                # Add results and analysis to memory with metadata
-                self.chat_memory.add_message('assistant', str(results), {
-                    'type': 'results',
-                    'data': results.to_dict('records'),
-                    'topic': self.extract_topic(query),
-                    'department': self.extract_department(query),
-                    'metric': self.extract_metric(query)
-                })
-                
-                self.chat_memory.add_message('assistant', analysis, {
-                    'type': 'analysis',
-                    'data': analysis
-                })
+                self.remember_results(self.chat_memory, query, sql_query, results, analysis)
                 
                 # Generate visualizations
                 viz_message = self.visualize_data(results)
@@ -414,6 +340,20 @@ class DatabaseChatbot:
         except Exception as e:
             self.handle_error(e, query)
 
+    def remember_results(self, memory: ChatMemory, query: str, sql_query: str,
+                         results: pd.DataFrame, analysis: str):
+        """Record a turn's SQL, results and analysis in a conversation memory."""
+        memory.add_message('assistant', sql_query, {'type': 'sql'})
+        
+        # Results are stored once in the result store; memory keeps a reference
+        memory.add_results(sql_query, results, {
+            'topic': self.extract_topic(query),
+            'department': self.extract_department(query),
+            'metric': self.extract_metric(query)
+        })
+        
+        memory.add_message('assistant', analysis, {'type': 'analysis'})
+
     def extract_topic(self, query: str) -> Optional[str]:
         """Extract the main topic from a query."""
         query = query.lower()
@@ -461,13 +401,17 @@ class DatabaseChatbot:
             self.client = AzureOpenAI(
                 api_key=self.api_key,
                 api_version=self.api_version,
-                azure_endpoint=self.endpoint
+                azure_endpoint=self.endpoint,
+                # A synchronous call cannot be cancelled, so it ends with the LLM stage
+                timeout=LLM_STAGE_TIMEOUT
             )
             
-            # Initialize database connection
+            # Initialize the connection pool; each query checks out its own connection
             params = urllib.parse.quote_plus(self.connection_string)
-            engine = create_engine(f"mssql+pyodbc:///?odbc_connect={params}")
-            self.conn = engine.connect()
+            self.engine = install_statement_tracking(create_pooled_engine(f"mssql+pyodbc:///?odbc_connect={params}"))
+            self.db = PooledDatabase(self.engine)
+            with self.db.connection():
+                pass
             print("Successfully connected to the database!")
             
         except Exception as e:
@@ -477,448 +421,67 @@ class DatabaseChatbot:
     def get_schema_info(self) -> str:
         """Get database schema information."""
         try:
-            cursor = self.conn.cursor()
-            
-            # Get table information
-            cursor.execute("""
-                SELECT 
-                    t.name AS table_name,
-                    c.name AS column_name,
-                    ty.name AS data_type,
-                    c.max_length,
-                    c.precision,
-                    c.scale,
-                    c.is_nullable
-                FROM sys.tables t
-                INNER JOIN sys.columns c ON t.object_id = c.object_id
-                INNER JOIN sys.types ty ON c.user_type_id = ty.user_type_id
-                ORDER BY t.name, c.column_id;
-            """)
-            
-            # Get results
-            columns = [column[0] for column in cursor.description]
-            results = cursor.fetchall()
-            
-            # Create DataFrame
-            schema_df = pd.DataFrame(results, columns=columns)
-            
-            # Close cursor
-            cursor.close()
-            
-            # Format schema information
-            schema_info = []
-            current_table = None
-            
-            for _, row in schema_df.iterrows():
-                if row['table_name'] != current_table:
-                    current_table = row['table_name']
-                    schema_info.append(f"\nTable: {current_table}")
-                    schema_info.append("-" * (len(current_table) + 7))
-                
-                nullable = "NULL" if row['is_nullable'] else "NOT NULL"
-                schema_info.append(f"  {row['column_name']}: {row['data_type']} {nullable}")
-            
-            return "\n".join(schema_info)
-            
+            with self.db.connection() as conn:
+                schema = schema_catalog.get_schema(conn)
+            return format_schema_text(schema)
         except Exception as e:
             raise Exception(f"Error getting schema information: {str(e)}")
 
+    def refresh_schema(self) -> str:
+        """Reload the cached schema catalog and return the new description."""
+        with self.db.connection() as conn:
+            schema = schema_catalog.refresh(conn)
+        return format_schema_text(schema)
+
     def generate_sql_query(self, query: str) -> str:
         """Generate SQL query from natural language input."""
         try:
-            # Define expected columns
-            expected_columns = [
-                'id', 'name', 'department', 'salary', 
-                'doj', 'manager_id', 'performance_score', 'skills'
-            ]
-            
-            # Simple query mapping for common requests
-            query = query.lower().strip()
-            
-            # Base SELECT statement with all columns
-            base_select = f"""
-                SELECT 
-                    {', '.join(expected_columns)}
-                FROM employees
-            """
-            
-            if query == "show me all employees":
-                return base_select
-            
-            if "top" in query and "paid" in query:
-                limit = 5  # default
-                if "5" in query:
-                    limit = 5
-                elif "10" in query:
-                    limit = 10
-                return f"""
-                    SELECT TOP {limit}
-                        {', '.join(expected_columns)}
-                    FROM employees 
-                    ORDER BY salary DESC
-                """
-            
-            if "how many employees" in query and "department" in query:
-                return """
-                    SELECT 
-                        department,
-                        COUNT(*) as employee_count 
-                    FROM employees 
-                    GROUP BY department
-                """
-            
-            if "group" in query and "department" in query:
-                return """
-                    SELECT 
-                        department,
-                        COUNT(*) as employee_count,
-                        AVG(salary) as avg_salary,
-                        AVG(performance_score) as avg_performance
-                    FROM employees 
-                    GROUP BY department
-                """
-            
-            if "performance" in query:
-                return """
-                    SELECT 
-                        department,
-                        AVG(performance_score) as avg_performance,
-                        COUNT(*) as employee_count
-                    FROM employees
-                    GROUP BY department
-                    ORDER BY avg_performance DESC
-                """
-            
-            if "skills" in query:
-                return """
-                    SELECT 
-                        department,
-                        STRING_AGG(DISTINCT skills, ', ') as unique_skills,
-                        COUNT(DISTINCT skills) as skill_count
-                    FROM employees
-                    GROUP BY department
-                """
-            
-            if "trends" in query or "hiring" in query:
-                return """
-                    SELECT 
-                        YEAR(doj) as hire_year,
-                        COUNT(*) as new_employees
-                    FROM employees
-                    GROUP BY YEAR(doj)
-                    ORDER BY hire_year
-                """
-            
+            match = self.intent_matcher.match(query)
+            if match is not None:
+                return match.sql_query
+
             # Default query if no specific pattern matches
-            return base_select
-            
+            return select_all_employees()
+
         except Exception as e:
             raise Exception(f"Error generating SQL query: {str(e)}")
 
-    def execute_query(sql_query: str) -> List[Dict[str, Any]]:
+    def execute_query(self, sql_query: str) -> pd.DataFrame:
+        """Run a query on its own pooled connection and return the rows as a DataFrame."""
+        validate_sql(sql_query)
         try:
-            with engine.connect() as conn:
+            with self.db.connection() as conn:
                 result = conn.execute(text(sql_query))
-                columns = result.keys()
+                columns = list(result.keys())
                 rows = result.fetchall()
-                print(f"📊 Columns: {columns}")
-                for idx, row in enumerate(rows):
-                    print(f"Row {idx}: {row}")
-                return [{col: val for col, val in zip(columns, row)} for row in rows]
+            print(f"📊 Columns: {columns} ({len(rows)} rows)")
+            return pd.DataFrame.from_records(rows, columns=columns)
         except Exception as e:
             print("❌ Exception in execute_query:", e)
-            raise HTTPException(status_code=400, detail=str(e))
+            raise Exception(f"Error executing query: {str(e)}")
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool occupancy and checkout wait times."""
+        return self.db.stats() if self.db else {}
 
     def analyze_data(self, df: pd.DataFrame) -> str:
         """Analyze data and return focused, actionable insights."""
         try:
-            analysis = []
-            
-            # 1. Quick Summary
-            analysis.append("📊 QUICK SUMMARY")
-            analysis.append("=" * 50)
-            analysis.append(f"Total Employees: {len(df):,}")
-            if 'department' in df.columns:
-                dept_counts = df['department'].value_counts()
-                analysis.append("\nDepartment Distribution:")
-                for dept, count in dept_counts.items():
-                    analysis.append(f"  • {dept}: {count:,} employees")
-            
-            # 2. Key Metrics
-            analysis.append("\n📈 KEY METRICS")
-            analysis.append("=" * 50)
-            
-            if 'salary' in df.columns:
-                analysis.append("\nSalary Analysis:")
-                analysis.append(f"  • Average Salary: ${df['salary'].mean():,.2f}")
-                analysis.append(f"  • Highest Salary: ${df['salary'].max():,.2f}")
-                analysis.append(f"  • Lowest Salary: ${df['salary'].min():,.2f}")
-                
-                if 'department' in df.columns:
-                    dept_salaries = df.groupby('department')['salary'].agg(['mean', 'min', 'max'])
-                    analysis.append("\nSalary by Department:")
-                    for dept, stats in dept_salaries.iterrows():
-                        analysis.append(f"  • {dept}:")
-                        analysis.append(f"    - Average: ${stats['mean']:,.2f}")
-                        analysis.append(f"    - Range: ${stats['min']:,.2f} - ${stats['max']:,.2f}")
-            
-            if 'performance_score' in df.columns:
-                analysis.append("\nPerformance Analysis:")
-                analysis.append(f"  • Average Performance: {df['performance_score'].mean():.2f}/5.0")
-                analysis.append(f"  • Top Performers: {len(df[df['performance_score'] >= 4.5]):,} employees")
-                
-                if 'department' in df.columns:
-                    dept_performance = df.groupby('department')['performance_score'].mean()
-                    analysis.append("\nPerformance by Department:")
-                    for dept, score in dept_performance.items():
-                        analysis.append(f"  • {dept}: {score:.2f}/5.0")
-            
-            # 3. Skills Analysis
-            if 'skills' in df.columns:
-                analysis.append("\n🔧 SKILLS ANALYSIS")
-                analysis.append("=" * 50)
-                
-                # Count individual skills
-                all_skills = []
-                for skills in df['skills']:
-                    all_skills.extend([s.strip() for s in skills.split(',')])
-                skill_counts = pd.Series(all_skills).value_counts()
-                
-                analysis.append("\nTop Skills:")
-                for skill, count in skill_counts.head(5).items():
-                    analysis.append(f"  • {skill}: {count:,} employees")
-            
-            # 4. Hiring Trends
-            if 'doj' in df.columns:
-                analysis.append("\n📅 HIRING TRENDS")
-                analysis.append("=" * 50)
-                
-                df['doj'] = pd.to_datetime(df['doj'])
-                yearly_hires = df.groupby(df['doj'].dt.year).size()
-                
-                analysis.append("\nYearly Hiring:")
-                for year, count in yearly_hires.items():
-                    analysis.append(f"  • {year}: {count:,} new employees")
-            
-            # 5. Key Insights
-            analysis.append("\n💡 KEY INSIGHTS")
-            analysis.append("=" * 50)
-            
-            # Add insights based on the data
-            if 'salary' in df.columns and 'department' in df.columns:
-                highest_paid_dept = df.groupby('department')['salary'].mean().idxmax()
-                analysis.append(f"  • {highest_paid_dept} department has the highest average salary")
-            
-            if 'performance_score' in df.columns and 'department' in df.columns:
-                best_performing_dept = df.groupby('department')['performance_score'].mean().idxmax()
-                analysis.append(f"  • {best_performing_dept} department shows the best performance")
-            
-            if 'skills' in df.columns:
-                most_common_skill = skill_counts.index[0]
-                analysis.append(f"  • {most_common_skill} is the most common skill")
-            
-            return "\n".join(analysis)
-            
+            return analyze_dataframe(df)
         except Exception as e:
             return f"Error analyzing data: {str(e)}"
 
-    def visualize_data(self, df: pd.DataFrame) -> str:
-        """Create beautiful and interactive visualizations based on data."""
+    def visualize_data(self, df: pd.DataFrame, summarize: Optional[bool] = None) -> str:
+        """Queue interactive visualizations of the data and return their insights.
+
+        Large results (or `summarize=True`) are charted from server-side
+        aggregates and samples rather than every row.
+        """
         try:
-            # Create timestamp for unique filenames
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base_filename = f"visualization_{timestamp}"
-            
-            # Create visualizations directory if it doesn't exist
-            os.makedirs('visualizations', exist_ok=True)
-            
-            # Get numeric and categorical columns
-            numeric_cols = df.select_dtypes(include=[np.number]).columns
-            categorical_cols = df.select_dtypes(include=['object']).columns
-            
-            visualizations = []
-            insights = []
-            
-            # 1. Department Distribution (if department column exists)
-            if 'department' in df.columns:
-                # Create a beautiful pie chart with plotly
-                fig = px.pie(
-                    df, 
-                    names='department',
-                    title='Employee Distribution by Department',
-                    color_discrete_sequence=px.colors.qualitative.Set3
-                )
-                fig.update_traces(textposition='inside', textinfo='percent+label')
-                fig.update_layout(
-                    title_x=0.5,
-                    title_font_size=20,
-                    showlegend=True,
-                    legend_title="Departments"
-                )
-                fig.write_html(f'visualizations/{base_filename}_department_pie.html')
-                visualizations.append(f'visualizations/{base_filename}_department_pie.html')
-                
-                # Add insight
-                dept_counts = df['department'].value_counts()
-                largest_dept = dept_counts.index[0]
-                smallest_dept = dept_counts.index[-1]
-                insights.append(f"• {largest_dept} is the largest department with {dept_counts[largest_dept]} employees")
-                insights.append(f"• {smallest_dept} is the smallest department with {dept_counts[smallest_dept]} employees")
-            
-            # 2. Salary Analysis (if salary column exists)
-            if 'salary' in df.columns:
-                # Create a beautiful box plot
-                fig = px.box(
-                    df,
-                    x='department',
-                    y='salary',
-                    title='Salary Distribution by Department',
-                    color='department',
-                    points='all',
-                    color_discrete_sequence=px.colors.qualitative.Set3
-                )
-                fig.update_layout(
-                    title_x=0.5,
-                    title_font_size=20,
-                    xaxis_title="Department",
-                    yaxis_title="Salary",
-                    showlegend=False
-                )
-                fig.write_html(f'visualizations/{base_filename}_salary_box.html')
-                visualizations.append(f'visualizations/{base_filename}_salary_box.html')
-                
-                # Add salary insights
-                avg_salary = df['salary'].mean()
-                max_salary = df['salary'].max()
-                min_salary = df['salary'].min()
-                insights.append(f"• Average salary across all departments: ${avg_salary:,.2f}")
-                insights.append(f"• Salary range: ${min_salary:,.2f} - ${max_salary:,.2f}")
-            
-            # 3. Performance Analysis (if performance_score exists)
-            if 'performance_score' in df.columns:
-                # Create a beautiful scatter plot
-                fig = px.scatter(
-                    df,
-                    x='salary',
-                    y='performance_score',
-                    color='department',
-                    title='Performance vs Salary by Department',
-                    size='performance_score',
-                    hover_data=['department'],
-                    color_discrete_sequence=px.colors.qualitative.Set3
-                )
-                fig.update_layout(
-                    title_x=0.5,
-                    title_font_size=20,
-                    xaxis_title="Salary",
-                    yaxis_title="Performance Score"
-                )
-                fig.write_html(f'visualizations/{base_filename}_performance_scatter.html')
-                visualizations.append(f'visualizations/{base_filename}_performance_scatter.html')
-                
-                # Add performance insights
-                best_performer = df.loc[df['performance_score'].idxmax()]
-                insights.append(f"• Best performing employee: {best_performer['name']} in {best_performer['department']} with score {best_performer['performance_score']}")
-            
-            # 4. Time-based Analysis (if doj exists)
-            if 'doj' in df.columns:
-                df['doj'] = pd.to_datetime(df['doj'])
-                yearly_counts = df.groupby(df['doj'].dt.year)['id'].count().reset_index()
-                yearly_counts.columns = ['Year', 'Count']
-                
-                # Create a beautiful line chart
-                fig = px.line(
-                    yearly_counts,
-                    x='Year',
-                    y='Count',
-                    title='Employee Hiring Trends Over Time',
-                    markers=True
-                )
-                fig.update_layout(
-                    title_x=0.5,
-                    title_font_size=20,
-                    xaxis_title="Year",
-                    yaxis_title="Number of Employees Hired"
-                )
-                fig.write_html(f'visualizations/{base_filename}_hiring_trends.html')
-                visualizations.append(f'visualizations/{base_filename}_hiring_trends.html')
-                
-                # Add hiring trend insights
-                max_year = yearly_counts.loc[yearly_counts['Count'].idxmax()]
-                insights.append(f"• Highest hiring year: {max_year['Year']} with {max_year['Count']} new employees")
-            
-            # 5. Skills Analysis (if skills exists)
-            if 'skills' in df.columns:
-                # Split skills and count occurrences
-                all_skills = []
-                for skills in df['skills']:
-                    all_skills.extend([s.strip() for s in skills.split(',')])
-                skill_counts = pd.Series(all_skills).value_counts().head(10)
-                
-                # Create a beautiful bar chart
-                fig = px.bar(
-                    x=skill_counts.index,
-                    y=skill_counts.values,
-                    title='Top 10 Skills Distribution',
-                    color=skill_counts.values,
-                    color_continuous_scale='Viridis'
-                )
-                fig.update_layout(
-                    title_x=0.5,
-                    title_font_size=20,
-                    xaxis_title="Skills",
-                    yaxis_title="Count",
-                    xaxis_tickangle=45
-                )
-                fig.write_html(f'visualizations/{base_filename}_skills_dist.html')
-                visualizations.append(f'visualizations/{base_filename}_skills_dist.html')
-                
-                # Add skills insights
-                top_skill = skill_counts.index[0]
-                insights.append(f"• Most common skill: {top_skill} with {skill_counts[top_skill]} employees")
-            
-            # Generate a beautiful HTML report
-            report = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                    .container {{ max-width: 1200px; margin: 0 auto; }}
-                    .header {{ text-align: center; margin-bottom: 30px; }}
-                    .insights {{ background-color: #f8f9fa; padding: 20px; border-radius: 10px; margin-bottom: 20px; }}
-                    .visualizations {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); gap: 20px; }}
-                    .viz-item {{ border: 1px solid #ddd; padding: 10px; border-radius: 5px; }}
-                    h1 {{ color: #2c3e50; }}
-                    h2 {{ color: #34495e; }}
-                    li {{ margin-bottom: 10px; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>Data Analysis Report</h1>
-                        <p>Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                    </div>
-                    
-                    <div class="insights">
-                        <h2>Key Insights</h2>
-                        <ul>
-                            {''.join(f'<li>{insight}</li>' for insight in insights)}
-                        </ul>
-                    </div>
-                    
-                    <div class="visualizations">
-                        <h2>Interactive Visualizations</h2>
-                        {''.join(f'<div class="viz-item"><iframe src="{viz}" width="100%" height="400px" frameborder="0"></iframe></div>' for viz in visualizations)}
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Save the report
-            with open(f'visualizations/{base_filename}_report.html', 'w') as f:
-                f.write(report)
+            insights = chart_insights(df)
+            report_path, render = self.chart_renderer.submit(df, insights, summarize)
+            status = ("A comprehensive HTML report is ready" if render.done()
+                      else "A comprehensive HTML report is being generated in the background")
             
             return f"""
             📊 Beautiful visualizations have been created! 
@@ -926,8 +489,8 @@ class DatabaseChatbot:
             🔍 Key Insights:
             {chr(10).join(insights)}
             
-            📈 Interactive visualizations are available in the 'visualizations' directory.
-            📄 A comprehensive HTML report has been generated: visualizations/{base_filename}_report.html
+            📈 Interactive visualizations are available in the '{self.chart_renderer.output_dir}' directory.
+            📄 {status}: {report_path}
             
             💡 Suggested next queries:
             {self.get_suggested_queries()}
@@ -1010,8 +573,20 @@ class DatabaseChatbot:
                     json.dump(export_data, f, indent=2)
                 return f"Data exported to {filename}"
                 
+            elif format.lower() == 'arrow':
+                filename = f'query_results_{timestamp}.arrow'
+                with open(filename, 'wb') as f:
+                    f.write(dataframe_to_arrow(df))
+                return f"Data exported to {filename}"
+
+            elif format.lower() == 'parquet':
+                filename = f'query_results_{timestamp}.parquet'
+                with open(filename, 'wb') as f:
+                    f.write(dataframe_to_parquet(df))
+                return f"Data exported to {filename}"
+
             else:
-                return "Unsupported export format. Please use 'csv', 'sql', 'excel', or 'json'."
+                return "Unsupported export format. Please use 'csv', 'sql', 'excel', 'json', 'arrow', or 'parquet'."
                 
         except Exception as e:
             return f"Error exporting data: {str(e)}"
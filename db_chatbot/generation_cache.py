@@ -0,0 +1,145 @@
+"""
+Two-tier cache for natural-language-to-SQL generations.
+
+Entries are keyed by a normalized form of the question plus a fingerprint of
+the schema text that was sent to the model, so any schema change produces new
+keys and old answers simply stop matching. Lookups go to an in-memory LRU
+first and fall back to an on-disk SQLite table that survives restarts.
+
+The API only consults the cache when SQL_GENERATION_DETERMINISTIC is set:
+sampled generations vary from call to call, and caching one would pin it.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SQL_CACHE_MEMORY_SIZE = int(os.getenv('SQL_CACHE_MEMORY_SIZE', '1024'))
+SQL_CACHE_PATH = os.getenv('SQL_CACHE_PATH', 'sql_generation_cache.db')
+
+_NUMBER_WORDS = {
+    'zero': '0', 'one': '1', 'two': '2', 'three': '3', 'four': '4',
+    'five': '5', 'six': '6', 'seven': '7', 'eight': '8', 'nine': '9',
+    'ten': '10', 'eleven': '11', 'twelve': '12', 'fifteen': '15',
+    'twenty': '20', 'fifty': '50', 'hundred': '100',
+}
+_THOUSANDS_SEPARATOR = re.compile(r'(?<=\d),(?=\d{3}\b)')
+_TRAILING_ZEROS = re.compile(r'\b(\d+)\.0+\b|\b(\d+\.\d*?)0+\b')
+_PUNCTUATION = re.compile(r"[^\w\s.%-]|(?<!\d)\.|\.(?!\d)|-(?!\d)")
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, punctuation, whitespace and number formatting."""
+    normalized = question.lower().replace("'", "")
+    normalized = _THOUSANDS_SEPARATOR.sub('', normalized)
+    normalized = _TRAILING_ZEROS.sub(lambda m: m.group(1) or m.group(2), normalized)
+    normalized = _PUNCTUATION.sub(' ', normalized)
+    words = [_NUMBER_WORDS.get(word, word) for word in normalized.split()]
+    return _WHITESPACE.sub(' ', ' '.join(words)).strip()
+
+
+def schema_fingerprint(schema_text: str) -> str:
+    """Stable short hash of the schema text embedded in the prompt."""
+    return hashlib.sha256(schema_text.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(question: str, schema_text: str) -> str:
+    return f"{schema_fingerprint(schema_text)}:{normalize_question(question)}"
+
+
+class GenerationCache:
+    """In-memory LRU in front of an optional SQLite store."""
+
+    def __init__(self, max_memory_entries: int = SQL_CACHE_MEMORY_SIZE,
+                 db_path: Optional[str] = SQL_CACHE_PATH):
+        self.max_memory_entries = max_memory_entries
+        self.db_path = db_path or None
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.db_path:
+            self._open_disk()
+
+    def _open_disk(self):
+        try:
+            self._disk = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS sql_generations (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            self._disk.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"SQL generation disk cache disabled ({self.db_path}): {e}")
+            self._disk = None
+
+    def get(self, question: str, schema_text: str) -> Optional[Dict[str, Any]]:
+        key = cache_key(question, schema_text)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return dict(entry)
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT payload FROM sql_generations WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = json.loads(row[0])
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+                    return dict(entry)
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, schema_text: str, entry: Dict[str, Any]):
+        key = cache_key(question, schema_text)
+        with self._lock:
+            self._remember(key, entry)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO sql_generations (cache_key, payload, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(entry), time.time())
+                )
+                self._disk.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM sql_generations")
+                self._disk.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = dict(entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,413 @@
+"""
+Rule-based intent matching that answers known questions without the LLM.
+
+By default only whole questions are matched: the canned phrases of
+`advanced_queries.NATURAL_LANGUAGE_EXAMPLES` and a few phrase templates whose
+only variable parts are slots (row limit, department, year). A question with
+any other filter, comparison or aggregate ("... with performance score above
+4", "... highest average salary") falls through to the caller's LLM path.
+
+The looser keyword rules of `DatabaseChatbot.generate_sql_query` (every
+keyword group present in the question) are opt-in with `keyword_rules=True`,
+for callers that have no LLM to fall back to. They are compiled into one
+Aho-Corasick automaton, so a question is scanned once regardless of how many
+rules exist.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import Counter, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Pattern, Sequence, Set
+
+from .advanced_queries import NATURAL_LANGUAGE_EXAMPLES
+from .generation_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+DEPARTMENTS = ['engineering', 'sales', 'marketing', 'hr', 'finance']
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 1000
+
+_YEAR = re.compile(r'\b(19[5-9]\d|20\d\d)\b')
+_LIMIT = re.compile(r'\b(?:top|first|best|highest|lowest|bottom)\s+(\d{1,4})\b|\b(\d{1,4})\s+(?:top|highest|best|most)\b')
+_TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+_TEMPLATE_PART = re.compile(r'([\[\]()|]|\{n\}|\{department\}|\{year\})')
+_TEMPLATE_SLOTS = {
+    '{n}': r'\d{1,4}',
+    '{department}': '(?:' + '|'.join(DEPARTMENTS) + ')',
+    '{year}': r'(?:19[5-9]\d|20\d\d)',
+}
+
+EMPLOYEE_COLUMNS = ['id', 'name', 'department', 'salary', 'doj', 'manager_id', 'performance_score', 'skills']
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton reporting whole-word keyword matches."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Set[str]] = [set()]
+        for keyword in keywords:
+            self._add(keyword)
+        self._build()
+
+    def _add(self, keyword: str):
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = nxt
+        self._output[state].add(keyword)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._output[nxt] |= self._output[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[str]:
+        found = set()
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._output[state]:
+                start = end - len(keyword) + 1
+                before = text[start - 1] if start > 0 else ' '
+                after = text[end + 1] if end + 1 < len(text) else ' '
+                if not before.isalnum() and not after.isalnum():
+                    found.add(keyword)
+        return found
+
+
+def compile_template(template: str) -> Pattern:
+    """Whole-question regex for a normalized phrase template.
+
+    `[...]` marks an optional part, `(a|b)` alternatives (`|` also works
+    inside `[...]`), and `{n}`, `{department}` and `{year}` stand for the
+    slots `extract_slots` reads back out of the question.
+    """
+    pattern = []
+    for part in _TEMPLATE_PART.split(template):
+        if part in ('[', '('):
+            pattern.append('(?:')
+        elif part == ']':
+            pattern.append(')?')
+        elif part in (')', '|'):
+            pattern.append(part)
+        elif part in _TEMPLATE_SLOTS:
+            pattern.append(_TEMPLATE_SLOTS[part])
+        else:
+            pattern.append(re.escape(part))
+    return re.compile(''.join(pattern) + r'\Z')
+
+
+class Intent:
+    """A question pattern and the SQL that answers it.
+
+    `phrase` requires the whole normalized question to equal it, and
+    `templates` to match one of them (see `compile_template`). `keywords` is a
+    list of alternative groups for the opt-in keyword rules; every group must
+    have at least one keyword in the question and none of `excludes` may
+    appear.
+    """
+
+    def __init__(self, name: str, render: Callable[[Dict[str, Any]], str], description: str,
+                 keywords: Sequence[Sequence[str]] = (), phrase: Optional[str] = None,
+                 requires: Optional[Dict[str, Sequence[str]]] = None, excludes: Sequence[str] = (),
+                 templates: Sequence[str] = ()):
+        self.name = name
+        self.render = render
+        self.description = description
+        self.keywords = [tuple(group) for group in keywords]
+        self.phrase = phrase
+        self.templates = [compile_template(template) for template in templates]
+        self.requires = requires or {}
+        self.excludes = tuple(excludes)
+
+    def supported_by(self, schema: Optional[Dict[str, List[Dict[str, Any]]]]) -> bool:
+        """True when every table and column the SQL reads exists in the schema."""
+        if schema is None:
+            return True
+        tables = {name.lower(): {c['name'].lower() for c in cols} for name, cols in schema.items()}
+        for table, columns in self.requires.items():
+            present = tables.get(table.lower())
+            if present is None or any(col.lower() not in present for col in columns):
+                return False
+        return True
+
+
+class IntentMatch:
+    __slots__ = ('intent', 'sql_query', 'slots', 'elapsed')
+
+    def __init__(self, intent: Intent, sql_query: str, slots: Dict[str, Any], elapsed: float):
+        self.intent = intent
+        self.sql_query = sql_query
+        self.slots = slots
+        self.elapsed = elapsed
+
+    @property
+    def explanation(self) -> str:
+        return self.intent.description
+
+
+def extract_slots(normalized: str) -> Dict[str, Any]:
+    slots: Dict[str, Any] = {'limit': None, 'department': None, 'year': None}
+    year = _YEAR.search(normalized)
+    if year:
+        slots['year'] = int(year.group(1))
+    limit = _LIMIT.search(normalized)
+    if limit:
+        value = int(limit.group(1) or limit.group(2))
+        if 0 < value <= MAX_LIMIT and value != slots['year']:
+            slots['limit'] = value
+    words = set(normalized.split())
+    for dept in DEPARTMENTS:
+        if dept in words:
+            slots['department'] = dept
+            break
+    return slots
+
+
+def _employee_filters(slots: Dict[str, Any]) -> str:
+    conditions = []
+    if slots.get('department'):
+        conditions.append(f"department = '{slots['department']}'")
+    if slots.get('year'):
+        conditions.append(f"YEAR(doj) = {int(slots['year'])}")
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def select_all_employees(slots: Optional[Dict[str, Any]] = None) -> str:
+    slots = slots or {}
+    return f"""
+        SELECT
+            {', '.join(EMPLOYEE_COLUMNS)}
+        FROM employees
+        {_employee_filters(slots)}
+    """
+
+
+def _top_paid(slots):
+    return f"""
+        SELECT TOP {int(slots.get('limit') or DEFAULT_LIMIT)}
+            {', '.join(EMPLOYEE_COLUMNS)}
+        FROM employees
+        {_employee_filters(slots)}
+        ORDER BY salary DESC
+    """
+
+
+def _headcount_by_department(slots):
+    return f"""
+        SELECT
+            department,
+            COUNT(*) as employee_count
+        FROM employees
+        {_employee_filters(slots)}
+        GROUP BY department
+    """
+
+
+def _department_summary(slots):
+    return f"""
+        SELECT
+            department,
+            COUNT(*) as employee_count,
+            AVG(salary) as avg_salary,
+            AVG(performance_score) as avg_performance
+        FROM employees
+        {_employee_filters(slots)}
+        GROUP BY department
+    """
+
+
+def _performance_by_department(slots):
+    return f"""
+        SELECT
+            department,
+            AVG(performance_score) as avg_performance,
+            COUNT(*) as employee_count
+        FROM employees
+        {_employee_filters(slots)}
+        GROUP BY department
+        ORDER BY avg_performance DESC
+    """
+
+
+def _skills_by_department(slots):
+    return f"""
+        SELECT
+            department,
+            STRING_AGG(skills, ', ') as unique_skills,
+            COUNT(DISTINCT skills) as skill_count
+        FROM employees
+        {_employee_filters(slots)}
+        GROUP BY department
+    """
+
+
+def _hiring_trend(slots):
+    department = slots.get('department')
+    where = f"WHERE department = '{department}'" if department else ""
+    return f"""
+        SELECT
+            YEAR(doj) as hire_year,
+            COUNT(*) as new_employees
+        FROM employees
+        {where}
+        GROUP BY YEAR(doj)
+        ORDER BY hire_year
+    """
+
+
+def default_intents() -> List[Intent]:
+    """Canned phrases first, then the keyword rules in their original order."""
+    employees = {'employees': EMPLOYEE_COLUMNS}
+    # Keyword rules only cover the employees table; questions naming other
+    # subjects go to the LLM instead of being answered about employees.
+    other_subjects = ('project', 'projects', 'customer', 'customers', 'feedback', 'revenue', 'budget')
+    intents = [
+        Intent('all_employees', select_all_employees, "All employees.",
+               phrase='show me all employees', requires=employees),
+    ]
+    for phrase, sql in NATURAL_LANGUAGE_EXAMPLES.items():
+        tables = sorted({t.lower() for t in _TABLE_REFERENCE.findall(sql)})
+        intents.append(Intent(
+            'example:' + normalize_question(phrase).replace(' ', '_'),
+            lambda slots, sql=sql: sql,
+            f"Predefined analysis for '{phrase}'.",
+            phrase=normalize_question(phrase),
+            requires={table: () for table in tables},
+        ))
+    # Templates only allow slot values to vary, so they cannot swallow a
+    # question that adds its own filter or aggregate.
+    in_department = '[ in [the ]{department}[ department]]'
+    intents += [
+        Intent('top_paid', _top_paid, "Highest paid employees, by salary.",
+               keywords=[('top', 'highest'), ('paid', 'salary', 'salaries', 'earners')], requires=employees,
+               excludes=other_subjects,
+               templates=['[show me |list |who are ][the ]top [{n} ][highest ]paid employees' + in_department,
+                          '[show me |list |who are ][the ]{n} highest paid employees' + in_department,
+                          '[show me |list |who are ][the ]highest paid employees' + in_department,
+                          '[show me |list |who are ][the ]top [{n} ]earners' + in_department]),
+        Intent('headcount_by_department', _headcount_by_department, "Number of employees in each department.",
+               keywords=[('how many employees',), ('department', 'departments')], requires=employees,
+               excludes=other_subjects,
+               templates=['how many employees [are [there ]]in each department',
+                          'how many employees does each department have',
+                          '[show me ][the ]headcount by department',
+                          '[show me ][the ]number of employees (in each|per|by) department']),
+        Intent('department_summary', _department_summary, "Headcount, average salary and performance per department.",
+               keywords=[('group', 'grouped'), ('department', 'departments')], requires=employees,
+               excludes=other_subjects,
+               templates=['[show me |list ][all ]employees grouped by department',
+                          '[show me ][a ]department summary']),
+        Intent('performance_by_department', _performance_by_department, "Average performance score per department.",
+               keywords=[('performance',)], requires=employees, excludes=other_subjects,
+               templates=['[show me ][the ][average ]performance [score ](by|per) department',
+                          '[show me ][the ][average ]performance [score ]of each department']),
+        Intent('skills_by_department', _skills_by_department, "Skills found in each department.",
+               keywords=[('skills',)], requires=employees, excludes=other_subjects,
+               templates=['[show me ][the ]skills (by|per|in each) department',
+                          'what skills does each department have']),
+        Intent('hiring_trend', _hiring_trend, "New hires per year.",
+               keywords=[('trends', 'trend', 'hiring')], requires=employees,
+               excludes=other_subjects + ('sales',),
+               templates=['[show me ][the ]hiring trend[s]' + in_department,
+                          '[show me ][the ]number of new hires (per|by|each) year' + in_department]),
+    ]
+    return intents
+
+
+class IntentMatcher:
+    """Compiled intent rules with hit-rate accounting.
+
+    Only whole-question phrases and templates match unless `keyword_rules`
+    is set.
+    """
+
+    def __init__(self, intents: Optional[List[Intent]] = None, keyword_rules: bool = False):
+        self.intents = intents if intents is not None else default_intents()
+        self.keyword_rules = keyword_rules
+        self._phrases = {intent.phrase: intent for intent in self.intents if intent.phrase}
+        self._automaton = KeywordAutomaton(
+            {kw for intent in self.intents for group in intent.keywords for kw in group}
+            | {kw for intent in self.intents for kw in intent.excludes}
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.match_seconds = 0.0
+        self.intent_hits: Counter = Counter()
+
+    def _resolve(self, normalized: str, schema) -> Optional[Intent]:
+        intent = self._phrases.get(normalized)
+        if intent is not None and intent.supported_by(schema):
+            return intent
+        for intent in self.intents:
+            if any(template.match(normalized) for template in intent.templates) and intent.supported_by(schema):
+                return intent
+        if not self.keyword_rules:
+            return None
+        found = self._automaton.find(normalized)
+        if not found:
+            return None
+        for intent in self.intents:
+            if not intent.keywords or any(kw in found for kw in intent.excludes):
+                continue
+            if all(any(kw in found for kw in group) for group in intent.keywords):
+                if intent.supported_by(schema):
+                    return intent
+        return None
+
+    def match(self, question: str,
+              schema: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Optional[IntentMatch]:
+        """Return the SQL for a known question, or None to fall back to the LLM.
+
+        When `schema` is given, intents whose tables or columns are missing
+        from it are skipped.
+        """
+        started = time.perf_counter()
+        normalized = normalize_question(question)
+        intent = self._resolve(normalized, schema)
+        result = None
+        if intent is not None:
+            slots = extract_slots(normalized)
+            result = IntentMatch(intent, intent.render(slots), slots, time.perf_counter() - started)
+        with self._lock:
+            self.match_seconds += time.perf_counter() - started
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.intent_hits[intent.name] += 1
+        if result is not None:
+            logger.info(f"Intent '{intent.name}' matched in {result.elapsed * 1e6:.0f}us, slots={slots}")
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_match_microseconds": self.match_seconds / lookups * 1e6 if lookups else 0.0,
+            "intents": dict(self.intent_hits),
+        }
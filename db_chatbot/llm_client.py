@@ -0,0 +1,87 @@
+"""
+Async Azure OpenAI client shared by every request in a process.
+
+All completions go through one `httpx.AsyncClient`, so TLS connections to the
+Azure endpoint are kept alive and reused, and a semaphore caps how many
+completions may be in flight at once.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+import httpx
+from openai import AsyncAzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '32'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '64'))
+LLM_KEEPALIVE_SECONDS = float(os.getenv('LLM_KEEPALIVE_SECONDS', '60'))
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', '60'))
+
+
+class AsyncLLMClient:
+    """Pooled, concurrency-limited wrapper around AsyncAzureOpenAI."""
+
+    def __init__(self, api_key: str, endpoint: str, api_version: str, deployment: str,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_connections: int = LLM_MAX_CONNECTIONS):
+        self.deployment = deployment
+        self.max_concurrency = max_concurrency
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            ),
+            timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=10.0),
+        )
+        self._client = AsyncAzureOpenAI(
+            api_key=api_key,
+            azure_endpoint=endpoint,
+            api_version=api_version,
+            http_client=self._http_client,
+            # Retries are handled by the callers' tenacity policies.
+            max_retries=0,
+        )
+        # Created on first use so it binds to the server's running loop.
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+
+    async def complete(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Run one chat completion and return the raw message content."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.waiting += 1
+        async with self._semaphore:
+            self.waiting -= 1
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                response = await self._client.chat.completions.create(
+                    model=self.deployment,
+                    messages=messages,
+                    **kwargs
+                )
+            finally:
+                self.in_flight -= 1
+            self.completed += 1
+            logger.info(f"LLM completion finished in {time.perf_counter() - started:.2f}s")
+            return response.choices[0].message.content or ""
+
+    async def aclose(self):
+        await self._client.close()
+        await self._http_client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+        }
@@ -0,0 +1,288 @@
+"""
+Scheduled materialization of the advanced analytical queries.
+
+PROJECT_PERFORMANCE, DEPARTMENT_ANALYSIS, TIME_ANALYSIS and PROJECT_SUCCESS
+fan out over four or five LEFT JOINs and re-aggregate on every ask. When
+enabled, a background thread precomputes their results on a schedule, keeps
+them in memory (and as Parquet snapshots when a directory is configured, so a
+restart can serve immediately) and answers the identical SQL from the
+snapshot, reporting how stale it is.
+
+A refresh only re-runs a view when one of its source tables changed, and only
+cheap signals are consulted: the latest Change Tracking version for tracked
+tables, otherwise the highest rowversion plus the row count from partition
+metadata. A view reading a table with neither is simply re-run on every
+refresh; fingerprinting the table would scan it. `refreshed_at` is when a
+view was last rebuilt, `checked_at` when its sources were last seen
+unchanged, and staleness counts from the latter.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .advanced_queries import PROJECT_PERFORMANCE, DEPARTMENT_ANALYSIS, TIME_ANALYSIS, PROJECT_SUCCESS
+from .result_cache import canonicalize_sql, referenced_tables
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+MATERIALIZE_ANALYTICS = os.getenv('MATERIALIZE_ANALYTICS', 'false').lower() in ('1', 'true', 'yes')
+MATERIALIZE_REFRESH_SECONDS = float(os.getenv('MATERIALIZE_REFRESH_SECONDS', '900'))
+MATERIALIZE_SNAPSHOT_DIR = os.getenv('MATERIALIZE_SNAPSHOT_DIR', '')
+
+MATERIALIZED_QUERIES = {
+    'project_performance': PROJECT_PERFORMANCE,
+    'department_analysis': DEPARTMENT_ANALYSIS,
+    'time_analysis': TIME_ANALYSIS,
+    'project_success': PROJECT_SUCCESS,
+}
+
+# Per table: is Change Tracking on, and which rowversion column (if any) it has.
+CHANGE_SOURCES_QUERY = text("""
+    SELECT
+        t.name,
+        CASE WHEN ct.object_id IS NULL THEN 0 ELSE 1 END AS change_tracked,
+        (SELECT TOP 1 c.name
+         FROM sys.columns c
+         INNER JOIN sys.types ty ON c.user_type_id = ty.user_type_id
+         WHERE c.object_id = t.object_id AND ty.name IN ('timestamp', 'rowversion')) AS rowversion_column
+    FROM sys.tables t
+    LEFT JOIN sys.change_tracking_tables ct ON ct.object_id = t.object_id
+""")
+
+
+class Snapshot:
+    __slots__ = ('name', 'rows', 'refreshed_at', 'checked_at', 'source_versions', 'duration')
+
+    def __init__(self, name: str, rows: List[Dict[str, Any]], refreshed_at: float,
+                 source_versions: Dict[str, str], duration: float = 0.0,
+                 checked_at: Optional[float] = None):
+        self.name = name
+        self.rows = rows
+        self.refreshed_at = refreshed_at
+        self.checked_at = checked_at if checked_at is not None else refreshed_at
+        self.source_versions = source_versions
+        self.duration = duration
+
+
+class MaterializedViews:
+    """Background refresher and lookup for precomputed analytical results."""
+
+    def __init__(self, engine, queries: Optional[Dict[str, str]] = None,
+                 refresh_seconds: float = MATERIALIZE_REFRESH_SECONDS,
+                 snapshot_dir: Optional[str] = MATERIALIZE_SNAPSHOT_DIR,
+                 max_staleness: Optional[float] = None):
+        self.engine = engine
+        self.queries = queries if queries is not None else MATERIALIZED_QUERIES
+        self.refresh_seconds = refresh_seconds
+        # Past this age the refresher is assumed stuck and queries run live.
+        self.max_staleness = max_staleness if max_staleness is not None else 2 * refresh_seconds
+        self.snapshot_dir = snapshot_dir or None
+        self._by_sql = {canonicalize_sql(sql): name for name, sql in self.queries.items()}
+        self._sources = {name: sorted(referenced_tables(sql)) for name, sql in self.queries.items()}
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.skipped_refreshes = 0
+        self.failed_refreshes = 0
+        self.hits = 0
+        self.untracked_tables: List[str] = []
+        if self.snapshot_dir:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            self._load_snapshots()
+
+    # Change detection
+
+    def _source_versions(self, conn, tables: List[str]) -> Dict[str, str]:
+        """Version strings for the tables that have cheap change detection; others are left out."""
+        sources = {row[0].lower(): (bool(row[1]), row[2]) for row in conn.execute(CHANGE_SOURCES_QUERY)}
+        versions = {}
+        untracked = []
+        for table in tables:
+            change_tracked, rowversion_column = sources.get(table, (False, None))
+            # Names come from the fixed query text and the catalog, never from user input.
+            if change_tracked:
+                row = conn.execute(text(
+                    f"SELECT COALESCE(MAX(SYS_CHANGE_VERSION), 0) FROM CHANGETABLE(CHANGES [{table}], NULL) AS c"
+                )).fetchone()
+                versions[table] = f"ct:{row[0]}"
+            elif rowversion_column:
+                # Deletes leave MAX(rowversion) alone; the metadata row count catches them.
+                column = rowversion_column.replace(']', ']]')
+                row = conn.execute(text(
+                    f"SELECT (SELECT CONVERT(BIGINT, MAX([{column}])) FROM [{table}]), "
+                    f"(SELECT SUM(p.rows) FROM sys.partitions p "
+                    f"WHERE p.object_id = OBJECT_ID(:table) AND p.index_id IN (0, 1))"
+                ), {'table': table}).fetchone()
+                versions[table] = f"rowversion:{row[0]}:{row[1]}"
+            else:
+                untracked.append(table)
+        if untracked and untracked != self.untracked_tables:
+            logger.warning(
+                f"No Change Tracking or rowversion on {', '.join(untracked)}: views reading them are "
+                f"re-run on every refresh"
+            )
+        self.untracked_tables = untracked
+        return versions
+
+    # Refresh
+
+    def refresh(self, force: bool = False) -> Dict[str, str]:
+        """Recompute views whose sources changed; returns {view: outcome}."""
+        outcomes = {}
+        with self._refresh_lock:
+            all_tables = sorted({t for tables in self._sources.values() for t in tables})
+            with self.engine.connect() as conn:
+                try:
+                    versions = self._source_versions(conn, all_tables)
+                except Exception as e:
+                    conn.rollback()
+                    logger.warning(f"Change detection failed, refreshing every view: {e}")
+                    versions = {}
+                for name, sql in self.queries.items():
+                    current = {t: versions[t] for t in self._sources[name] if t in versions}
+                    previous = self._snapshots.get(name)
+                    if (not force and previous is not None and current
+                            and len(current) == len(self._sources[name])
+                            and previous.source_versions == current):
+                        with self._lock:
+                            previous.checked_at = time.time()
+                        self.skipped_refreshes += 1
+                        outcomes[name] = "unchanged"
+                        continue
+                    started = time.perf_counter()
+                    try:
+                        result = conn.execute(text(sql))
+                        columns = list(result.keys())
+                        rows = [dict(zip(columns, row)) for row in result.fetchall()]
+                    except Exception as e:
+                        conn.rollback()
+                        self.failed_refreshes += 1
+                        outcomes[name] = f"failed: {e}"
+                        logger.error(f"Refreshing materialized view '{name}' failed: {e}")
+                        continue
+                    snapshot = Snapshot(name, rows, time.time(), current, time.perf_counter() - started)
+                    with self._lock:
+                        self._snapshots[name] = snapshot
+                    self.refreshes += 1
+                    outcomes[name] = "refreshed"
+                    logger.info(f"Materialized '{name}': {len(rows)} rows in {snapshot.duration:.2f}s")
+                    self._save_snapshot(snapshot)
+        return outcomes
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Materialized view refresh failed: {e}", exc_info=True)
+            self._stop.wait(self.refresh_seconds)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="materialized-views", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # Serving
+
+    def lookup(self, sql_query: str) -> Optional[Tuple[Snapshot, float]]:
+        """(snapshot, staleness_seconds) when the SQL is a materialized query."""
+        name = self._by_sql.get(canonicalize_sql(sql_query))
+        if name is None:
+            return None
+        with self._lock:
+            snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            return None
+        staleness = time.time() - snapshot.checked_at
+        if staleness > self.max_staleness:
+            return None
+        self.hits += 1
+        return snapshot, staleness
+
+    # Parquet snapshots
+
+    def _snapshot_path(self, name: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{name}.parquet")
+
+    def _save_snapshot(self, snapshot: Snapshot):
+        if not self.snapshot_dir or pa is None:
+            return
+        try:
+            table = pa.Table.from_pylist(snapshot.rows)
+            table = table.replace_schema_metadata({
+                'refreshed_at': str(snapshot.refreshed_at),
+                'source_versions': json.dumps(snapshot.source_versions),
+            })
+            path = self._snapshot_path(snapshot.name)
+            pq.write_table(table, path + '.tmp')
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            logger.warning(f"Could not write snapshot for '{snapshot.name}': {e}")
+
+    def _load_snapshots(self):
+        if pa is None:
+            return
+        for name in self.queries:
+            path = self._snapshot_path(name)
+            if not os.path.exists(path):
+                continue
+            try:
+                table = pq.read_table(path)
+                metadata = table.schema.metadata or {}
+                self._snapshots[name] = Snapshot(
+                    name, table.to_pylist(),
+                    float(metadata.get(b'refreshed_at', b'0')),
+                    json.loads(metadata.get(b'source_versions', b'{}')),
+                )
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            views = {
+                name: {
+                    "rows": len(s.rows),
+                    "refreshed_at": s.refreshed_at,
+                    "checked_at": s.checked_at,
+                    "staleness_seconds": round(now - s.checked_at, 3),
+                    "last_duration_seconds": round(s.duration, 3),
+                    "change_detection": sorted({v.split(':')[0] for v in s.source_versions.values()}),
+                }
+                for name, s in self._snapshots.items()
+            }
+        return {
+            "enabled": self._thread is not None,
+            "refresh_seconds": self.refresh_seconds,
+            "max_staleness_seconds": self.max_staleness,
+            "refreshes": self.refreshes,
+            "skipped_refreshes": self.skipped_refreshes,
+            "failed_refreshes": self.failed_refreshes,
+            "hits": self.hits,
+            "untracked_tables": list(self.untracked_tables),
+            "views": views,
+        }
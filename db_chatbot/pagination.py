@@ -0,0 +1,306 @@
+"""
+Keyset (seek) pagination over generated SQL.
+
+The generated statement is wrapped as a derived table and paged with
+`TOP (n) ... WHERE (keys) > (last keys) ORDER BY keys`, so each page costs an
+index seek instead of an OFFSET scan, and the LLM is not consulted again.
+Rows with equal sort keys are told apart by the primary keys of the tables
+read, when they are all in the output (every column otherwise). The total
+row count is the optimizer's estimate, never a COUNT over the full
+statement. Paging state travels in an HMAC-signed, opaque cursor.
+"""
+
+import os
+import re
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from .query_tokens import InvalidTokenError, sign_payload, verify_payload
+
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '5000'))
+
+# Types SQL Server cannot compare or sort; never used as tie-breakers.
+_UNORDERABLE_TYPES = {'text', 'ntext', 'image', 'xml', 'sql_variant', 'geography', 'geometry', 'varbinary'}
+_ORDER_ITEM = re.compile(r'^(.*?)(?:\s+(asc|desc))?$', re.IGNORECASE | re.DOTALL)
+_IDENTIFIER = re.compile(r'^(?:\[?\w+\]?\.)*\[?(\w+)\]?$')
+
+
+class PaginationError(ValueError):
+    """The statement cannot be paged with keyset pagination."""
+
+
+def _top_level_keywords(sql_query: str):
+    """Yield (position, lowercase word) for words outside parentheses, strings and comments."""
+    depth = 0
+    i = 0
+    length = len(sql_query)
+    while i < length:
+        ch = sql_query[i]
+        if ch == "'":
+            end = i + 1
+            while end < length:
+                if sql_query[end] == "'":
+                    if sql_query.startswith("''", end):
+                        end += 2
+                        continue
+                    break
+                end += 1
+            i = end + 1
+        elif ch == '[':
+            i = sql_query.find(']', i) + 1 or length
+        elif sql_query.startswith('--', i):
+            i = sql_query.find('\n', i) + 1 or length
+        elif sql_query.startswith('/*', i):
+            i = sql_query.find('*/', i) + 2 if sql_query.find('*/', i) >= 0 else length
+        elif ch == '(':
+            depth += 1
+            i += 1
+        elif ch == ')':
+            depth -= 1
+            i += 1
+        elif ch.isalpha() or ch == '_':
+            end = i
+            while end < length and (sql_query[end].isalnum() or sql_query[end] == '_'):
+                end += 1
+            if depth == 0:
+                yield i, sql_query[i:end].lower()
+            i = end
+        else:
+            i += 1
+
+
+def _split_top_level_commas(fragment: str) -> List[str]:
+    items, depth, start = [], 0, 0
+    in_string = False
+    for i, ch in enumerate(fragment):
+        if ch == "'":
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            items.append(fragment[start:i])
+            start = i + 1
+    items.append(fragment[start:])
+    return [item.strip() for item in items if item.strip()]
+
+
+def split_statement(sql_query: str) -> Dict[str, Any]:
+    """Split a SELECT into CTE prefix, body and its top-level ORDER BY items."""
+    sql_query = sql_query.strip().rstrip(';').strip()
+    words = list(_top_level_keywords(sql_query))
+    if not words or words[0][1] not in ('select', 'with'):
+        raise PaginationError("Only SELECT statements can be paginated")
+
+    prefix = ''
+    if words[0][1] == 'with':
+        select_pos = next((pos for pos, word in words if word == 'select'), None)
+        if select_pos is None:
+            raise PaginationError("CTE without a final SELECT")
+        prefix, sql_query = sql_query[:select_pos], sql_query[select_pos:]
+        words = list(_top_level_keywords(sql_query))
+
+    if any(word in ('offset', 'fetch', 'into') for _, word in words):
+        raise PaginationError("Statement already uses OFFSET/FETCH or SELECT INTO")
+
+    order_pos = None
+    for (pos, word), (_, following) in zip(words, words[1:]):
+        if word == 'order' and following == 'by':
+            order_pos = pos
+    has_top = len(words) > 1 and (words[1][1] == 'top' or (words[1][1] == 'distinct' and len(words) > 2 and words[2][1] == 'top'))
+
+    order_items: List[Tuple[str, bool]] = []
+    body = sql_query
+    if order_pos is not None:
+        clause = re.sub(r'^order\s+by\s+', '', sql_query[order_pos:], flags=re.IGNORECASE)
+        for item in _split_top_level_commas(clause):
+            match = _ORDER_ITEM.match(item)
+            order_items.append((match.group(1).strip(), (match.group(2) or '').lower() == 'desc'))
+        # A derived table may only keep its ORDER BY when it also has TOP.
+        if not has_top:
+            body = sql_query[:order_pos].rstrip()
+    return {'prefix': prefix, 'body': body, 'order_items': order_items}
+
+
+def _quote(column: str) -> str:
+    return '[' + column.replace(']', ']]') + ']'
+
+
+def unique_key_columns(tables: Sequence[str], schema_info: Dict[str, List[Dict[str, Any]]]) -> Optional[List[str]]:
+    """Primary key columns of every table read, or None if one of them has no primary key."""
+    by_lower = {table.lower(): columns for table, columns in schema_info.items()}
+    key: List[str] = []
+    for table in sorted(tables):
+        primary_key = [col['name'] for col in by_lower.get(table.lower(), []) if col.get('primary_key')]
+        if not primary_key:
+            return None
+        key.extend(primary_key)
+    return key or None
+
+
+def resolve_keys(order_items: Sequence[Tuple[str, bool]], columns: Sequence[str],
+                 column_types: Optional[Dict[str, str]] = None,
+                 unique_key: Optional[Sequence[str]] = None) -> List[Tuple[str, bool]]:
+    """Map ORDER BY items onto output columns and append tie-breakers.
+
+    `unique_key` (e.g. from `unique_key_columns`) completes the order when all
+    of its columns are in the output; otherwise every orderable column is
+    appended.
+    """
+    by_lower = {c.lower(): c for c in columns}
+    keys: List[Tuple[str, bool]] = []
+    for expression, descending in order_items:
+        match = _IDENTIFIER.match(expression)
+        if match is None or match.group(1).lower() not in by_lower:
+            raise PaginationError(f"ORDER BY item '{expression}' is not an output column")
+        keys.append((by_lower[match.group(1).lower()], descending))
+
+    # Keyset paging needs a total order; extend it with a unique key, or
+    # failing that with the remaining columns.
+    column_types = {k.lower(): v.lower() for k, v in (column_types or {}).items()}
+    used = {name.lower() for name, _ in keys}
+    tie_breakers = columns
+    if unique_key and all(c.lower() in by_lower and column_types.get(c.lower()) not in _UNORDERABLE_TYPES
+                          for c in unique_key):
+        tie_breakers = [by_lower[c.lower()] for c in unique_key]
+    for column in tie_breakers:
+        if column.lower() not in used and column_types.get(column.lower()) not in _UNORDERABLE_TYPES:
+            keys.append((column, False))
+            used.add(column.lower())
+    if not keys:
+        raise PaginationError("No orderable output columns")
+    return keys
+
+
+def build_page_query(parts: Dict[str, Any], keys: Sequence[Tuple[str, bool]],
+                     last_values: Optional[Sequence[Any]], page_size: int) -> Tuple[str, Dict[str, Any]]:
+    """Build the seek query for the page after `last_values` (first page when None)."""
+    params: Dict[str, Any] = {}
+    where = ''
+    if last_values is not None:
+        disjuncts = []
+        for i, (column, descending) in enumerate(keys):
+            terms = []
+            for j in range(i):
+                name, value = keys[j][0], last_values[j]
+                if value is None:
+                    terms.append(f"q.{_quote(name)} IS NULL")
+                else:
+                    params[f"k{j}"] = value
+                    terms.append(f"q.{_quote(name)} = :k{j}")
+            value = last_values[i]
+            quoted = f"q.{_quote(column)}"
+            # SQL Server sorts NULLs first ascending and last descending.
+            if value is None:
+                if descending:
+                    continue
+                terms.append(f"{quoted} IS NOT NULL")
+            else:
+                params[f"k{i}"] = value
+                terms.append(f"({quoted} < :k{i} OR {quoted} IS NULL)" if descending else f"{quoted} > :k{i}")
+            disjuncts.append("(" + " AND ".join(terms) + ")")
+        where = " WHERE " + (" OR ".join(disjuncts) if disjuncts else "1 = 0")
+
+    order_by = ", ".join(f"q.{_quote(name)} {'DESC' if desc else 'ASC'}" for name, desc in keys)
+    page_sql = (
+        f"{parts['prefix']}SELECT TOP ({int(page_size) + 1}) * FROM ({parts['body']}) AS q"
+        f"{where} ORDER BY {order_by}"
+    )
+    return page_sql, params
+
+
+def _encode_value(value: Any):
+    if isinstance(value, datetime):
+        return {'t': 'datetime', 'v': value.isoformat()}
+    if isinstance(value, date):
+        return {'t': 'date', 'v': value.isoformat()}
+    if isinstance(value, dt_time):
+        return {'t': 'time', 'v': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'t': 'decimal', 'v': str(value)}
+    return value
+
+
+def _decode_value(value: Any):
+    if isinstance(value, dict):
+        kind, raw = value.get('t'), value.get('v')
+        if kind == 'datetime':
+            return datetime.fromisoformat(raw)
+        if kind == 'date':
+            return date.fromisoformat(raw)
+        if kind == 'time':
+            return dt_time.fromisoformat(raw)
+        if kind == 'decimal':
+            return Decimal(raw)
+    return value
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    return sign_payload(dict(state, last=[_encode_value(v) for v in state['last']]))
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        state = verify_payload(cursor)
+    except InvalidTokenError as e:
+        raise PaginationError(str(e))
+    state['last'] = [_decode_value(v) for v in state['last']]
+    state['keys'] = [tuple(k) for k in state['keys']]
+    return state
+
+
+def fetch_page(conn, sql_query: str, page_size: int,
+               cursor_state: Optional[Dict[str, Any]] = None,
+               column_types: Optional[Dict[str, str]] = None,
+               unique_key: Optional[Sequence[str]] = None,
+               estimated_rows: Optional[float] = None) -> Dict[str, Any]:
+    """Fetch one page; returns rows, the next cursor and the total estimate.
+
+    `estimated_rows` (the plan's row estimate, from the cost guard) is carried
+    in the cursor and reported as an approximate total; None when unknown.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    parts = split_statement(sql_query)
+
+    if cursor_state is None:
+        columns = list(conn.execute(text(f"{parts['prefix']}SELECT TOP 0 * FROM ({parts['body']}) AS q")).keys())
+        keys = resolve_keys(parts['order_items'], columns, column_types, unique_key)
+        last_values = None
+        total = round(estimated_rows) if estimated_rows is not None else None
+    else:
+        keys = cursor_state['keys']
+        last_values = cursor_state['last']
+        total = cursor_state.get('total')
+
+    page_sql, params = build_page_query(parts, keys, last_values, page_size)
+    result = conn.execute(text(page_sql), params)
+    columns = list(result.keys())
+    rows = result.fetchmany(page_size + 1)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = None
+    if has_more:
+        index = {c: i for i, c in enumerate(columns)}
+        last_row = rows[-1]
+        next_cursor = encode_cursor({
+            'sql': sql_query,
+            'keys': [list(k) for k in keys],
+            'last': [last_row[index[name]] for name, _ in keys],
+            'size': page_size,
+            'total': total,
+        })
+    return {
+        'results': [dict(zip(columns, row)) for row in rows],
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'page_size': page_size,
+        'total_count_estimate': total,
+        'total_count_is_approximate': True,
+    }
@@ -0,0 +1,124 @@
+"""
+Prompt token budgeting with local token counts.
+
+Prompts are measured with the model's tokenizer (tiktoken when installed, a
+character-based estimate otherwise) before they are sent. When a prompt would
+exceed the deployment's budget, optional sections are trimmed in priority
+order - few-shot examples first, then the least relevant schema tables - and
+prompt, completion and trimmed token counts are recorded for every request.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '6000'))
+TOKENIZER_ENCODING = os.getenv('TOKENIZER_ENCODING', 'cl100k_base')
+TOKEN_USAGE_HISTORY = int(os.getenv('TOKEN_USAGE_HISTORY', '200'))
+# Chat formatting adds a few tokens around every message.
+_MESSAGE_OVERHEAD = 4
+
+_encoding = None
+if tiktoken is not None:
+    try:
+        _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:  # unknown encoding or missing BPE file
+        logger.warning(f"Tokenizer '{TOKENIZER_ENCODING}' unavailable, estimating token counts: {e}")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(messages: Sequence[Dict[str, str]]) -> int:
+    return sum(count_tokens(m.get("content", "")) + _MESSAGE_OVERHEAD for m in messages) + 3
+
+
+class TokenBudget:
+    """Trims optional prompt sections to fit a token budget and records usage."""
+
+    def __init__(self, max_prompt_tokens: int = PROMPT_TOKEN_BUDGET,
+                 history_size: int = TOKEN_USAGE_HISTORY):
+        self.max_prompt_tokens = max_prompt_tokens
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=history_size)
+        self.requests = 0
+        self.trimmed_requests = 0
+        self.over_budget = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.trimmed_tokens = 0
+
+    def fit(self, base_tokens: int,
+            sections: Sequence[Tuple[str, List[str]]]) -> Tuple[Dict[str, List[str]], int]:
+        """Drop items until base + sections fit the budget.
+
+        `sections` are given in trim order (first is dropped first) and each
+        item list is ordered most important first, so items are removed from
+        the end. Returns the kept items per section and the tokens trimmed.
+        """
+        kept = {name: list(items) for name, items in sections}
+        sizes = {name: [count_tokens(item) for item in items] for name, items in sections}
+        total = base_tokens + sum(sum(s) for s in sizes.values())
+        trimmed = 0
+        for name, _ in sections:
+            while total > self.max_prompt_tokens and kept[name]:
+                kept[name].pop()
+                removed = sizes[name].pop()
+                total -= removed
+                trimmed += removed
+        if trimmed:
+            logger.info(f"Trimmed {trimmed} prompt tokens to fit budget of {self.max_prompt_tokens}")
+        if total > self.max_prompt_tokens:
+            logger.warning(f"Prompt still {total} tokens after trimming (budget {self.max_prompt_tokens})")
+        return kept, trimmed
+
+    def record(self, label: str, prompt_tokens: int, completion_tokens: int, trimmed_tokens: int = 0):
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.trimmed_tokens += trimmed_tokens
+            if trimmed_tokens:
+                self.trimmed_requests += 1
+            if prompt_tokens > self.max_prompt_tokens:
+                self.over_budget += 1
+            self._recent.append({
+                "label": label,
+                "timestamp": time.time(),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "trimmed_tokens": trimmed_tokens,
+            })
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            records = list(self._recent)
+        return records[-limit:] if limit else records
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tokenizer": TOKENIZER_ENCODING if _encoding is not None else "estimate",
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "requests": self.requests,
+            "trimmed_requests": self.trimmed_requests,
+            "over_budget": self.over_budget,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "trimmed_tokens": self.trimmed_tokens,
+            "avg_prompt_tokens": self.prompt_tokens / self.requests if self.requests else 0.0,
+        }
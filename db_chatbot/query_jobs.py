@@ -0,0 +1,99 @@
+"""
+Background execution of expensive queries.
+
+Statements the cost guard considers too heavy to run inside a request are
+submitted here instead. The caller gets a job id straight away and polls for
+the result; at most QUERY_JOB_WORKERS such statements run at once, so a burst
+of heavy questions cannot exhaust the connection pool. Finished jobs are kept
+for QUERY_JOB_TTL seconds.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+QUERY_JOB_WORKERS = int(os.getenv('QUERY_JOB_WORKERS', '2'))
+QUERY_JOB_TTL = float(os.getenv('QUERY_JOB_TTL', '3600'))
+QUERY_JOB_MAX_RETAINED = int(os.getenv('QUERY_JOB_MAX_RETAINED', '100'))
+
+
+class QueryJobs:
+    """Bounded worker pool for long-running statements, polled by job id."""
+
+    def __init__(self, max_workers: int = QUERY_JOB_WORKERS, ttl_seconds: float = QUERY_JOB_TTL,
+                 max_retained: int = QUERY_JOB_MAX_RETAINED):
+        self.ttl_seconds = ttl_seconds
+        self.max_retained = max_retained
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='query-job')
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def submit(self, sql_query: str, run: Callable[[str], Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._expire(time.time())
+            self._jobs[job_id] = {"job_id": job_id, "sql_query": sql_query, "status": "queued",
+                                  "submitted_at": time.time(), "finished_at": None,
+                                  "results": None, "error": None}
+            self.submitted += 1
+        self._executor.submit(self._run, job_id, sql_query, run)
+        logger.info(f"Query job {job_id} queued")
+        return job_id
+
+    def _run(self, job_id: str, sql_query: str, run: Callable[[str], Any]):
+        self._update(job_id, status="running")
+        try:
+            results = run(sql_query)
+        except Exception as e:
+            logger.error(f"Query job {job_id} failed: {e}")
+            with self._lock:
+                self.failed += 1
+            self._update(job_id, status="failed", error=str(getattr(e, 'detail', e)), finished_at=time.time())
+            return
+        with self._lock:
+            self.succeeded += 1
+        self._update(job_id, status="done", results=results, finished_at=time.time())
+        logger.info(f"Query job {job_id} finished")
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _expire(self, now: float):
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] and now - job["finished_at"] > self.ttl_seconds]:
+            del self._jobs[job_id]
+        finished = [job_id for job_id, job in self._jobs.items() if job["finished_at"]]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_retained)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+        return {
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "active": active,
+            "retained": len(self._jobs),
+        }
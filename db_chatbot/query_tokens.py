@@ -0,0 +1,59 @@
+"""
+Signed, opaque tokens that carry generated SQL between API calls.
+
+Clients get a token instead of being trusted to send SQL back: the payload is
+base64url JSON and the HMAC signature proves the server produced it.
+"""
+
+import os
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+from typing import Any, Dict
+
+# Set QUERY_TOKEN_SECRET (or PAGINATION_SECRET) so tokens survive restarts
+# and are accepted by every worker.
+QUERY_TOKEN_SECRET = (
+    os.getenv('QUERY_TOKEN_SECRET') or os.getenv('PAGINATION_SECRET') or secrets.token_hex(32)
+)
+
+
+class InvalidTokenError(ValueError):
+    """The token is malformed or was not signed by this server."""
+
+
+def _signature(payload: str) -> str:
+    return hmac.new(QUERY_TOKEN_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def sign_payload(data: Dict[str, Any]) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+    return f"{payload}.{_signature(payload)}"
+
+
+def verify_payload(token: str) -> Dict[str, Any]:
+    try:
+        payload, signature = token.rsplit('.', 1)
+    except ValueError:
+        raise InvalidTokenError("Malformed token")
+    if not hmac.compare_digest(signature.encode(), _signature(payload).encode()):
+        raise InvalidTokenError("Invalid token signature")
+    try:
+        return json.loads(base64.urlsafe_b64decode(payload.encode()))
+    except ValueError:
+        raise InvalidTokenError("Malformed token")
+
+
+def encode_query_id(sql_query: str) -> str:
+    """Token identifying a generated statement, e.g. for exports."""
+    return sign_payload({'sql': sql_query})
+
+
+def decode_query_id(query_id: str) -> str:
+    data = verify_payload(query_id)
+    # Other signed tokens (e.g. page cursors) verify too but carry no query.
+    if not isinstance(data, dict) or not isinstance(data.get('sql'), str):
+        raise InvalidTokenError("Not a query id")
+    return data['sql']
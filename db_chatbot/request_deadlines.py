@@ -0,0 +1,224 @@
+"""
+Per-stage deadlines and cancellation for query requests.
+
+A query request runs as a sequence of stages (schema lookup, LLM, database
+execution, serialization), each with its own deadline, and the HTTP client is
+watched for disconnects while a stage runs. When a deadline passes or the
+client goes away the stage is aborted: coroutines such as the LLM call are
+cancelled, which closes their HTTP request, and a SQL statement in flight is
+cancelled on the server through the DB-API driver (pyodbc `Cursor.cancel()`,
+sqlite3 `interrupt()`), so its pooled connection is released instead of
+staying busy until the statement finishes. Completed, timed-out and
+cancelled stages are counted for the metrics endpoints.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_STAGE_TIMEOUT = float(os.getenv('SCHEMA_STAGE_TIMEOUT', '15'))
+LLM_STAGE_TIMEOUT = float(os.getenv('LLM_STAGE_TIMEOUT', '45'))
+DB_STAGE_TIMEOUT = float(os.getenv('DB_STAGE_TIMEOUT', '30'))
+SERIALIZATION_TIMEOUT = float(os.getenv('SERIALIZATION_TIMEOUT', '10'))
+DISCONNECT_POLL_INTERVAL = float(os.getenv('DISCONNECT_POLL_INTERVAL', '0.5'))
+
+
+class StageAborted(Exception):
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+
+class StageTimeout(StageAborted):
+    """A stage ran past its deadline."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(stage, f"The {stage} step timed out after {timeout:g}s")
+        self.timeout = timeout
+
+
+class ClientDisconnected(StageAborted):
+    """The HTTP client went away while a stage was running."""
+
+    def __init__(self, stage: str):
+        super().__init__(stage, f"Client disconnected during the {stage} step")
+
+
+_current_canceller: ContextVar[Optional['StatementCanceller']] = ContextVar('statement_canceller', default=None)
+
+
+def _cancel_statement(dbapi_connection, cursor):
+    if hasattr(cursor, 'cancel'):
+        cursor.cancel()                  # pyodbc: SQLCancel, SQL Server stops the batch
+    elif hasattr(dbapi_connection, 'interrupt'):
+        dbapi_connection.interrupt()     # sqlite3
+    elif hasattr(dbapi_connection, 'cancel'):
+        dbapi_connection.cancel()        # psycopg2
+
+
+class StatementCanceller:
+    """Statements a request is running, so they can be cancelled from another thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[int, tuple] = {}
+        self.cancelled = False
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `func` with statements on tracked engines registered to this canceller."""
+        token = _current_canceller.set(self)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_canceller.reset(token)
+
+    def _track(self, dbapi_connection, cursor):
+        with self._lock:
+            if self.cancelled:
+                raise StageAborted('db', "Request was cancelled before the statement started")
+            self._active[id(cursor)] = (dbapi_connection, cursor)
+
+    def _untrack(self, cursor):
+        with self._lock:
+            self._active.pop(id(cursor), None)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            active = list(self._active.values())
+        for dbapi_connection, cursor in active:
+            try:
+                _cancel_statement(dbapi_connection, cursor)
+                logger.info("Cancelled a running statement")
+            except Exception as e:
+                logger.warning(f"Could not cancel statement: {e}")
+
+
+def install_statement_tracking(engine):
+    """Register statements on `engine` with the canceller bound by `StatementCanceller.call`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        canceller = _current_canceller.get()
+        if canceller is not None:
+            canceller._track(conn.connection.dbapi_connection, cursor)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        canceller = _current_canceller.get()
+        if canceller is not None:
+            canceller._untrack(cursor)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        canceller = _current_canceller.get()
+        cursor = getattr(context, 'cursor', None)
+        if canceller is not None and cursor is not None:
+            canceller._untrack(cursor)
+
+    return engine
+
+
+class StageMetrics:
+    """Completed, timed-out and cancelled counts and durations per stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, outcome: str, seconds: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"completed": 0, "timed_out": 0, "cancelled": 0,
+                                                    "total_seconds": 0.0, "max_seconds": 0.0})
+            entry[outcome] += 1
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                stage: {
+                    "completed": int(entry["completed"]),
+                    "timed_out": int(entry["timed_out"]),
+                    "cancelled": int(entry["cancelled"]),
+                    "avg_seconds": entry["total_seconds"] / max(1, entry["completed"] + entry["timed_out"] + entry["cancelled"]),
+                    "max_seconds": entry["max_seconds"],
+                }
+                for stage, entry in self._stages.items()
+            }
+
+
+stage_metrics = StageMetrics()
+
+
+class DisconnectProbe:
+    """Adapts a plain `() -> bool` check (e.g. a WebSocket's state) to the `is_disconnected()` run_stage polls."""
+
+    def __init__(self, check: Callable[[], bool]):
+        self._check = check
+
+    async def is_disconnected(self) -> bool:
+        return self._check()
+
+
+async def wait_for_disconnect(request, interval: float = DISCONNECT_POLL_INTERVAL):
+    """Return once `request.is_disconnected()` says so; a failing check counts as still connected."""
+    while True:
+        try:
+            if await request.is_disconnected():
+                return
+        except Exception as e:
+            logger.warning(f"Disconnect check failed ({e}); assuming the client is still connected")
+            await asyncio.Event().wait()     # stop watching; the stage deadline still applies
+        await asyncio.sleep(interval)
+
+
+def _discard_outcome(task: asyncio.Future):
+    # An abandoned stage may still fail; its exception is expected and not logged.
+    if not task.cancelled():
+        task.exception()
+
+
+async def run_stage(stage: str, work: Awaitable[Any], timeout: float, request=None,
+                    canceller: Optional[StatementCanceller] = None,
+                    metrics: StageMetrics = stage_metrics) -> Any:
+    """Await `work` within `timeout`, aborting it early if the client disconnects."""
+    started = time.perf_counter()
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request)) if request is not None else None
+    try:
+        done, _ = await asyncio.wait([t for t in (task, watcher) if t is not None],
+                                     timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        if canceller is not None:
+            canceller.cancel()
+        task.cancel()
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+
+    elapsed = time.perf_counter() - started
+    if task in done:
+        metrics.record(stage, "completed", elapsed)
+        return task.result()
+
+    if canceller is not None:
+        canceller.cancel()
+    task.add_done_callback(_discard_outcome)
+    task.cancel()
+    if watcher is not None and watcher in done:
+        metrics.record(stage, "cancelled", elapsed)
+        logger.info(f"Client disconnected during {stage}; request aborted")
+        raise ClientDisconnected(stage)
+    metrics.record(stage, "timed_out", elapsed)
+    logger.warning(f"{stage} stage timed out after {timeout:g}s")
+    raise StageTimeout(stage, timeout)
@@ -0,0 +1,153 @@
+"""
+Result-set cache for executed SQL.
+
+Entries are keyed by a canonical form of the SQL text (see `sql_parser`, so
+formatting and alias names don't split entries), expire after a TTL and are
+evicted least-recently-used once the cache exceeds its byte budget. Each
+entry records the tables its statement reads, so writes to a table can drop
+exactly the entries that depend on it.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .result_stream import json_default
+from .sql_parser import SqlValidationError, sql_parser
+
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', '300'))
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+_STRING_LITERAL = re.compile(r"N?'(?:[^']|'')*'")
+_WHITESPACE = re.compile(r'\s+')
+_TABLE_REFERENCE = re.compile(
+    r'\b(?:from|join|apply)\s+((?:\[?\w+\]?\.)*\[?\w+\]?)', re.IGNORECASE
+)
+
+
+def canonicalize_sql(sql_query: str) -> str:
+    """The parsed statement's key; otherwise whitespace and case collapsed outside string literals."""
+    try:
+        return sql_parser.parse(sql_query).key
+    except SqlValidationError:
+        pass
+    parts = []
+    last = 0
+    for match in _STRING_LITERAL.finditer(sql_query):
+        parts.append(_WHITESPACE.sub(' ', sql_query[last:match.start()].lower()))
+        parts.append(match.group(0))
+        last = match.end()
+    parts.append(_WHITESPACE.sub(' ', sql_query[last:].lower()))
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def referenced_tables(sql_query: str) -> Set[str]:
+    """Tables the statement reads; best-effort names after FROM / JOIN / APPLY if it does not parse."""
+    try:
+        return set(sql_parser.parse(sql_query).tables)
+    except SqlValidationError:
+        pass
+    stripped = _STRING_LITERAL.sub("''", sql_query)
+    tables = set()
+    for match in _TABLE_REFERENCE.finditer(stripped):
+        name = match.group(1).split('.')[-1].strip('[]').lower()
+        if name != 'select':
+            tables.add(name)
+    return tables
+
+
+class ResultCache:
+    """TTL + byte-budget LRU of query results with per-table invalidation."""
+
+    def __init__(self, ttl_seconds: float = RESULT_CACHE_TTL, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, sql_query: str) -> Optional[Dict[str, Any]]:
+        """Return {'results', 'cached_at', 'age_seconds'} or None on a miss."""
+        key = canonicalize_sql(sql_query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            age = time.time() - entry['cached_at']
+            if age > self.ttl_seconds:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {'results': entry['results'], 'cached_at': entry['cached_at'], 'age_seconds': age}
+
+    def put(self, sql_query: str, results: List[Dict[str, Any]], tables: Optional[Iterable[str]] = None):
+        key = canonicalize_sql(sql_query)
+        size = len(json.dumps(results, default=json_default))
+        if size > self.max_bytes:
+            return
+        table_set = {t.lower() for t in tables} if tables is not None else referenced_tables(sql_query)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                'results': results,
+                'tables': table_set,
+                'size': size,
+                'cached_at': time.time(),
+            }
+            self.total_bytes += size
+            for table in table_set:
+                self._by_table.setdefault(table, set()).add(key)
+            while self.total_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate_table(self, table: str) -> int:
+        """Drop every entry that reads `table`; returns how many were dropped."""
+        with self._lock:
+            keys = list(self._by_table.get(table.lower(), ()))
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry['size']
+        for table in entry['tables']:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
@@ -0,0 +1,137 @@
+"""
+Bounded-memory streaming of query results.
+
+Rows are read from a server-side cursor in `fetchmany` batches and encoded
+incrementally, so only one batch is held in memory regardless of how many
+rows the statement returns.
+"""
+
+import os
+import io
+import csv
+import json
+import logging
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', '1000'))
+ROW_LOG_SAMPLE = int(os.getenv('ROW_LOG_SAMPLE', '5'))
+
+
+def json_default(value: Any):
+    """json.dumps fallback for the types SQL Server drivers return."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+
+def log_row_sample(columns: Sequence[str], rows: Sequence[Sequence[Any]], offset: int = 0):
+    """Debug-log the first ROW_LOG_SAMPLE rows of a result instead of all of them."""
+    if not logger.isEnabledFor(logging.DEBUG) or offset >= ROW_LOG_SAMPLE:
+        return
+    for idx, row in enumerate(rows[:ROW_LOG_SAMPLE - offset], start=offset):
+        logger.debug(f"Row {idx}: {dict(zip(columns, row))}")
+
+
+def iter_batches(engine, sql_query: str, params: Optional[Dict[str, Any]] = None,
+                 batch_size: int = STREAM_BATCH_SIZE,
+                 describe: bool = False) -> Iterator[Tuple[List[Any], List[tuple]]]:
+    """Yield (columns, rows) batches from a streaming cursor on its own connection.
+
+    With `describe`, the column names are replaced by the DBAPI
+    `cursor.description` entries (name, type_code, display_size,
+    internal_size, precision, scale, null_ok) so typed encoders need not
+    guess types from the values.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+            text(sql_query), params or {}
+        )
+        names = columns = list(result.keys())
+        description = getattr(result.cursor, 'description', None) if describe else None
+        if description is not None and len(description) == len(names):
+            columns = [tuple(entry) for entry in description]
+        seen = 0
+        try:
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                log_row_sample(names, rows, seen)
+                seen += len(rows)
+                yield columns, [tuple(row) for row in rows]
+            if not seen:
+                # Still report the columns so encoders can write a header.
+                yield columns, []
+            logger.info(f"Streamed {seen} rows in batches of {batch_size}")
+        finally:
+            result.close()
+
+
+def ndjson_lines(batches: Iterator[Tuple[List[str], List[tuple]]],
+                 header: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Encode batches as newline-delimited JSON: one header line, then one line per row."""
+    if header is not None:
+        yield json.dumps({"type": "meta", **header}, default=json_default) + "\n"
+    row_count = 0
+    try:
+        for columns, rows in batches:
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), default=json_default) + "\n" for row in rows
+            )
+            row_count += len(rows)
+    except Exception as e:
+        logger.error(f"Streaming failed after {row_count} rows: {e}", exc_info=True)
+        yield json.dumps({"type": "error", "error": str(e), "row_count": row_count}) + "\n"
+        return
+    yield json.dumps({"type": "end", "row_count": row_count}) + "\n"
+
+
+def json_chunks(batches: Iterator[Tuple[List[str], List[tuple]]],
+                header: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """Encode batches as one JSON document, emitted a batch at a time."""
+    prefix = json.dumps(header or {}, default=json_default)[:-1]
+    yield (prefix + ", " if len(prefix) > 1 else prefix) + '"results": ['
+    row_count = 0
+    error = None
+    try:
+        for columns, rows in batches:
+            chunk = ", ".join(json.dumps(dict(zip(columns, row)), default=json_default) for row in rows)
+            yield (", " if row_count else "") + chunk
+            row_count += len(rows)
+    except Exception as e:
+        logger.error(f"Streaming failed after {row_count} rows: {e}", exc_info=True)
+        error = str(e)
+    yield f'], "row_count": {row_count}, "error": {json.dumps(error)}}}'
+
+
+def csv_chunks(batches: Iterator[Tuple[List[str], List[tuple]]]) -> Iterator[str]:
+    """Encode batches as CSV text: the header row, then one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    row_count = 0
+    header_written = False
+    try:
+        for columns, rows in batches:
+            if not header_written:
+                writer.writerow(columns)
+                header_written = True
+            writer.writerows(rows)
+            row_count += len(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    except Exception as e:
+        # Headers are already sent, so the only signal left is a short file.
+        logger.error(f"CSV export failed after {row_count} rows: {e}", exc_info=True)
+        raise
+    logger.info(f"Exported {row_count} rows as CSV")
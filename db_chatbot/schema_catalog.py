@@ -0,0 +1,146 @@
+"""
+Shared, cached database schema catalog.
+
+Loads every table, column, type, nullability flag and key of a schema in a
+single catalog query and keeps the result in process memory for a TTL, so
+request handlers no longer introspect the database on every question.
+"""
+
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CACHE_TTL = float(os.getenv('SCHEMA_CACHE_TTL', '300'))
+
+# One round trip: columns joined with their primary key and foreign key info.
+# A column that takes part in several foreign keys yields one row per key.
+CATALOG_QUERY = text("""
+    SELECT
+        t.name AS table_name,
+        c.name AS column_name,
+        ty.name AS data_type,
+        c.max_length,
+        c.precision,
+        c.scale,
+        c.is_nullable,
+        CASE WHEN pk.column_id IS NULL THEN 0 ELSE 1 END AS is_primary_key,
+        rt.name AS referenced_table,
+        rc.name AS referenced_column
+    FROM sys.tables t
+    INNER JOIN sys.schemas s ON t.schema_id = s.schema_id
+    INNER JOIN sys.columns c ON t.object_id = c.object_id
+    INNER JOIN sys.types ty ON c.user_type_id = ty.user_type_id
+    LEFT JOIN (
+        SELECT ic.object_id, ic.column_id
+        FROM sys.indexes i
+        INNER JOIN sys.index_columns ic
+            ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+        WHERE i.is_primary_key = 1
+    ) pk ON pk.object_id = c.object_id AND pk.column_id = c.column_id
+    LEFT JOIN sys.foreign_key_columns fkc
+        ON fkc.parent_object_id = c.object_id AND fkc.parent_column_id = c.column_id
+    LEFT JOIN sys.tables rt ON rt.object_id = fkc.referenced_object_id
+    LEFT JOIN sys.columns rc
+        ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+    WHERE s.name = :schema_name
+    ORDER BY t.name, c.column_id
+""")
+
+
+class SchemaCatalog:
+    """Process-wide schema cache filled from a single catalog query."""
+
+    def __init__(self, schema_name: str = 'dbo', ttl_seconds: float = SCHEMA_CACHE_TTL):
+        self.schema_name = schema_name
+        self.ttl_seconds = ttl_seconds
+        self._schema: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get_schema(self, conn, force_refresh: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Return {table: [column, ...]}, loading through `conn` when stale.
+
+        `conn` is anything with an `execute(text(...))` method: a SQLAlchemy
+        Session or Connection.
+        """
+        if not force_refresh and self._is_fresh():
+            return self._schema
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock.
+            if not force_refresh and self._is_fresh():
+                return self._schema
+            started = time.perf_counter()
+            rows = conn.execute(CATALOG_QUERY, {'schema_name': self.schema_name}).fetchall()
+            self._schema = self._build(rows)
+            self._loaded_at = time.time()
+            logger.info(
+                f"Schema catalog loaded: {len(self._schema)} tables in "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            return self._schema
+
+    def refresh(self, conn) -> Dict[str, List[Dict[str, Any]]]:
+        """Reload the catalog immediately, ignoring the TTL."""
+        return self.get_schema(conn, force_refresh=True)
+
+    def invalidate(self):
+        """Drop the cached catalog; the next lookup reloads it."""
+        with self._lock:
+            self._schema = None
+            self._loaded_at = None
+
+    @property
+    def age_seconds(self) -> Optional[float]:
+        if self._loaded_at is None:
+            return None
+        return time.time() - self._loaded_at
+
+    def _is_fresh(self) -> bool:
+        return self._schema is not None and self.age_seconds < self.ttl_seconds
+
+    @staticmethod
+    def _build(rows) -> Dict[str, List[Dict[str, Any]]]:
+        schema: Dict[str, List[Dict[str, Any]]] = {}
+        columns_by_key: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            key = (row.table_name, row.column_name)
+            column = columns_by_key.get(key)
+            if column is None:
+                column = {
+                    'name': row.column_name,
+                    'type': row.data_type,
+                    'max_length': row.max_length,
+                    'precision': row.precision,
+                    'scale': row.scale,
+                    'nullable': bool(row.is_nullable),
+                    'primary_key': bool(row.is_primary_key),
+                    'references': [],
+                }
+                columns_by_key[key] = column
+                schema.setdefault(row.table_name, []).append(column)
+            if row.referenced_table:
+                column['references'].append(f"{row.referenced_table}.{row.referenced_column}")
+        return schema
+
+
+def format_schema_text(schema: Dict[str, List[Dict[str, Any]]]) -> str:
+    """Render the catalog as the indented text listing used by DatabaseChatbot."""
+    lines = []
+    for table, columns in schema.items():
+        lines.append(f"\nTable: {table}")
+        lines.append("-" * (len(table) + 7))
+        for col in columns:
+            nullable = "NULL" if col['nullable'] else "NOT NULL"
+            lines.append(f"  {col['name']}: {col['type']} {nullable}")
+    return "\n".join(lines)
+
+
+# Shared instance so every caller in the process reuses one cache.
+schema_catalog = SchemaCatalog()
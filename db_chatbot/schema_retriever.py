@@ -0,0 +1,162 @@
+"""
+Local relevance ranking of tables for prompt-schema pruning.
+
+A BM25 index is built over each table's name, its column names and any
+domain description supplied for it. For a question, the top-k tables are kept
+together with their foreign-key neighbours, so the prompt only lists the part
+of a wide schema that can plausibly answer it. No network calls are involved.
+"""
+
+import os
+import re
+import math
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+from .prompt_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_TOP_K = int(os.getenv('SCHEMA_TOP_K', '8'))
+
+# Words that appear in nearly every question and say nothing about tables.
+_STOPWORDS = {
+    'a', 'an', 'the', 'of', 'in', 'on', 'for', 'to', 'by', 'and', 'or', 'with', 'is', 'are',
+    'what', 'which', 'who', 'how', 'many', 'much', 'show', 'me', 'list', 'give', 'get', 'all',
+    'each', 'per', 'from', 'top', 'most', 'least', 'their', 'our', 'we', 'do', 'does', 'have',
+    'has', 'than', 'that', 'this', 'these', 'those', 'it', 'its', 'be', 'as', 'at', 'id',
+}
+_CAMEL_BOUNDARY = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
+_WORD = re.compile(r'[a-z0-9]+')
+# Name tokens count this many times in a table's document.
+_NAME_WEIGHT = 3
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('es') and word[-3] in 'sxz':
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    text = _CAMEL_BOUNDARY.sub(' ', text).replace('_', ' ').lower()
+    return [_stem(w) for w in _WORD.findall(text) if w not in _STOPWORDS]
+
+
+class SchemaRetriever:
+    """BM25 ranking of tables, rebuilt whenever the schema changes."""
+
+    def __init__(self, top_k: int = SCHEMA_TOP_K, k1: float = 1.5, b: float = 0.75):
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._indexed_signature: Optional[int] = None
+        self._docs: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+        self._neighbours: Dict[str, Set[str]] = {}
+        self.questions = 0
+        self.pruned_questions = 0
+        self.tokens_saved = 0
+
+    def _index(self, schema: Dict[str, List[Dict[str, Any]]], descriptions: Dict[str, str]):
+        docs = {}
+        neighbours: Dict[str, Set[str]] = {table: set() for table in schema}
+        for table, columns in schema.items():
+            tokens = tokenize(table) * _NAME_WEIGHT
+            for col in columns:
+                tokens.extend(tokenize(col['name']))
+                for reference in col.get('references', ()):
+                    target = reference.split('.')[0]
+                    if target in neighbours and target != table:
+                        neighbours[table].add(target)
+                        neighbours[target].add(table)
+            tokens.extend(tokenize(descriptions.get(table, '')))
+            docs[table] = Counter(tokens)
+
+        document_frequency = Counter()
+        for counts in docs.values():
+            document_frequency.update(counts.keys())
+        total = len(docs)
+        self._idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+        self._docs = docs
+        self._doc_lengths = {table: sum(counts.values()) for table, counts in docs.items()}
+        self._avg_length = (sum(self._doc_lengths.values()) / total) if total else 0.0
+        self._neighbours = neighbours
+
+    def rank(self, question: str, schema: Dict[str, List[Dict[str, Any]]],
+             descriptions: Optional[Dict[str, str]] = None) -> List[tuple]:
+        """Return [(table, score)] for tables with a positive score, best first."""
+        signature = hash(tuple((table, tuple(c['name'] for c in columns)) for table, columns in schema.items()))
+        with self._lock:
+            if self._indexed_signature != signature:
+                self._index(schema, descriptions or {})
+                self._indexed_signature = signature
+            docs, lengths, idf, avg_length = self._docs, self._doc_lengths, self._idf, self._avg_length
+        query_terms = set(tokenize(question))
+        scores = []
+        for table, counts in docs.items():
+            length_norm = self.k1 * (1 - self.b + self.b * lengths[table] / (avg_length or 1))
+            score = 0.0
+            for term in query_terms:
+                tf = counts.get(term)
+                if tf:
+                    score += idf[term] * tf * (self.k1 + 1) / (tf + length_norm)
+            if score > 0:
+                scores.append((table, score))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores
+
+    def prune(self, question: str, schema: Dict[str, List[Dict[str, Any]]],
+              descriptions: Optional[Dict[str, str]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Top-k relevant tables plus their foreign-key neighbours.
+
+        Falls back to the full schema when it is already small or nothing
+        in the question matches.
+        """
+        self.questions += 1
+        if len(schema) <= self.top_k:
+            return schema
+        ranked = self.rank(question, schema, descriptions)
+        if not ranked:
+            return schema
+        selected: Set[str] = {table for table, _ in ranked[:self.top_k]}
+        for table in list(selected):
+            selected |= self._neighbours.get(table, set())
+        self.pruned_questions += 1
+        # Keep catalog order so prompts stay stable for the generation cache.
+        return {table: columns for table, columns in schema.items() if table in selected}
+
+    def record_savings(self, full_prompt_schema: str, pruned_prompt_schema: str) -> int:
+        saved = count_tokens(full_prompt_schema) - count_tokens(pruned_prompt_schema)
+        self.tokens_saved += max(saved, 0)
+        return saved
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "questions": self.questions,
+            "pruned_questions": self.pruned_questions,
+            "prompt_tokens_saved": self.tokens_saved,
+            "top_k": self.top_k,
+        }
+
+
+def domain_descriptions(domain_schemas: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """Flatten DOMAIN_SCHEMAS-style entries into per-table description text."""
+    descriptions: Dict[str, List[str]] = {}
+    for domain, info in domain_schemas.items():
+        text = " ".join([domain, " ".join(info.get("kpis", [])), info.get("system_prompt", "")])
+        for table, columns in info.get("tables", {}).items():
+            descriptions.setdefault(table, []).append(text + " " + " ".join(columns))
+    return {table: " ".join(parts) for table, parts in descriptions.items()}
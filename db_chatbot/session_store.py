@@ -0,0 +1,186 @@
+"""
+Per-session conversation memory for the API servers.
+
+Each client session gets its own `ChatMemory`, looked up by session id. At
+most SESSION_MAX_LIVE sessions stay in memory; the least recently used one is
+evicted when the limit is reached, and sessions idle for SESSION_IDLE_TTL
+seconds are evicted on the next access. With SESSION_SPILL_PATH set, evicted
+sessions are written to SQLite and restored transparently when their id comes
+back, so per-process memory stays bounded without losing conversations.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .result_stream import json_default
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_LIVE = int(os.getenv('SESSION_MAX_LIVE', '1000'))
+SESSION_IDLE_TTL = float(os.getenv('SESSION_IDLE_TTL', '1800'))
+SESSION_SPILL_PATH = os.getenv('SESSION_SPILL_PATH', '')
+SESSION_SPILL_TTL = float(os.getenv('SESSION_SPILL_TTL', str(24 * 3600)))
+
+_SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{1,128}$')
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def valid_session_id(session_id: Optional[str]) -> bool:
+    return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+
+class SessionStore:
+    """LRU of live session memories with idle expiry and optional SQLite spill."""
+
+    def __init__(self, factory: Callable[[], Any], max_sessions: int = SESSION_MAX_LIVE,
+                 idle_ttl: float = SESSION_IDLE_TTL, spill_path: Optional[str] = SESSION_SPILL_PATH,
+                 spill_ttl: float = SESSION_SPILL_TTL):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.spill_ttl = spill_ttl
+        self.spill_path = spill_path or None
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+        self.spilled = 0
+        self.restored = 0
+        if self.spill_path:
+            self._open_disk()
+
+    def _open_disk(self):
+        try:
+            self._disk = sqlite3.connect(self.spill_path, check_same_thread=False)
+            self._disk.execute("""
+                CREATE TABLE IF NOT EXISTS chat_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._disk.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Session spill disabled, could not open {self.spill_path}: {e}")
+            self._disk = None
+
+    def get(self, session_id: str):
+        """Return the memory for a session, restoring or creating it as needed."""
+        now = time.time()
+        with self._lock:
+            self._expire_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry['last_access'] = now
+                self._sessions.move_to_end(session_id)
+                return entry['memory']
+            memory = self._restore(session_id, now)
+            if memory is None:
+                memory = self.factory()
+                self.created += 1
+            self._sessions[session_id] = {'memory': memory, 'last_access': now}
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, evicted = self._sessions.popitem(last=False)
+                self._spill(evicted_id, evicted)
+                self.evicted += 1
+            return memory
+
+    def peek(self, session_id: str):
+        """Return a live or spilled session's memory without creating one."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                return entry['memory']
+        if self._disk is None:
+            return None
+        return self.get(session_id) if self._spilled_exists(session_id) else None
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+                self._disk.commit()
+
+    def _expire_idle(self, now: float):
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry['last_access'] <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self._spill(session_id, entry)
+            self.expired += 1
+
+    def _spill(self, session_id: str, entry: Dict[str, Any]):
+        if self._disk is None:
+            return
+        try:
+            payload = json.dumps(entry['memory'].to_dict(), default=json_default)
+            self._disk.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, payload, last_access) VALUES (?, ?, ?)",
+                (session_id, payload, entry['last_access'])
+            )
+            self._disk.execute("DELETE FROM chat_sessions WHERE last_access < ?", (time.time() - self.spill_ttl,))
+            self._disk.commit()
+            self.spilled += 1
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Could not spill session {session_id}: {e}")
+
+    def _spilled_exists(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._disk.execute(
+                "SELECT 1 FROM chat_sessions WHERE session_id = ? AND last_access >= ?",
+                (session_id, time.time() - self.spill_ttl)
+            ).fetchone()
+        return row is not None
+
+    def _restore(self, session_id: str, now: float):
+        if self._disk is None:
+            return None
+        try:
+            row = self._disk.execute(
+                "SELECT payload, last_access FROM chat_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._disk.execute("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,))
+            self._disk.commit()
+            if now - row[1] > self.spill_ttl:
+                return None
+            memory = self.factory()
+            memory.load_dict(json.loads(row[0]))
+            self.restored += 1
+            return memory
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Could not restore session {session_id}: {e}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        spilled_sessions = None
+        if self._disk is not None:
+            with self._lock:
+                spilled_sessions = self._disk.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+        return {
+            "live_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "created": self.created,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "spilled": self.spilled,
+            "restored": self.restored,
+            "spilled_sessions": spilled_sessions,
+        }
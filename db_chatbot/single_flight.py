@@ -0,0 +1,97 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+When several requests ask for the same thing at the same moment (a dashboard
+opened in ten tabs), the first caller for a key starts the work and the rest
+await the same future; every follower receives its own copy of the result.
+The shared work is not owned by any one request: a caller that times out or
+disconnects only stops waiting, and the work is cancelled (through the
+`abandon` callback, e.g. to cancel a running statement) once no caller is
+left. Keys are forgotten as soon as the work finishes, so this never serves
+stale results; caching stays the job of the caches.
+
+All bookkeeping happens on the event loop, so no locking is needed.
+"""
+
+import os
+import copy
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+REQUEST_COALESCING = os.getenv('REQUEST_COALESCING', 'true').lower() in ('1', 'true', 'yes')
+
+
+class _Flight:
+    __slots__ = ('task', 'abandon', 'waiters')
+
+    def __init__(self, task: asyncio.Future, abandon: Optional[Callable[[], None]]):
+        self.task = task
+        self.abandon = abandon
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Concurrent `run` calls with the same key share one execution."""
+
+    def __init__(self, name: str, copy_result: Callable[[Any], Any] = copy.deepcopy,
+                 enabled: bool = REQUEST_COALESCING):
+        self.name = name
+        self.copy_result = copy_result
+        self.enabled = enabled
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.executions = 0
+        self.deduplicated = 0
+        self.abandoned = 0
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[Any]],
+                  abandon: Optional[Callable[[], None]] = None) -> Any:
+        """Await `work()` for `key`, or join the call already running for it."""
+        self.calls += 1
+        if not self.enabled:
+            self.executions += 1
+            return await work()
+
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight(asyncio.ensure_future(work()), abandon)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.executions += 1
+        else:
+            self.deduplicated += 1
+            logger.info(f"{self.name}: joined an in-flight call ({flight.waiters} already waiting)")
+
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Last one out: nobody wants the result any more.
+                self._forget(key, flight)
+                self.abandoned += 1
+                flight.task.cancel()
+                if flight.abandon is not None:
+                    flight.abandon()
+            raise
+        finally:
+            flight.waiters -= 1
+        return result if leader else self.copy_result(result)
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "executions": self.executions,
+            "deduplicated": self.deduplicated,
+            "abandoned": self.abandoned,
+            "in_flight": len(self._flights),
+        }
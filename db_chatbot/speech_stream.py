@@ -0,0 +1,67 @@
+"""
+Helpers for sentence-pipelined speech synthesis.
+
+Long answers are split into sentences that are synthesized a few at a time
+and streamed in order, so playback can start after the first sentence rather
+than after the whole text.
+"""
+
+import re
+import struct
+import threading
+from typing import Any, Dict, List
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;:])\s+|\n+')
+MIN_SENTENCE_CHARS = 20
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text at sentence boundaries, merging fragments that are too short to voice well."""
+    sentences: List[str] = []
+    for part in _SENTENCE_BOUNDARY.split(text.strip()):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and len(sentences[-1]) < MIN_SENTENCE_CHARS:
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def streaming_wav_header(sample_rate: int = 16000, bits_per_sample: int = 16, channels: int = 1) -> bytes:
+    """RIFF/WAVE header with an open-ended data size, for PCM that is still being produced."""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    unknown_size = 0xFFFFFFFF
+    return (
+        b'RIFF' + struct.pack('<I', unknown_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b'data' + struct.pack('<I', unknown_size)
+    )
+
+
+class SynthesisTimings:
+    """Aggregated time-to-first-byte and total synthesis time of streamed TTS."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_ttfb = 0.0
+        self.total_duration = 0.0
+        self.max_ttfb = 0.0
+
+    def record(self, ttfb: float, duration: float):
+        with self._lock:
+            self.requests += 1
+            self.total_ttfb += ttfb
+            self.total_duration += duration
+            self.max_ttfb = max(self.max_ttfb, ttfb)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "streamed_requests": self.requests,
+            "avg_time_to_first_byte": self.total_ttfb / self.requests if self.requests else 0.0,
+            "max_time_to_first_byte": self.max_ttfb,
+            "avg_total_seconds": self.total_duration / self.requests if self.requests else 0.0,
+        }
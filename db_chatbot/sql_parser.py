@@ -0,0 +1,423 @@
+"""
+Offline T-SQL parsing for generated statements.
+
+Generated SQL is tokenized locally, without a round trip to the server, before
+it is executed. The parse:
+
+- refuses anything but a single read-only SELECT (optionally behind a WITH
+  list of CTEs): no second statement, no DML/DDL, no EXEC, no SELECT INTO;
+- lists the tables the statement reads and the columns it references;
+- renders a canonical form with whitespace and casing normalized, table
+  aliases renamed t1, t2, ... in order of appearance and literals replaced by
+  `?`, so differently formatted copies of the same statement compare equal.
+  `ParsedSql.key` is the same text with the literals kept, for caches whose
+  results depend on them.
+
+Parses, including refusals, are memoized per statement text in an LRU of
+SQL_PARSE_CACHE_SIZE entries.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+SQL_PARSE_CACHE_SIZE = int(os.getenv('SQL_PARSE_CACHE_SIZE', '1024'))
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>N?'(?:[^']|'')*')
+  | (?P<bracketed>\[(?:[^\]]|\]\])*\])
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<number>0x[0-9a-f]*|(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?)
+  | (?P<variable>@@?\w+)
+  | (?P<word>[^\W\d]\w*|\#\#?\w+)
+  | (?P<operator><>|!=|>=|<=|!<|!>|[-+*/%=<>&|^~])
+  | (?P<punct>[(),.;])
+""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+
+Token = namedtuple('Token', 'kind value')
+
+# Words that change data, schema, permissions or session state, or reach
+# outside the database. Any of them outside a string literal or a bracketed
+# name refuses the statement.
+_FORBIDDEN = {
+    'insert', 'update', 'delete', 'merge', 'truncate', 'drop', 'alter', 'create', 'into',
+    'exec', 'execute', 'grant', 'revoke', 'deny', 'backup', 'restore', 'dbcc', 'bulk',
+    'openrowset', 'opendatasource', 'openquery', 'openxml', 'shutdown', 'kill', 'reconfigure',
+    'waitfor', 'use', 'set', 'declare', 'begin', 'commit', 'rollback', 'save', 'checkpoint',
+    'writetext', 'updatetext', 'readtext', 'goto', 'print', 'raiserror', 'throw',
+}
+
+# Reserved words that can follow a table reference or start a clause, so are
+# never taken for an alias or a column.
+_KEYWORDS = _FORBIDDEN | {
+    'select', 'with', 'as', 'from', 'where', 'join', 'inner', 'left', 'right', 'full', 'outer',
+    'cross', 'apply', 'on', 'group', 'by', 'order', 'having', 'union', 'all', 'except',
+    'intersect', 'distinct', 'top', 'percent', 'ties', 'and', 'or', 'not', 'in', 'is', 'null',
+    'like', 'between', 'exists', 'case', 'when', 'then', 'else', 'end', 'asc', 'desc', 'over',
+    'partition', 'rows', 'range', 'unbounded', 'preceding', 'following', 'current', 'row',
+    'offset', 'fetch', 'next', 'first', 'only', 'pivot', 'unpivot', 'for', 'option', 'escape',
+    'collate', 'tablesample', 'any', 'some', 'within', 'values', 'nolock', 'readuncommitted',
+    'window', 'xml', 'json', 'path', 'auto', 'raw', 'browse',
+}
+
+# Names that appear bare inside function calls without being columns:
+# CAST/CONVERT target types and DATEADD/DATEDIFF/DATEPART date parts.
+_NOT_COLUMNS = {
+    'int', 'bigint', 'smallint', 'tinyint', 'bit', 'decimal', 'numeric', 'money', 'smallmoney',
+    'float', 'real', 'date', 'datetime', 'datetime2', 'smalldatetime', 'datetimeoffset', 'time',
+    'char', 'varchar', 'nchar', 'nvarchar', 'text', 'ntext', 'binary', 'varbinary',
+    'uniqueidentifier', 'max', 'year', 'yy', 'yyyy', 'quarter', 'qq', 'q', 'month', 'mm', 'm',
+    'dayofyear', 'dy', 'y', 'day', 'dd', 'd', 'week', 'wk', 'ww', 'weekday', 'dw', 'hour', 'hh',
+    'minute', 'mi', 'n', 'second', 'ss', 's', 'millisecond', 'ms', 'iso_week', 'isowk', 'isoww',
+}
+
+_SIMPLE_NAME = re.compile(r'^[^\W\d]\w*$')
+
+
+class SqlValidationError(ValueError):
+    """The statement is not a single read-only SELECT."""
+
+
+class ParsedSql:
+    __slots__ = ('sql', 'canonical', 'key', 'parameters', 'tables', 'columns', 'ctes')
+
+    def __init__(self, sql: str, canonical: str, key: str, parameters: Tuple[str, ...],
+                 tables: FrozenSet[str], columns: FrozenSet[str], ctes: FrozenSet[str]):
+        self.sql = sql
+        self.canonical = canonical
+        self.key = key
+        self.parameters = parameters
+        self.tables = tables
+        self.columns = columns
+        self.ctes = ctes
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"canonical": self.canonical, "parameters": list(self.parameters),
+                "tables": sorted(self.tables), "columns": sorted(self.columns)}
+
+
+def tokenize(sql_query: str) -> List[Token]:
+    """Tokens of `sql_query` without whitespace and comments; names are unquoted and lowercased."""
+    tokens = []
+    pos = 0
+    length = len(sql_query)
+    while pos < length:
+        match = _TOKEN.match(sql_query, pos)
+        if match is None:
+            snippet = sql_query[pos:pos + 20]
+            if snippet.startswith(("'", "N'", "n'", '/*', '[', '"')):
+                raise SqlValidationError(f"Unterminated literal, comment or name near: {snippet}")
+            raise SqlValidationError(f"Unexpected character near: {snippet}")
+        kind = match.lastgroup
+        text = match.group(0)
+        pos = match.end()
+        if kind in ('space', 'comment'):
+            continue
+        if kind == 'bracketed':
+            tokens.append(Token('name', text[1:-1].replace(']]', ']').lower()))
+        elif kind == 'quoted':
+            tokens.append(Token('name', text[1:-1].replace('""', '"').lower()))
+        elif kind == 'word':
+            tokens.append(Token('word', text.lower()))
+        elif kind == 'string':
+            tokens.append(Token('string', text[0].upper() + text[1:] if text[0] in 'nN' else text))
+        else:
+            tokens.append(Token(kind, text.lower()))
+    return tokens
+
+
+def _is_name(token: Token) -> bool:
+    return token.kind == 'name' or (token.kind == 'word' and token.value not in _KEYWORDS)
+
+
+def _is_punct(tokens: List[Token], i: int, value: str) -> bool:
+    return i < len(tokens) and tokens[i].kind == 'punct' and tokens[i].value == value
+
+
+def _is_word(tokens: List[Token], i: int, value: str) -> bool:
+    return i < len(tokens) and tokens[i].kind == 'word' and tokens[i].value == value
+
+
+def _closing_paren(tokens: List[Token], i: int) -> int:
+    """Index just past the parenthesis that closes the one at `i`."""
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j].kind == 'punct':
+            if tokens[j].value == '(':
+                depth += 1
+            elif tokens[j].value == ')':
+                depth -= 1
+                if depth == 0:
+                    return j + 1
+    raise SqlValidationError("Unbalanced parentheses")
+
+
+def _validate(tokens: List[Token]) -> List[Token]:
+    while tokens and _is_punct(tokens, len(tokens) - 1, ';'):
+        tokens = tokens[:-1]
+    if not tokens:
+        raise SqlValidationError("Empty SQL query")
+    depth = 0
+    for token in tokens:
+        if token.kind == 'punct':
+            if token.value == ';':
+                raise SqlValidationError("Only a single statement is allowed")
+            depth += token.value == '('
+            depth -= token.value == ')'
+            if depth < 0:
+                raise SqlValidationError("Unbalanced parentheses")
+        elif token.kind == 'word' and token.value in _FORBIDDEN:
+            raise SqlValidationError(f"{token.value.upper()} is not allowed; only SELECT queries can run")
+        elif token.kind == 'word' and token.value.startswith('#'):
+            raise SqlValidationError("Temporary tables are not allowed")
+    if depth:
+        raise SqlValidationError("Unbalanced parentheses")
+    first = next((token for token in tokens if not (token.kind == 'punct' and token.value == '(')), None)
+    if first is None or first.kind != 'word' or first.value not in ('select', 'with'):
+        raise SqlValidationError("Only SELECT queries can run")
+    return tokens
+
+
+def _cte_names(tokens: List[Token]) -> Dict[int, str]:
+    """Positions of the CTE names declared by a leading WITH."""
+    names = {}
+    if not _is_word(tokens, 0, 'with'):
+        return names
+    i = 1
+    while i < len(tokens) and _is_name(tokens[i]):
+        names[i] = tokens[i].value
+        i += 1
+        if _is_punct(tokens, i, '('):
+            i = _closing_paren(tokens, i)
+        if not _is_word(tokens, i, 'as') or not _is_punct(tokens, i + 1, '('):
+            raise SqlValidationError("Malformed WITH clause")
+        i = _closing_paren(tokens, i + 1)
+        if not _is_punct(tokens, i, ','):
+            break
+        i += 1
+    return names
+
+
+def _dotted_name(tokens: List[Token], i: int) -> int:
+    """Index just past a (possibly multi-part) name starting at `i`."""
+    i += 1
+    while _is_punct(tokens, i, '.') and i + 1 < len(tokens) and _is_name(tokens[i + 1]):
+        i += 2
+    return i
+
+
+def _table_sources(tokens: List[Token]):
+    """
+    Walk FROM / JOIN / APPLY sources.
+
+    Returns (name positions, aliases, alias positions): name positions cover
+    every part of a table's multi-part name, and aliases map an alias to its
+    table (None for derived tables and table functions).
+    """
+    tables: Dict[int, str] = {}
+    aliases: Dict[str, Optional[str]] = {}
+    alias_at: Dict[int, str] = {}
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.kind != 'word' or token.value not in ('from', 'join', 'apply'):
+            i += 1
+            continue
+        listed = token.value == 'from'
+        i += 1
+        resume = i      # derived tables are walked again for their own FROM
+        while i < len(tokens):
+            source = None
+            if _is_punct(tokens, i, '('):
+                i = _closing_paren(tokens, i)
+            elif _is_name(tokens[i]):
+                start = i
+                i = _dotted_name(tokens, i)
+                if _is_punct(tokens, i, '('):
+                    i = _closing_paren(tokens, i)       # table-valued function
+                else:
+                    source = tokens[i - 1].value
+                    for j in range(start, i, 2):
+                        tables[j] = tokens[j].value
+            else:
+                break
+            if _is_word(tokens, i, 'as'):
+                i += 1
+            if i < len(tokens) and _is_name(tokens[i]):
+                aliases[tokens[i].value] = source
+                alias_at[i] = tokens[i].value
+                i += 1
+                if _is_punct(tokens, i, '('):
+                    i = _closing_paren(tokens, i)       # derived table column list
+            elif source is not None:
+                aliases.setdefault(source, source)
+            if _is_word(tokens, i, 'with') and _is_punct(tokens, i + 1, '('):
+                i = _closing_paren(tokens, i + 1)       # table hints
+            if listed and _is_punct(tokens, i, ','):
+                i += 1
+                continue
+            break
+        i = resume
+    return tables, aliases, alias_at
+
+
+def _ends_expression(tokens: List[Token], i: int) -> bool:
+    token = tokens[i]
+    if _is_punct(tokens, i, ')'):
+        depth = 0
+        for j in range(i, -1, -1):
+            depth += (tokens[j].value == ')') - (tokens[j].value == '(') if tokens[j].kind == 'punct' else 0
+            if depth == 0:
+                return not _is_word(tokens, j - 1, 'top')
+    if token.kind == 'number':
+        return not _is_word(tokens, i - 1, 'top')
+    return token.kind == 'string' or _is_name(token) or (token.kind == 'word' and token.value in ('as', 'end'))
+
+
+def _columns(tokens: List[Token], skip: set, aliases: Dict[str, Optional[str]],
+             ctes: FrozenSet[str], default_table: Optional[str]) -> FrozenSet[str]:
+    # `expr AS alias` and `expr alias` name output columns, not table columns.
+    column_aliases = {tokens[i + 1].value for i in range(len(tokens) - 1)
+                      if _is_name(tokens[i + 1]) and i + 1 not in skip and _ends_expression(tokens, i)}
+    columns = set()
+    i = 0
+    while i < len(tokens):
+        if i in skip or not _is_name(tokens[i]) or _is_punct(tokens, i - 1, '.'):
+            i += 1
+            continue
+        end = _dotted_name(tokens, i)
+        if _is_punct(tokens, end, '(') or tokens[i].value in column_aliases and end == i + 1:
+            i = end
+            continue
+        if _is_punct(tokens, end, '.'):
+            i = end + 2                                 # alias.*
+            continue
+        parts = [tokens[j].value for j in range(i, end, 2)]
+        column = parts[-1]
+        if len(parts) > 1:
+            qualifier = parts[-2]
+            table = aliases.get(qualifier, qualifier)
+            if table is not None and table not in ctes:
+                columns.add(f"{table}.{column}")
+        elif column not in _NOT_COLUMNS and column not in aliases:
+            columns.add(f"{default_table}.{column}" if default_table else column)
+        i = end
+    return frozenset(columns)
+
+
+def _render(tokens: List[Token], names: Dict[int, str], dropped: set) -> Tuple[str, str, Tuple[str, ...]]:
+    canonical, keyed, parameters = [], [], []
+    previous = None
+    for i, token in enumerate(tokens):
+        if i in dropped:
+            continue
+        if token.kind in ('string', 'number'):
+            text = '?'
+            parameters.append(token.value)
+        elif i in names:
+            text = names[i]
+        elif token.kind == 'name':
+            text = token.value if _SIMPLE_NAME.match(token.value) and token.value not in _KEYWORDS \
+                else '[' + token.value.replace(']', ']]') + ']'
+        else:
+            text = token.value
+        glue = previous is None or previous.value in ('(', '.') or token.value in (')', ',', '.') or (
+            token.value == '(' and previous.kind in ('word', 'name') and _is_name(previous))
+        separator = '' if glue else ' '
+        canonical.append(separator + text)
+        keyed.append(separator + (token.value if text == '?' else text))
+        previous = token
+    return ''.join(canonical), ''.join(keyed), tuple(parameters)
+
+
+def parse_sql(sql_query: str) -> ParsedSql:
+    """Validate and analyse one statement; raises SqlValidationError if it may not run."""
+    tokens = _validate(tokenize(sql_query))
+    cte_at = _cte_names(tokens)
+    ctes = frozenset(cte_at.values())
+    table_at, aliases, alias_at = _table_sources(tokens)
+
+    tables = frozenset(tokens[_dotted_name(tokens, i) - 1].value for i in table_at
+                       if not _is_punct(tokens, i - 1, '.')) - ctes
+    default_table = next(iter(tables)) if len(tables) == 1 and not ctes and \
+        all(source is not None for source in aliases.values()) else None
+    columns = _columns(tokens, set(table_at) | set(alias_at) | set(cte_at), aliases, ctes, default_table)
+
+    # Table aliases are renamed t1, t2, ... by first declaration, wherever
+    # they are declared or used as a qualifier. The prefix grows if the
+    # statement already uses such a name for something else.
+    declared = list(dict.fromkeys(alias_at[i] for i in sorted(alias_at)))
+    taken = {token.value for token in tokens if _is_name(token) and token.value not in declared}
+    prefix = 't'
+    while any(f"{prefix}{n}" in taken for n in range(1, len(declared) + 1)):
+        prefix = '_' + prefix
+    renamed = {alias: f"{prefix}{n}" for n, alias in enumerate(declared, 1)}
+    names = {i: renamed[alias] for i, alias in alias_at.items()}
+    for i, token in enumerate(tokens):
+        if (_is_name(token) and token.value in renamed and _is_punct(tokens, i + 1, '.')
+                and not _is_punct(tokens, i - 1, '.') and i not in table_at):
+            names[i] = renamed[token.value]
+    # `x AS a` / `x a`, `INNER JOIN` / `JOIN` and `LEFT OUTER` / `LEFT` are the same.
+    dropped = {i - 1 for i in alias_at if _is_word(tokens, i - 1, 'as')}
+    dropped |= {i for i in range(len(tokens) - 1)
+                if (_is_word(tokens, i, 'inner') and _is_word(tokens, i + 1, 'join'))
+                or (_is_word(tokens, i, 'outer') and _is_word(tokens, i + 1, 'join')
+                    and i > 0 and tokens[i - 1].value in ('left', 'right', 'full'))}
+    canonical, key, parameters = _render(tokens, names, dropped)
+    return ParsedSql(sql_query, canonical, key, parameters, tables, columns, ctes)
+
+
+class SqlParser:
+    """LRU-memoized `parse_sql`; refusals are memoized too."""
+
+    def __init__(self, max_entries: int = SQL_PARSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def parse(self, sql_query: str) -> ParsedSql:
+        with self._lock:
+            entry = self._entries.get(sql_query)
+            if entry is not None:
+                self._entries.move_to_end(sql_query)
+                self.hits += 1
+        if entry is None:
+            try:
+                entry = parse_sql(sql_query)
+            except SqlValidationError as e:
+                entry = e
+            with self._lock:
+                self.misses += 1
+                self._entries[sql_query] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        if isinstance(entry, SqlValidationError):
+            with self._lock:
+                self.rejected += 1
+            raise SqlValidationError(str(entry))
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "rejected": self.rejected,
+            "entries": len(self._entries),
+        }
+
+
+sql_parser = SqlParser()
+
+
+def validate_sql(sql_query: str) -> ParsedSql:
+    """Memoized parse of `sql_query`; raises SqlValidationError unless it is a single SELECT."""
+    return sql_parser.parse(sql_query)
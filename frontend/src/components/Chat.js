@@ -89,6 +89,18 @@ import {
 const SPEECH_KEY = process.env.REACT_APP_SPEECH_KEY;
 const SPEECH_REGION = process.env.REACT_APP_SPEECH_REGION;
 const API_URL = process.env.REACT_APP_API_URL || "http://localhost:8000";
+const JOB_POLL_INTERVAL_MS = 2000;
+
+// Expensive queries come back as a background job; poll until it finishes.
+const waitForQueryJob = async (jobId) => {
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const { data } = await axios.get(`${API_URL}/api/jobs/${jobId}`);
+    if (data.status === "done" || data.status === "failed") {
+      return data;
+    }
+  }
+};
 
 const VALID_QUESTIONS = [
   "Show all employees",
@@ -203,6 +215,18 @@ function Chat() {
       alert("No results to export!");
       return;
     }
+    if (format === "csv" && resultsMsg.queryId) {
+      // Let the server re-run the query and stream the CSV directly.
+      const link = document.createElement("a");
+      link.href = `${API_URL}/api/export/stream?query_id=${encodeURIComponent(
+        resultsMsg.queryId
+      )}`;
+      link.setAttribute("download", "query-results.csv");
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      return;
+    }
     try {
       const response = await axios.post(
         `${API_URL}/api/export`,
@@ -775,12 +799,22 @@ function Chat() {
         domain: selectedDomain?.id,
       });
 
-      const { sql_query, results, explanation, suggestions } = response.data;
+      const { sql_query, query_id, explanation, suggestions, job_id } =
+        response.data;
+      let { results } = response.data;
+      if (job_id) {
+        const job = await waitForQueryJob(job_id);
+        if (job.status === "failed") {
+          setError(job.error || "The query failed while running in the background.");
+          return;
+        }
+        results = job.results;
+      }
 
       setMessages((prev) => [
         ...prev,
         { type: "sql", content: sql_query },
-        { type: "results", content: results },
+        { type: "results", content: results, queryId: query_id },
         { type: "analysis", content: explanation },
         // Add suggestions as a separate message type if desired
         // { type: "suggestions", content: suggestions },
@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from db_chatbot.chart_data import ChartDataError, chart_data, line_series, lttb_indices
+
+
+def reference_lttb(x, y, threshold):
+    """Steinarsson's LTTB written out point by point."""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    selected, a = [0], 0
+    for i in range(threshold - 2):
+        avg_start, avg_end = math.floor((i + 1) * every) + 1, min(math.floor((i + 2) * every) + 1, n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = None, -1.0
+        for j in range(math.floor(i * every) + 1, math.floor((i + 1) * every) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    return selected + [n - 1]
+
+
+@pytest.mark.parametrize("n, threshold", [(1000, 50), (997, 100), (50, 3), (10_000, 2000)])
+def test_lttb_matches_the_reference_algorithm(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.uniform(0, 1000, n))
+    y = np.cumsum(rng.normal(size=n))
+    assert lttb_indices(x, y, threshold).tolist() == reference_lttb(x.tolist(), y.tolist(), threshold)
+
+
+def test_lttb_keeps_ends_and_spikes():
+    x = np.arange(10_000, dtype=float)
+    y = np.zeros(10_000)
+    y[4321] = 100.0
+    keep = lttb_indices(x, y, 100)
+    assert len(keep) == 100 and keep[0] == 0 and keep[-1] == 9_999
+    assert 4321 in keep and np.all(np.diff(keep) > 0)
+
+
+def test_lttb_leaves_small_series_alone():
+    assert lttb_indices(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_line_payload_is_bounded_and_sorted():
+    dates = pd.date_range("2020-01-01", periods=50_000, freq="h")
+    df = pd.DataFrame({"at": dates[::-1], "value": np.arange(50_000.0)})
+    payload = line_series(df, "at", "value", max_points=500)
+    assert payload["total"] == 50_000 and payload["returned"] == 500
+    assert payload["downsampling"] == "lttb"
+    assert payload["points"]["x"] == sorted(payload["points"]["x"])
+
+
+def test_auto_kind_and_bad_requests():
+    df = pd.DataFrame({"dept": ["HR", "Sales", "HR"], "salary": [1.0, 2.0, 3.0]})
+    assert chart_data(df, x="dept")["kind"] == "bar"
+    assert chart_data(df, x="salary")["kind"] == "histogram"
+    with pytest.raises(ChartDataError):
+        chart_data(df, kind="pie")
+    with pytest.raises(ChartDataError):
+        chart_data(df, kind="line", x="salary")
@@ -0,0 +1,99 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("plotly")
+
+from db_chatbot import chart_renderer
+from db_chatbot.chart_renderer import PLOTLY_BUNDLE, ChartRenderer, chart_insights, fingerprint
+
+FRAME = pd.DataFrame({
+    "name": ["Ada", "Grace", "Linus", "Barbara"],
+    "department": ["Engineering", "Engineering", "Research", "Sales"],
+    "salary": [120000, 115000, 98000, 87000],
+})
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    renderer = ChartRenderer(output_dir=str(tmp_path), max_workers=2)
+    yield renderer
+    renderer.shutdown()
+
+
+def test_fingerprint_follows_the_data():
+    assert fingerprint(FRAME) == fingerprint(FRAME.copy())
+    assert fingerprint(FRAME) != fingerprint(FRAME.assign(salary=FRAME["salary"] + 1))
+    assert fingerprint(FRAME) != fingerprint(FRAME.astype({"salary": float}))
+
+
+def test_the_same_frame_renders_once(renderer):
+    path, first = renderer.submit(FRAME, chart_insights(FRAME))
+    same_path, second = renderer.submit(FRAME.copy(), chart_insights(FRAME))
+    assert second is first and same_path == path
+    assert first.result(timeout=60) == path and os.path.exists(path)
+    stats = renderer.stats()
+    assert (stats["submitted"], stats["deduplicated"], stats["rendered"]) == (1, 1, 1)
+
+
+def test_reports_load_the_shared_bundle(renderer, tmp_path):
+    other = FRAME.assign(salary=FRAME["salary"] * 2)
+    paths = [renderer.submit(df, [])[1].result(timeout=60) for df in (FRAME, other)]
+    assert len(set(paths)) == 2
+    bundle = tmp_path / PLOTLY_BUNDLE
+    assert bundle.stat().st_size > 1_000_000
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        assert f'<script src="{PLOTLY_BUNDLE}"></script>' in html
+        # plotly.js itself is not inlined into the report.
+        assert len(html) < bundle.stat().st_size / 10
+        assert "plotly.js v" not in html
+    assert sorted(os.listdir(tmp_path)) == sorted([PLOTLY_BUNDLE] + [os.path.basename(p) for p in paths])
+
+
+def test_a_report_on_disk_is_reused_by_a_new_renderer(renderer, tmp_path):
+    path = renderer.submit(FRAME, [])[1].result(timeout=60)
+    fresh = ChartRenderer(output_dir=str(tmp_path))
+    try:
+        same_path, future = fresh.submit(FRAME, [])
+        assert same_path == path and future.done() and future.result() == path
+        assert fresh.stats()["reused_on_disk"] == 1 and fresh.stats()["submitted"] == 0
+    finally:
+        fresh.shutdown()
+
+
+def test_a_failed_render_is_retried_on_the_next_submit(renderer, monkeypatch):
+    build_figures = chart_renderer.build_figures
+    calls = []
+
+    def flaky(df, summarize=False):
+        calls.append(summarize)
+        if len(calls) == 1:
+            raise RuntimeError("plotly exploded")
+        return build_figures(df, summarize)
+
+    monkeypatch.setattr(chart_renderer, "build_figures", flaky)
+    path, failed = renderer.submit(FRAME, [])
+    with pytest.raises(RuntimeError):
+        failed.result(timeout=60)
+    _, retried = renderer.submit(FRAME, [])
+    assert retried is not failed
+    assert retried.result(timeout=60) == path and os.path.exists(path)
+    assert len(calls) == 2 and renderer.stats()["failures"] == 1
+
+
+def test_large_results_are_summarized_under_their_own_key(renderer, monkeypatch):
+    monkeypatch.setattr(chart_renderer, "CHART_MAX_POINTS", 2)
+    path, future = renderer.submit(FRAME, [])
+    assert path.endswith("_summary.html")
+    assert future.result(timeout=60) == path
+    full_path, _ = renderer.submit(FRAME, [], summarize=False)
+    assert full_path != path
+
+
+def test_chart_insights():
+    insights = chart_insights(FRAME)
+    assert "• Engineering is the largest department with 2 employees" in insights
+    assert "• Salary range: $87,000.00 - $120,000.00" in insights
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from db_chatbot.chat_memory import ChatMemory, ResultStore
+
+
+def _frame(rows):
+    return pd.DataFrame({"id": range(rows), "salary": [1000.0 + i for i in range(rows)]})
+
+
+def test_result_store_evicts_least_recently_used_within_its_byte_budget():
+    size = int(_frame(100).memory_usage(deep=True).sum())
+    store = ResultStore(max_bytes=2 * size)
+    first, second = store.put(_frame(100)), store.put(_frame(100))
+    store.get(first)
+    third = store.put(_frame(100))
+    assert store.get(second) is None
+    assert store.get(first) is not None and store.get(third) is not None
+    assert store.stats()["evictions"] == 1 and store.stats()["bytes"] == 2 * size
+
+
+def test_oversized_frames_are_not_kept():
+    store = ResultStore(max_bytes=10)
+    assert store.get(store.put(_frame(100))) is None
+    assert store.stats()["bytes"] == 0
+
+
+def test_memory_keeps_a_summary_and_a_reference():
+    store = ResultStore()
+    memory = ChatMemory(store=store)
+    memory.add_results("SELECT id, salary FROM employees", _frame(50))
+    results = memory.last_results()
+    assert results["row_count"] == 50
+    assert results["columns"][1] == {"name": "salary", "dtype": "float64", "nulls": 0,
+                                     "min": 1000.0, "max": 1049.0, "mean": 1024.5}
+    assert len(memory.get_results(results)) == 50
+    # The serialized memory holds the summary, never the rows.
+    assert "result_id" in str(memory.to_dict()) and "1049.0" in str(memory.to_dict())
+    assert len(str(memory.to_dict())) < 1000
+
+
+def test_evicted_results_degrade_to_the_summary():
+    memory = ChatMemory(store=ResultStore(max_bytes=10))
+    memory.add_results("SELECT id, salary FROM employees", _frame(50))
+    assert memory.get_results(memory.last_results()) is None
+    assert memory.last_results()["row_count"] == 50
+
+
+def test_round_trip_through_a_dict():
+    memory = ChatMemory(max_turns=2)
+    for question in ("one", "two", "three"):
+        memory.add_message("user", question)
+    restored = ChatMemory()
+    restored.load_dict(memory.to_dict())
+    assert list(restored.get_current_context()["query_history"]) == ["two", "three"]
+    assert restored.get_formatted_history() == memory.get_formatted_history()
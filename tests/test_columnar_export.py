@@ -0,0 +1,99 @@
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from sqlalchemy import create_engine, text
+
+from db_chatbot.columnar_export import ColumnarExportError, arrow_stream_chunks, infer_schema, parquet_chunks
+from db_chatbot.result_stream import iter_batches
+
+# What pyodbc reports: (name, type_code, display_size, internal_size, precision, scale, null_ok)
+DESCRIPTION = [
+    ("id", int, None, 10, 10, 0, False),
+    ("salary", Decimal, None, 12, 12, 2, True),
+    ("hired", date, None, 10, 10, 0, True),
+    ("updated", datetime, None, 23, 23, 3, True),
+    ("name", str, None, 50, 50, 0, True),
+]
+
+
+def test_schema_comes_from_the_description_not_the_first_batch():
+    # The first batch is all NULL outside the key; values would say "string".
+    schema = infer_schema(DESCRIPTION, [(1, None, None, None, None)])
+    assert schema.field("salary").type == pa.decimal128(12, 2)
+    assert schema.field("hired").type == pa.date32()
+    assert schema.field("updated").type == pa.timestamp("us")
+    assert schema.field("name").type == pa.string()
+
+
+def test_columns_without_a_type_code_are_inferred():
+    schema = infer_schema(["id", ("score", None, None, None, None, None, True)], [(1, 2.5)])
+    assert schema.field("id").type == pa.int64()
+    assert schema.field("score").type == pa.float64()
+
+
+def _batches():
+    yield DESCRIPTION, [(1, None, None, None, None)]
+    yield DESCRIPTION, [(2, Decimal("10.5"), date(2020, 1, 2), datetime(2021, 3, 4, 5, 6), "Ada"),
+                        (3, Decimal("7"), None, None, "Grace")]
+
+
+def test_later_batches_are_cast_to_the_schema():
+    table = pa.ipc.open_stream(b"".join(arrow_stream_chunks(_batches()))).read_all()
+    assert table.num_rows == 3
+    assert table.column("salary").to_pylist() == [None, Decimal("10.50"), Decimal("7.00")]
+    assert table.column("hired").to_pylist()[1] == date(2020, 1, 2)
+
+
+def test_parquet_round_trip():
+    table = pq.read_table(io.BytesIO(b"".join(parquet_chunks(_batches()))))
+    assert table.schema.field("salary").type == pa.decimal128(12, 2)
+    assert table.column("name").to_pylist() == [None, "Ada", "Grace"]
+
+
+def _sqlite(values):
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (k INTEGER PRIMARY KEY, x)"))
+        for k, x in enumerate(values):
+            conn.execute(text("INSERT INTO t VALUES (:k, :x)"), {"k": k, "x": x})
+    return engine
+
+
+def _export(engine, batch_size):
+    batches = iter_batches(engine, "SELECT x FROM t ORDER BY k", batch_size=batch_size, describe=True)
+    return pa.ipc.open_stream(b"".join(arrow_stream_chunks(batches))).read_all()
+
+
+def test_integers_widen_to_float_within_a_batch():
+    # SQLite reports no types: the values decide, and 2.5 must not become 2.
+    table = _export(_sqlite([1, 2, 2.5]), batch_size=3)
+    assert table.schema.field("x").type == pa.float64()
+    assert table.column("x").to_pylist() == [1, 2, 2.5]
+
+
+def test_fraction_after_an_integer_batch_is_an_error_not_a_truncation():
+    with pytest.raises(ColumnarExportError, match="'x'.*int64"):
+        _export(_sqlite([1, 2, 2.5]), batch_size=2)
+
+
+def test_all_null_first_batch_waits_for_a_value():
+    table = _export(_sqlite([None, None, 1, 2, None]), batch_size=2)
+    assert table.schema.field("x").type == pa.int64()
+    assert table.column("x").to_pylist() == [None, None, 1, 2, None]
+
+
+def test_a_column_that_stays_null_is_exported_as_strings():
+    table = _export(_sqlite([None, None, None]), batch_size=2)
+    assert table.schema.field("x").type == pa.string()
+    assert table.column("x").to_pylist() == [None, None, None]
+
+
+def test_empty_result_still_has_a_schema():
+    table = _export(_sqlite([]), batch_size=2)
+    assert table.num_rows == 0 and table.schema.names == ["x"]
@@ -0,0 +1,75 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from db_chatbot.cost_guard import ALLOW, ASYNC, LIMIT, REJECT, CostGuard, limit_rows, parse_showplan
+
+PLAN = """<ShowPlanXML xmlns="http://schemas.microsoft.com/sqlserver/2004/07/showplan">
+<BatchSequence><Batch><Statements>
+<StmtSimple StatementSubTreeCost="12.5" StatementEstRows="4200" />
+</Statements></Batch></BatchSequence></ShowPlanXML>"""
+
+
+class FakeGuard(CostGuard):
+    """A guard on a pretend SQL Server whose plans are given per statement."""
+
+    def __init__(self, plans, **kwargs):
+        super().__init__(SimpleNamespace(dialect=SimpleNamespace(name="mssql")), enabled=True, **kwargs)
+        self.fake_plans = plans
+        self.estimates = 0
+
+    def estimate(self, sql_query):
+        self.estimates += 1
+        return self.fake_plans[sql_query]
+
+
+def test_parse_showplan():
+    assert parse_showplan(PLAN) == {"estimated_cost": 12.5, "estimated_rows": 4200.0}
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT name FROM employees", "SELECT TOP (100) name FROM employees"),
+    ("SELECT DISTINCT dept FROM employees;", "SELECT DISTINCT TOP (100) dept FROM employees"),
+    ("SELECT TOP 5000 name FROM employees", "SELECT TOP (100) name FROM employees"),
+    ("SELECT TOP 10 name FROM employees", "SELECT TOP 10 name FROM employees"),
+    ("SELECT a FROM x UNION SELECT a FROM y", None),
+    ("SELECT TOP 10 PERCENT name FROM employees", None),
+])
+def test_limit_rows(sql, expected):
+    assert limit_rows(sql, 100) == expected
+
+
+def test_decisions():
+    guard = FakeGuard({
+        "SELECT 1": {"estimated_cost": 1, "estimated_rows": 1},
+        "SELECT a FROM big": {"estimated_cost": 1, "estimated_rows": 10 ** 6},
+        "SELECT a FROM slow": {"estimated_cost": 100, "estimated_rows": 1},
+        "SELECT a FROM huge": {"estimated_cost": 10 ** 6, "estimated_rows": 1},
+    }, reject_cost=1000, async_cost=50, max_rows=10)
+    assert guard.check("SELECT 1").action == ALLOW
+    limited = guard.check("SELECT a FROM big")
+    assert limited.action == LIMIT and limited.sql == "SELECT TOP (10) a FROM big"
+    assert guard.check("SELECT a FROM slow").action == ASYNC
+    assert guard.check("SELECT a FROM huge").action == REJECT
+
+
+def test_memoized_decisions_are_logged_and_recorded(caplog):
+    guard = FakeGuard({"SELECT a FROM big": {"estimated_cost": 1, "estimated_rows": 10 ** 6}}, max_rows=10)
+    with caplog.at_level(logging.INFO, logger="db_chatbot.cost_guard"):
+        guard.check("SELECT a FROM big")
+        guard.check("select  a  from big")
+    assert guard.estimates == 1 and guard.cache_hits == 1
+    assert [r["cached"] for r in guard.recent()] == [False, True]
+    assert guard.recent()[1]["estimated_rows"] == 10 ** 6
+    messages = [r.getMessage() for r in caplog.records]
+    assert any("cached=True" in m and "rows=1000000" in m for m in messages)
+
+
+def test_plan_failure_fails_open_or_closed():
+    class Broken(FakeGuard):
+        def estimate(self, sql_query):
+            raise RuntimeError("no plan")
+
+    assert Broken({}).check("SELECT 1").action == ALLOW
+    assert Broken({}, fail_open=False).check("SELECT 1").action == REJECT
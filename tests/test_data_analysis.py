@@ -0,0 +1,31 @@
+from decimal import Decimal
+
+import pandas as pd
+
+from db_chatbot import data_analysis
+from db_chatbot.data_analysis import analyze_dataframe, count_skills
+
+SKILLS = pd.Series(["SQL, Python", "Python", None, "Excel, SQL", "Python, SQL", "Design"] * 5)
+
+
+def test_both_skill_counting_paths_agree(monkeypatch):
+    direct = count_skills(SKILLS)
+    monkeypatch.setattr(data_analysis, "DISTINCT_SKILLS_MIN_ROWS", 0)
+    distinct_first = count_skills(SKILLS)
+    pd.testing.assert_series_equal(direct, distinct_first, check_names=False)
+    assert list(direct.items())[:2] == [("SQL", 15), ("Python", 15)]
+
+
+def test_report_uses_one_set_of_department_aggregates():
+    df = pd.DataFrame({
+        "department": ["Sales", "HR", "Sales"],
+        "salary": [Decimal("100.50"), Decimal("80"), Decimal("120")],
+        "performance_score": [4.6, 3.0, 4.0],
+        "doj": ["2020-01-05", "2021-03-01", "2020-07-01"],
+    })
+    report = analyze_dataframe(df)
+    assert "  • Sales: 2 employees" in report
+    assert "    - Range: $100.50 - $120.00" in report
+    assert "  • 2020: 2 new employees" in report
+    assert "Sales department has the highest average salary" in report
+    assert list(df.columns) == ["department", "salary", "performance_score", "doj"]
@@ -0,0 +1,49 @@
+import pytest
+
+from db_chatbot.generation_cache import GenerationCache, cache_key, normalize_question
+
+SCHEMA = "Table: employees\n- name (nvarchar)\n"
+ENTRY = {"sql_query": "SELECT TOP 5 name FROM employees", "explanation": "Five names"}
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Show me the top five employees!", "show me the top 5 employees"),
+    ("Salaries above 100,000", "salaries above 100000"),
+    ("Scores over 4.50", "scores over 4.5"),
+    ("What's   the headcount?", "whats the headcount"),
+])
+def test_equivalent_questions_share_a_key(a, b):
+    assert normalize_question(a) == normalize_question(b)
+    assert cache_key(a, SCHEMA) == cache_key(b, SCHEMA)
+
+
+def test_a_schema_change_misses():
+    assert cache_key("top 5 employees", SCHEMA) != cache_key("top 5 employees", SCHEMA + "- salary (money)\n")
+
+
+def test_memory_lru_evicts_the_least_recently_used():
+    cache = GenerationCache(max_memory_entries=2, db_path=None)
+    cache.put("first", SCHEMA, ENTRY)
+    cache.put("second", SCHEMA, ENTRY)
+    assert cache.get("first", SCHEMA) is not None   # now most recently used
+    cache.put("third", SCHEMA, ENTRY)
+    assert cache.get("second", SCHEMA) is None
+    assert cache.get("first", SCHEMA) is not None and cache.get("third", SCHEMA) is not None
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_entries_are_copies():
+    cache = GenerationCache(db_path=None)
+    cache.put("q", SCHEMA, ENTRY)
+    cache.get("q", SCHEMA)["sql_query"] = "DROP TABLE employees"
+    assert cache.get("q", SCHEMA) == ENTRY
+
+
+def test_disk_store_survives_a_restart(tmp_path):
+    path = str(tmp_path / "generations.db")
+    GenerationCache(db_path=path).put("top 5 employees", SCHEMA, ENTRY)
+    restarted = GenerationCache(db_path=path)
+    assert restarted.get("Top five employees?", SCHEMA) == ENTRY
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get("Top five employees?", SCHEMA) == ENTRY
+    assert restarted.stats()["memory_hits"] == 1
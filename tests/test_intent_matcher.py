@@ -0,0 +1,76 @@
+import pytest
+
+from db_chatbot.intent_matcher import IntentMatcher, compile_template
+
+# Ordinary questions (several of them the app's own suggestions) that the
+# keyword rules used to answer with the wrong canned SQL.
+LLM_QUESTIONS = [
+    "Show me salary trends over time",
+    "Show me performance trends over time",
+    "Which department has the highest average salary?",
+    "List employees with performance score above 4",
+    "What is the salary of the top performer?",
+    "Show me employees with specific skills",
+    "How many employees in engineering earn more than 100,000?",
+    "Show me the top 5 highest paid employees hired after 2020",
+]
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return IntentMatcher()
+
+
+@pytest.mark.parametrize("question", LLM_QUESTIONS)
+def test_questions_with_their_own_filters_go_to_the_llm(matcher, question):
+    assert matcher.match(question) is None
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("Show me all employees", "all_employees"),
+    ("Give me department analysis", "example:give_me_department_analysis"),
+    ("Show me time-based trends", "example:show_me_time_based_trends"),
+    ("Who are the top 10 highest paid employees?", "top_paid"),
+    ("highest paid employees in sales", "top_paid"),
+    ("How many employees are there in each department?", "headcount_by_department"),
+    ("How many employees are in each department?", "headcount_by_department"),
+    ("Show me average performance by department", "performance_by_department"),
+    ("What skills does each department have?", "skills_by_department"),
+    ("Show me the hiring trend in engineering", "hiring_trend"),
+])
+def test_canned_phrasings_match(matcher, question, intent):
+    match = matcher.match(question)
+    assert match is not None and match.intent.name == intent
+
+
+def test_slots_are_rendered(matcher):
+    match = matcher.match("Top ten highest paid employees in the marketing department")
+    assert match.slots["limit"] == 10 and match.slots["department"] == "marketing"
+    assert "TOP 10" in match.sql_query and "department = 'marketing'" in match.sql_query
+
+
+def test_keyword_rules_are_opt_in():
+    question = "Show me employees with specific skills"
+    assert IntentMatcher().match(question) is None
+    assert IntentMatcher(keyword_rules=True).match(question).intent.name == "skills_by_department"
+
+
+def test_intents_missing_from_schema_are_skipped(matcher):
+    schema = {"projects": [{"name": "project_id"}]}
+    assert matcher.match("Show me all employees", schema) is None
+
+
+def test_template_syntax():
+    pattern = compile_template("[show me ][the ]top [{n} ](paid|earning) employees")
+    assert pattern.match("top paid employees")
+    assert pattern.match("show me the top 3 earning employees")
+    assert not pattern.match("top paid employees in 2020")
+    assert not pattern.match("top employees")
+
+
+def test_hit_rate_accounting():
+    matcher = IntentMatcher()
+    matcher.match("Show me all employees")
+    matcher.match("Show me salary trends over time")
+    stats = matcher.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
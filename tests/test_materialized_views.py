@@ -0,0 +1,63 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from db_chatbot.materialized_views import MaterializedViews
+
+QUERIES = {"item_count": "SELECT COUNT(*) AS n FROM items"}
+
+
+class Views(MaterializedViews):
+    """Source versions are set by the test instead of read from SQL Server's catalog."""
+
+    versions = {"items": "ct:1"}
+
+    def _source_versions(self, conn, tables):
+        return {t: v for t, v in self.versions.items() if t in tables}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'views.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO items (id) VALUES (1), (2)"))
+    return engine
+
+
+def test_unchanged_sources_are_checked_not_rebuilt(engine):
+    views = Views(engine, QUERIES, snapshot_dir="")
+    assert views.refresh() == {"item_count": "refreshed"}
+    snapshot, _ = views.lookup(QUERIES["item_count"])
+    built_at = snapshot.refreshed_at
+
+    time.sleep(0.01)
+    assert views.refresh() == {"item_count": "unchanged"}
+    assert snapshot.refreshed_at == built_at
+    assert snapshot.checked_at > built_at
+
+
+def test_changed_source_rebuilds(engine):
+    views = Views(engine, QUERIES, snapshot_dir="")
+    views.refresh()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO items (id) VALUES (3)"))
+    views.versions = {"items": "ct:2"}
+    assert views.refresh() == {"item_count": "refreshed"}
+    assert views.lookup(QUERIES["item_count"])[0].rows == [{"n": 3}]
+
+
+def test_sources_without_cheap_change_detection_rebuild_every_time(engine):
+    views = Views(engine, QUERIES, snapshot_dir="")
+    views.versions = {}
+    assert views.refresh() == {"item_count": "refreshed"}
+    assert views.refresh() == {"item_count": "refreshed"}
+    assert views.skipped_refreshes == 0
+
+
+def test_stale_snapshot_is_not_served(engine):
+    views = Views(engine, QUERIES, snapshot_dir="", max_staleness=60)
+    views.refresh()
+    views.lookup(QUERIES["item_count"])[0].checked_at -= 120
+    assert views.lookup(QUERIES["item_count"]) is None
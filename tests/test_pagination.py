@@ -0,0 +1,110 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from db_chatbot.pagination import (
+    PaginationError, build_page_query, decode_cursor, encode_cursor, resolve_keys, split_statement,
+    unique_key_columns,
+)
+from db_chatbot.query_tokens import InvalidTokenError, sign_payload, verify_payload
+
+SCHEMA = {
+    "Employees": [{"name": "employee_id", "type": "int", "primary_key": True},
+                  {"name": "name", "type": "nvarchar", "primary_key": False},
+                  {"name": "notes", "type": "ntext", "primary_key": False}],
+    "Departments": [{"name": "department_id", "type": "int", "primary_key": True}],
+    "Events": [{"name": "payload", "type": "nvarchar", "primary_key": False}],
+}
+
+
+def test_signed_payload_round_trip():
+    token = sign_payload({"sql": "SELECT 1", "n": 2})
+    assert verify_payload(token) == {"sql": "SELECT 1", "n": 2}
+
+
+@pytest.mark.parametrize("tamper", [
+    lambda t: t[:-1] + ("0" if t[-1] != "0" else "1"),   # signature
+    lambda t: "e" + t,                                      # payload
+    lambda t: t.replace(".", ""),                          # no signature at all
+])
+def test_tampered_tokens_are_refused(tamper):
+    with pytest.raises(InvalidTokenError):
+        verify_payload(tamper(sign_payload({"sql": "SELECT 1"})))
+
+
+def test_cursor_round_trips_typed_values():
+    state = {"sql": "SELECT 1", "keys": [["hired", False], ["salary", True]],
+             "last": [date(2024, 2, 29), Decimal("1234.50")], "size": 50, "total": 900}
+    decoded = decode_cursor(encode_cursor(state))
+    assert decoded["last"] == [date(2024, 2, 29), Decimal("1234.50")]
+    assert decoded["keys"] == [("hired", False), ("salary", True)]
+
+
+def test_forged_cursor_is_a_pagination_error():
+    with pytest.raises(PaginationError):
+        decode_cursor(sign_payload({"sql": "SELECT 1"}) + "x")
+
+
+def test_split_statement_keeps_cte_and_drops_order_by():
+    parts = split_statement("WITH c AS (SELECT * FROM t ORDER BY a OFFSET 0 ROWS) SELECT a, b FROM c ORDER BY a DESC, b;")
+    assert parts["prefix"].startswith("WITH c AS")
+    assert parts["body"] == "SELECT a, b FROM c"
+    assert parts["order_items"] == [("a", True), ("b", False)]
+
+
+@pytest.mark.parametrize("sql", ["UPDATE t SET a = 1", "SELECT a FROM t ORDER BY a OFFSET 5 ROWS"])
+def test_unpageable_statements(sql):
+    with pytest.raises(PaginationError):
+        split_statement(sql)
+
+
+def test_primary_key_is_the_tie_breaker():
+    unique_key = unique_key_columns({"employees"}, SCHEMA)
+    assert unique_key == ["employee_id"]
+    keys = resolve_keys([("e.name", True)], ["name", "employee_id", "notes"], {"notes": "ntext"}, unique_key)
+    assert keys == [("name", True), ("employee_id", False)]
+
+
+def test_joins_need_every_primary_key():
+    assert unique_key_columns({"employees", "departments"}, SCHEMA) == ["department_id", "employee_id"]
+    assert unique_key_columns({"employees", "events"}, SCHEMA) is None
+
+
+def test_falls_back_to_all_orderable_columns_without_the_key_in_the_output():
+    keys = resolve_keys([], ["name", "notes"], {"notes": "ntext"}, ["employee_id"])
+    assert keys == [("name", False)]
+
+
+def test_order_by_expression_is_not_pageable():
+    with pytest.raises(PaginationError):
+        resolve_keys([("COUNT(*)", False)], ["name"])
+
+
+def _run_page(conn, parts, keys, last, size):
+    # SQLite has no TOP; the seek predicate and ORDER BY are what is under test.
+    page_sql, params = build_page_query(parts, keys, last, size)
+    page_sql = page_sql.replace(f"SELECT TOP ({size + 1}) *", "SELECT *") + f" LIMIT {size + 1}"
+    return conn.execute(text(page_sql), params).fetchall()
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_cover_every_row_once(descending):
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE employees (employee_id INTEGER PRIMARY KEY, dept TEXT)"))
+        # Heavy ties on the sort key, and NULLs.
+        for i in range(1, 48):
+            conn.execute(text("INSERT INTO employees VALUES (:i, :d)"),
+                         {"i": i, "d": None if i % 7 == 0 else "abc"[i % 3]})
+        parts = split_statement(f"SELECT employee_id, dept FROM employees ORDER BY dept {'DESC' if descending else ''}")
+        keys = resolve_keys(parts["order_items"], ["employee_id", "dept"], None, ["employee_id"])
+        seen, last = [], None
+        while True:
+            rows = _run_page(conn, parts, keys, last, 5)
+            seen.extend(row.employee_id for row in rows[:5])
+            if len(rows) <= 5:
+                break
+            last = [rows[4].dept, rows[4].employee_id]
+    assert sorted(seen) == list(range(1, 48))
@@ -0,0 +1,71 @@
+import pytest
+
+from db_chatbot.prompt_budget import TokenBudget, count_message_tokens, count_tokens
+
+QUESTION = "Which departments pay the highest average salary?"
+BASE = count_message_tokens([
+    {"role": "system", "content": "You are an expert SQL assistant."},
+    {"role": "user", "content": f'Generate a SQL query for: "{QUESTION}"'},
+])
+EXAMPLES = [f"Example {i}: SELECT COUNT(*) FROM orders WHERE region = 'north {i}'" for i in range(4)]
+TABLES = [f"Table: {name}\n- id (int)\n- name (nvarchar)\n- created_at (datetime)"
+          for name in ("employees", "departments", "salaries", "audit_log")]
+
+
+def _size(items):
+    return sum(count_tokens(item) for item in items)
+
+
+def test_everything_is_kept_when_it_fits():
+    budget = TokenBudget(max_prompt_tokens=BASE + _size(EXAMPLES) + _size(TABLES))
+    kept, trimmed = budget.fit(BASE, [("examples", EXAMPLES), ("schema", TABLES)])
+    assert kept == {"examples": EXAMPLES, "schema": TABLES}
+    assert trimmed == 0
+
+
+def test_examples_are_trimmed_before_schema_tables():
+    # Room for every table and one example: only examples go.
+    budget = TokenBudget(max_prompt_tokens=BASE + _size(TABLES) + count_tokens(EXAMPLES[0]))
+    kept, trimmed = budget.fit(BASE, [("examples", EXAMPLES), ("schema", TABLES)])
+    assert kept["schema"] == TABLES
+    assert kept["examples"] == EXAMPLES[:1]
+    assert trimmed == _size(EXAMPLES[1:])
+
+
+def test_least_relevant_tables_go_first_once_examples_are_gone():
+    budget = TokenBudget(max_prompt_tokens=BASE + _size(TABLES[:2]))
+    kept, trimmed = budget.fit(BASE, [("examples", EXAMPLES), ("schema", TABLES)])
+    assert kept == {"examples": [], "schema": TABLES[:2]}
+    assert trimmed == _size(EXAMPLES) + _size(TABLES[2:])
+
+
+@pytest.mark.parametrize("limit", range(BASE, BASE + _size(EXAMPLES) + _size(TABLES) + 1, 7))
+def test_fit_never_exceeds_the_budget(limit):
+    budget = TokenBudget(max_prompt_tokens=limit)
+    kept, trimmed = budget.fit(BASE, [("examples", EXAMPLES), ("schema", TABLES)])
+    total = BASE + _size(kept["examples"]) + _size(kept["schema"])
+    assert total <= limit
+    assert total + trimmed == BASE + _size(EXAMPLES) + _size(TABLES)
+
+
+def test_the_question_is_never_dropped():
+    # The question lives in the base prompt, which fit only counts; even a
+    # budget below it trims the optional sections and nothing else.
+    budget = TokenBudget(max_prompt_tokens=BASE - 1)
+    kept, trimmed = budget.fit(BASE, [("schema", TABLES)])
+    assert kept == {"schema": []}
+    assert trimmed == _size(TABLES)
+
+
+def test_record_accumulates_usage():
+    budget = TokenBudget(max_prompt_tokens=100, history_size=2)
+    budget.record("sql", 80, 20)
+    budget.record("sql", 120, 10, trimmed_tokens=30)
+    budget.record("suggestions", 50, 5)
+    stats = budget.stats()
+    assert stats["requests"] == 3
+    assert stats["trimmed_requests"] == 1
+    assert stats["over_budget"] == 1
+    assert (stats["prompt_tokens"], stats["completion_tokens"], stats["trimmed_tokens"]) == (250, 35, 30)
+    assert [r["label"] for r in budget.recent()] == ["sql", "suggestions"]
+    assert budget.recent(1)[0]["prompt_tokens"] == 50
@@ -0,0 +1,37 @@
+import pytest
+
+from db_chatbot.query_tokens import (
+    InvalidTokenError, decode_query_id, encode_query_id, sign_payload, verify_payload,
+)
+
+SQL = "SELECT TOP 10 name FROM employees ORDER BY salary DESC"
+
+
+def test_round_trip():
+    assert decode_query_id(encode_query_id(SQL)) == SQL
+    assert verify_payload(sign_payload({"a": [1, 2]})) == {"a": [1, 2]}
+
+
+def _tamper(token):
+    signature = token.rsplit(".", 1)[1]
+    forged = sign_payload({"sql": "DELETE FROM employees"}).rsplit(".", 1)[0]
+    return f"{forged}.{signature}"
+
+
+@pytest.mark.parametrize("mangle", [
+    _tamper,                                                    # payload swapped, signature kept
+    lambda t: t[:-1] + ("0" if t[-1] != "0" else "1"),          # signature altered
+    lambda t: t[:-5],                                           # truncated signature
+    lambda t: t[5:],                                            # truncated payload
+    lambda t: t.rsplit(".", 1)[0],                              # signature missing
+    lambda t: t + "é",                                          # non-ASCII garbage
+    lambda t: "",
+])
+def test_tampered_or_truncated_tokens_are_rejected(mangle):
+    with pytest.raises(InvalidTokenError):
+        decode_query_id(mangle(encode_query_id(SQL)))
+
+
+def test_other_signed_tokens_are_not_query_ids():
+    with pytest.raises(InvalidTokenError):
+        decode_query_id(sign_payload({"last": [5], "page_size": 50}))
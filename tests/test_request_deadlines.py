@@ -0,0 +1,76 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from db_chatbot.request_deadlines import (
+    ClientDisconnected, DisconnectProbe, StageMetrics, StageTimeout, StatementCanceller,
+    install_statement_tracking, run_stage,
+)
+
+
+class BrokenProbe:
+    """Stands in for a non-Request object passed where a probe is expected."""
+
+    async def is_disconnected(self):
+        raise AttributeError("'Session' object has no attribute 'is_disconnected'")
+
+
+async def _value_after(seconds, value):
+    await asyncio.sleep(seconds)
+    return value
+
+
+def test_stage_completes_and_is_counted():
+    metrics = StageMetrics()
+    result = asyncio.run(run_stage("llm", _value_after(0.01, 42), 1.0, metrics=metrics))
+    assert result == 42
+    assert metrics.stats()["llm"]["completed"] == 1
+
+
+def test_stage_timeout():
+    metrics = StageMetrics()
+    with pytest.raises(StageTimeout):
+        asyncio.run(run_stage("llm", _value_after(1.0, None), 0.05, metrics=metrics))
+    assert metrics.stats()["llm"]["timed_out"] == 1
+
+
+def test_disconnect_aborts_stage():
+    metrics = StageMetrics()
+    probe = DisconnectProbe(lambda: True)
+    with pytest.raises(ClientDisconnected):
+        asyncio.run(run_stage("schema", _value_after(1.0, None), 5.0, probe, metrics=metrics))
+    assert metrics.stats()["schema"]["cancelled"] == 1
+
+
+def test_failing_probe_counts_as_connected():
+    # Regression: a probe that raises used to be reported as a disconnect.
+    metrics = StageMetrics()
+    result = asyncio.run(run_stage("schema", _value_after(0.05, "ok"), 1.0, BrokenProbe(), metrics=metrics))
+    assert result == "ok"
+    assert metrics.stats()["schema"]["cancelled"] == 0
+
+
+def test_timeout_cancels_running_statement(tmp_path):
+    engine = install_statement_tracking(create_engine(f"sqlite:///{tmp_path / 'slow.db'}"))
+    slow = text("WITH c(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM c WHERE n < 100000000) "
+                "SELECT COUNT(*) FROM c")
+
+    def count():
+        with engine.connect() as conn:
+            return conn.execute(slow).scalar()
+
+    canceller = StatementCanceller()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        statement = executor.submit(canceller.call, count)
+
+        async def run():
+            await run_stage("db", asyncio.wrap_future(statement), 0.2, canceller=canceller,
+                            metrics=StageMetrics())
+
+        with pytest.raises(StageTimeout):
+            asyncio.run(run())
+        # The interrupted statement fails promptly instead of running to completion.
+        with pytest.raises(Exception, match="interrupted"):
+            statement.result(timeout=5)
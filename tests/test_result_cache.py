@@ -0,0 +1,54 @@
+import json
+import time
+
+from db_chatbot.result_cache import ResultCache, canonicalize_sql, referenced_tables
+
+ROWS = [{"id": i, "name": f"Employee {i}"} for i in range(10)]
+SIZE = len(json.dumps(ROWS))
+
+
+def test_formatting_variants_share_an_entry():
+    cache = ResultCache()
+    cache.put("SELECT id, name FROM employees WHERE dept = 'HR'", ROWS)
+    assert cache.get("select id,   name\nfrom Employees where dept = 'HR'")["results"] == ROWS
+    assert cache.get("SELECT id, name FROM employees WHERE dept = 'hr'") is None
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=2 * SIZE)
+    cache.put("SELECT * FROM a", ROWS)
+    cache.put("SELECT * FROM b", ROWS)
+    cache.get("SELECT * FROM a")
+    cache.put("SELECT * FROM c", ROWS)
+    assert cache.get("SELECT * FROM b") is None
+    assert cache.get("SELECT * FROM a") is not None and cache.get("SELECT * FROM c") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 2 * SIZE <= stats["max_bytes"]
+
+
+def test_oversized_results_are_not_cached():
+    cache = ResultCache(max_bytes=SIZE - 1)
+    cache.put("SELECT * FROM a", ROWS)
+    assert cache.get("SELECT * FROM a") is None and cache.stats()["bytes"] == 0
+
+
+def test_expired_entries_miss_and_free_their_bytes():
+    cache = ResultCache(ttl_seconds=0.01)
+    cache.put("SELECT * FROM a", ROWS)
+    time.sleep(0.02)
+    assert cache.get("SELECT * FROM a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_invalidation_drops_only_entries_reading_the_table():
+    cache = ResultCache()
+    cache.put("SELECT e.name FROM employees e JOIN departments d ON d.id = e.dept", ROWS)
+    cache.put("SELECT * FROM projects", ROWS)
+    assert cache.invalidate_table("Departments") == 1
+    assert cache.get("SELECT * FROM projects") is not None
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == SIZE
+
+
+def test_referenced_tables_and_canonical_keys():
+    assert referenced_tables("SELECT * FROM dbo.Employees e JOIN [Departments] d ON 1 = 1") == {"employees", "departments"}
+    assert canonicalize_sql("SELECT 1  FROM t") == canonicalize_sql("select 1 from T")
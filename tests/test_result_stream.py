@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from db_chatbot.result_stream import csv_chunks, iter_batches, json_chunks, ndjson_lines
+
+ROWS = [(i, f"name {i}", i * 1.5 if i % 2 else None) for i in range(1, 8)]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name TEXT, score REAL)"))
+        conn.execute(text("INSERT INTO t VALUES (:id, :name, :score)"),
+                     [{"id": i, "name": n, "score": s} for i, n, s in ROWS])
+    return engine
+
+
+def _batches(engine, where=""):
+    # Seven rows in batches of three: three fetchmany calls.
+    return iter_batches(engine, f"SELECT id, name, score FROM t {where} ORDER BY id", batch_size=3)
+
+
+def _expected():
+    return [{"id": i, "name": n, "score": s} for i, n, s in ROWS]
+
+
+def test_iter_batches_fetches_in_batches(engine):
+    batches = list(_batches(engine))
+    assert [len(rows) for _, rows in batches] == [3, 3, 1]
+    assert batches[0][0] == ["id", "name", "score"]
+
+
+def test_ndjson_lines(engine):
+    chunks = list(ndjson_lines(_batches(engine), header={"sql_query": "SELECT ..."}))
+    lines = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert lines[0] == {"type": "meta", "sql_query": "SELECT ..."}
+    assert lines[1:-1] == _expected()
+    assert lines[-1] == {"type": "end", "row_count": 7}
+    assert len(chunks) == 5   # meta, one chunk per batch, end
+
+
+def test_json_chunks(engine):
+    chunks = list(json_chunks(_batches(engine), header={"explanation": "All rows"}))
+    document = json.loads("".join(chunks))
+    assert document == {"explanation": "All rows", "results": _expected(), "row_count": 7, "error": None}
+    assert len(chunks) == 5   # opening, one chunk per batch, closing
+
+
+def test_json_chunks_without_header_or_rows(engine):
+    document = json.loads("".join(json_chunks(_batches(engine, "WHERE id > 100"))))
+    assert document == {"results": [], "row_count": 0, "error": None}
+
+
+def test_csv_chunks(engine):
+    chunks = list(csv_chunks(_batches(engine)))
+    assert len(chunks) == 3
+    assert chunks[0].startswith("id,name,score\r\n")
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows[0] == ["id", "name", "score"]
+    assert rows[1:] == [[str(i), n, "" if s is None else str(s)] for i, n, s in ROWS]
+
+
+def test_csv_chunks_writes_the_header_for_an_empty_result(engine):
+    assert "".join(csv_chunks(_batches(engine, "WHERE id > 100"))) == "id,name,score\r\n"
+
+
+def _failing_batches():
+    yield ["id"], [(1,), (2,)]
+    raise RuntimeError("connection reset")
+
+
+def test_ndjson_lines_reports_a_failure_after_partial_output():
+    lines = [json.loads(line) for line in "".join(ndjson_lines(_failing_batches())).splitlines()]
+    assert lines == [{"id": 1}, {"id": 2}, {"type": "error", "error": "connection reset", "row_count": 2}]
+
+
+def test_json_chunks_reports_a_failure_in_a_valid_document():
+    document = json.loads("".join(json_chunks(_failing_batches())))
+    assert document == {"results": [{"id": 1}, {"id": 2}], "row_count": 2, "error": "connection reset"}
+
+
+def test_csv_chunks_reraises_after_partial_output():
+    with pytest.raises(RuntimeError):
+        list(csv_chunks(_failing_batches()))
+
+
+def test_driver_types_are_encoded():
+    batches = iter([(["amount", "day"], [(Decimal("1.25"), date(2024, 1, 31))])])
+    assert json.loads(next(ndjson_lines(batches))) == {"amount": 1.25, "day": "2024-01-31"}
@@ -0,0 +1,66 @@
+from db_chatbot.schema_retriever import SchemaRetriever, domain_descriptions, tokenize
+
+
+def _col(name, *references):
+    return {"name": name, "type": "int", "nullable": True, "references": list(references)}
+
+
+# A schema_catalog-style schema: employees references departments.
+SCHEMA = {
+    "departments": [_col("DepartmentID"), _col("DepartmentName")],
+    "employees": [_col("EmployeeID"), _col("FullName"), _col("HireDate"),
+                  _col("DepartmentID", "departments.DepartmentID")],
+    "invoices": [_col("InvoiceID"), _col("InvoiceTotal"), _col("DueDate")],
+    "shipments": [_col("ShipmentID"), _col("Carrier"), _col("TrackingNumber")],
+    "inventory": [_col("SKU"), _col("QuantityOnHand"), _col("Warehouse")],
+    "audit_log": [_col("LogID"), _col("ChangedBy"), _col("ChangedAt")],
+}
+
+
+def test_tokenize_splits_identifiers_and_stems():
+    assert tokenize("EmployeeID hire_date Salaries") == ["employee", "hire", "date", "salary"]
+
+
+def test_a_column_named_in_the_question_ranks_its_table_first():
+    ranked = SchemaRetriever().rank("When was each hire date?", SCHEMA)
+    assert ranked[0][0] == "employees"
+
+
+def test_prune_keeps_the_table_and_its_foreign_key_neighbour():
+    retriever = SchemaRetriever(top_k=1)
+    pruned = retriever.prune("List hire dates of employees", SCHEMA)
+    # departments does not match the question; it comes in through employees.DepartmentID.
+    assert list(pruned) == ["departments", "employees"]
+    assert pruned["employees"] is SCHEMA["employees"]
+    assert retriever.stats()["pruned_questions"] == 1
+
+
+def test_unrelated_tables_are_pruned():
+    pruned = SchemaRetriever(top_k=2).prune("Which carrier has the most tracking numbers?", SCHEMA)
+    assert list(pruned) == ["shipments"]
+
+
+def test_descriptions_make_tables_findable_by_domain_words():
+    descriptions = domain_descriptions({
+        "Finance": {"tables": {"invoices": ["InvoiceTotal"]}, "kpis": ["revenue"], "system_prompt": ""},
+    })
+    assert SchemaRetriever().rank("Total revenue this year", SCHEMA, descriptions)[0][0] == "invoices"
+
+
+def test_small_schemas_and_unmatched_questions_are_left_whole():
+    retriever = SchemaRetriever(top_k=len(SCHEMA))
+    assert retriever.prune("List hire dates", SCHEMA) is SCHEMA
+    assert SchemaRetriever(top_k=1).prune("What is the weather like?", SCHEMA) is SCHEMA
+
+
+def test_the_index_follows_schema_changes():
+    retriever = SchemaRetriever(top_k=1)
+    retriever.prune("Warehouse stock", SCHEMA)
+    changed = dict(SCHEMA, inventory=[_col("SKU"), _col("Bin")], stock_levels=[_col("Warehouse")])
+    assert list(retriever.prune("Warehouse stock", changed)) == ["stock_levels"]
+
+
+def test_record_savings():
+    retriever = SchemaRetriever()
+    saved = retriever.record_savings("Table: a\n- x (int)\n" * 20, "Table: a\n- x (int)\n")
+    assert saved > 0 and retriever.stats()["prompt_tokens_saved"] == saved
@@ -0,0 +1,67 @@
+import time
+
+from db_chatbot.chat_memory import ChatMemory
+from db_chatbot.session_store import SessionStore, new_session_id, valid_session_id
+
+
+def _store(tmp_path=None, **kwargs):
+    spill = str(tmp_path / "sessions.db") if tmp_path is not None else None
+    return SessionStore(ChatMemory, spill_path=spill, **kwargs)
+
+
+def test_session_ids():
+    assert valid_session_id(new_session_id())
+    assert not valid_session_id("../etc/passwd")
+    assert not valid_session_id(None)
+
+
+def test_sessions_are_isolated():
+    store = _store()
+    store.get("a").add_message("user", "question for a")
+    assert store.get("b").get_formatted_history() == ""
+    assert store.get("a").get_formatted_history() == "user: question for a"
+
+
+def test_lru_session_is_spilled_and_restored(tmp_path):
+    store = _store(tmp_path, max_sessions=2)
+    store.get("a").add_message("user", "top paid employees")
+    store.get("b")
+    store.get("c")                      # evicts "a", the least recently used
+    stats = store.stats()
+    assert stats["live_sessions"] == 2 and stats["evicted"] == 1 and stats["spilled_sessions"] == 1
+
+    restored = store.get("a")           # back from disk, evicting "b"
+    assert restored.get_formatted_history() == "user: top paid employees"
+    assert list(restored.get_current_context()["query_history"]) == ["top paid employees"]
+    assert store.stats()["restored"] == 1
+
+
+def test_without_spill_an_evicted_session_starts_over():
+    store = _store(max_sessions=1)
+    store.get("a").add_message("user", "hello")
+    store.get("b")
+    assert store.get("a").get_formatted_history() == ""
+
+
+def test_idle_sessions_expire_to_disk(tmp_path):
+    store = _store(tmp_path, idle_ttl=0.01)
+    store.get("a").add_message("user", "hello")
+    time.sleep(0.02)
+    store.get("b")
+    assert store.stats()["expired"] == 1 and store.stats()["live_sessions"] == 1
+    assert store.peek("a").get_formatted_history() == "user: hello"
+
+
+def test_peek_never_creates_a_session(tmp_path):
+    store = _store(tmp_path)
+    assert store.peek("unknown") is None
+    assert store.stats()["created"] == 0
+
+
+def test_spilled_sessions_past_their_ttl_are_not_restored(tmp_path):
+    store = _store(tmp_path, max_sessions=1, spill_ttl=0.01)
+    store.get("a").add_message("user", "hello")
+    store.get("b")
+    time.sleep(0.02)
+    assert store.peek("a") is None
+    assert store.get("a").get_formatted_history() == ""
@@ -0,0 +1,116 @@
+import asyncio
+
+from db_chatbot.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"rows": [1, 2]}
+
+    async def main():
+        return await asyncio.gather(*(flights.run("q", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r == {"rows": [1, 2]} for r in results)
+    # Followers get copies: mutating one answer does not touch the others.
+    results[1]["rows"].append(3)
+    assert results[0] == {"rows": [1, 2]}
+    assert flights.stats() == {"enabled": True, "calls": 5, "executions": 1, "deduplicated": 4,
+                               "abandoned": 0, "in_flight": 0}
+
+
+def test_keys_are_forgotten_once_done():
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        return [await flights.run("q", work), await flights.run("q", work)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_one_caller_leaving_does_not_cancel_the_others():
+    flights = SingleFlight("test")
+    abandoned = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leaver = asyncio.ensure_future(flights.run("q", work, abandon=lambda: abandoned.append(1)))
+        stayer = asyncio.ensure_future(flights.run("q", work))
+        await asyncio.sleep(0.01)
+        leaver.cancel()
+        return await stayer, leaver
+
+    result, leaver = asyncio.run(main())
+    assert result == "done" and leaver.cancelled()
+    assert abandoned == [] and flights.abandoned == 0
+
+
+def test_last_caller_leaving_cancels_the_work():
+    flights = SingleFlight("test")
+    abandoned = []
+
+    async def main():
+        started, stopped = asyncio.Event(), asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        callers = [asyncio.ensure_future(flights.run("q", work, abandon=lambda: abandoned.append(1)))
+                   for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.wait_for(stopped.wait(), 1)
+        # A new caller starts fresh work instead of joining the cancelled one.
+        return await flights.run("q", lambda: asyncio.sleep(0, "fresh"))
+
+    assert asyncio.run(main()) == "fresh"
+    assert abandoned == [1] and flights.abandoned == 1
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flights.run("q", work) for _ in range(3)), return_exceptions=True)
+
+    assert [str(e) for e in asyncio.run(main())] == ["boom"] * 3
+
+
+def test_disabled_runs_every_call():
+    flights = SingleFlight("test", enabled=False)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(flights.run("q", work) for _ in range(3)))
+
+    asyncio.run(main())
+    assert len(calls) == 3
@@ -0,0 +1,70 @@
+import pytest
+
+from db_chatbot.sql_parser import SqlParser, SqlValidationError, parse_sql, tokenize
+
+
+def test_tokenizer_keeps_literals_whole_and_unquotes_names():
+    tokens = tokenize("SELECT 'it''s; DROP' AS [a]]b], N'x' /* ; */ FROM \"T\" -- DELETE")
+    assert [t.kind for t in tokens] == ['word', 'string', 'word', 'name', 'punct', 'string', 'word', 'name']
+    assert tokens[1].value == "'it''s; DROP'"
+    assert tokens[3].value == "a]b"
+    assert tokens[-1].value == "t"
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM employees",
+    "select name from employees where note = 'please DROP TABLE x; --'",
+    "WITH recent AS (SELECT id FROM hires) SELECT COUNT(*) FROM recent;",
+    "(SELECT id FROM a) UNION ALL (SELECT id FROM b)",
+    "SELECT [update], [delete] FROM audit",
+])
+def test_read_only_statements_pass(sql):
+    parse_sql(sql)
+
+
+@pytest.mark.parametrize("sql, reason", [
+    ("DELETE FROM employees", "DELETE"),
+    ("SELECT 1; DROP TABLE employees", "single statement"),
+    ("SELECT * INTO backup FROM employees", "INTO"),
+    ("WITH x AS (SELECT 1 AS a) UPDATE employees SET salary = 0", "UPDATE"),
+    ("EXEC sp_who", "EXEC"),
+    ("SELECT * FROM OPENROWSET('SQLNCLI', 'x', 'SELECT 1')", "OPENROWSET"),
+    ("SELECT * FROM #scratch", "Temporary"),
+    ("SELECT 1; WAITFOR DELAY '00:00:10'", "single statement"),
+    ("SELECT 'unterminated FROM t", "Unterminated"),
+    ("SELECT (1 FROM t", "Unbalanced"),
+    ("", "Empty"),
+    ("VALUES (1)", "Only SELECT"),
+])
+def test_anything_else_is_refused(sql, reason):
+    with pytest.raises(SqlValidationError, match=reason):
+        parse_sql(sql)
+
+
+def test_canonical_form_ignores_formatting_aliases_and_literals():
+    a = parse_sql("select e.name from Employees e where e.dept = 'Sales' and e.salary > 5")
+    b = parse_sql("SELECT  x.name\nFROM [employees] AS x WHERE x.dept='HR' AND x.salary>5 -- why")
+    assert a.canonical == b.canonical == "select t1.name from employees t1 where t1.dept = ? and t1.salary > ?"
+    # The cache key keeps the literals: different filters are different results.
+    assert a.key != b.key
+    assert a.parameters == ("'Sales'", "5")
+
+
+def test_tables_columns_and_ctes():
+    parsed = parse_sql("WITH c AS (SELECT e.id, e.dept FROM employees e) "
+                       "SELECT c.dept, d.name FROM c JOIN departments d ON d.id = c.dept")
+    assert parsed.tables == {"employees", "departments"}
+    assert parsed.ctes == {"c"}
+    assert {"employees.id", "employees.dept", "departments.name"} <= parsed.columns
+
+
+def test_refusals_are_memoized_and_counted():
+    parser = SqlParser(max_entries=2)
+    for _ in range(2):
+        with pytest.raises(SqlValidationError):
+            parser.parse("DROP TABLE t")
+    parser.parse("SELECT 1")
+    parser.parse("SELECT 2")
+    stats = parser.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 3 and stats["rejected"] == 2
+    assert stats["entries"] == 2